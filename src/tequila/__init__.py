@@ -11,6 +11,8 @@ from tequila.optimizers import minimize, minimize_scipy, minimize_gd, optimizer_
 from tequila.simulators.simulator_api import simulate, compile, compile_to_function, draw, pick_backend, \
     INSTALLED_SAMPLERS, \
     INSTALLED_SIMULATORS, SUPPORTED_BACKENDS, INSTALLED_BACKENDS, show_available_simulators
+from tequila.simulators.executor import ExpectationValueExecutor, set_default_executor
+from tequila.simulators.simulator_base import set_result_cache_size
 from tequila.wavefunction import QubitWaveFunction
 from tequila.circuit.qasm import export_open_qasm, import_open_qasm, import_open_qasm_from_file
 from tequila.circuit.pyzx import convert_to_pyzx, convert_from_pyzx
@@ -18,7 +20,7 @@ import tequila.quantumchemistry as chemistry # shortcut
 from tequila.quantumchemistry import Molecule, MoleculeFromOpenFermion
 
 # make sure to use the jax/autograd numpy for objectives
-from tequila.circuit.gradient import grad
+from tequila.circuit.gradient import grad, hessian
 from tequila.autograd_imports import numpy, jax, __AUTOGRAD__BACKEND__
 
 # get rid of the jax GPU/CPU warnings
@@ -11,7 +11,6 @@ from tequila import BitString
 import typing, numpy, copy
 from tequila import TequilaException
 from tequila.apps._unary_state_prep_impl import UnaryStatePrepImpl, sympy
-from tequila.simulators.simulator_symbolic import BackendCircuitSymbolic
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila.objective.objective import assign_variable
 
@@ -85,6 +84,7 @@ class UnaryStatePrep:
             "Could not disentangle the given state after " + str(count) + " restarts")
 
         # get the equations to determine the angles
+        from tequila.simulators.simulator_symbolic import BackendCircuitSymbolic
         simulator = BackendCircuitSymbolic(abstract_circuit=self._abstract_circuit, variables={})
         simulator.convert_to_numpy = False
         variables = None # {k:k.name.evalf() for k in self._abstract_circuit.extract_variables()}
@@ -6,6 +6,7 @@ from tequila import TequilaException
 from tequila.objective.objective import Variable, FixedVariable, assign_variable,Objective,VectorObjective
 from tequila.hamiltonian import PauliString, QubitHamiltonian, paulis
 from tequila.tools import list_assignment
+from tequila.utils import fingerprint
 from numpy import pi
 
 from dataclasses import dataclass
@@ -64,6 +65,30 @@ class QGateImpl:
     def copy(self):
         return copy.deepcopy(self)
 
+    def fingerprint(self) -> tuple:
+        """
+        Canonical structural representation of the gate (type and all attributes), see tequila.utils.fingerprint
+        Cached until an attribute of the gate is set
+        :return: hashable tuple, equal for gates with the same structure
+        """
+        result = self.__dict__.get("_fingerprint")
+        if result is None:
+            result = (type(self),) + tuple(
+                (k, fingerprint(v)) for k, v in sorted(self.__dict__.items()) if k != "_fingerprint")
+            self.__dict__["_fingerprint"] = result
+        return result
+
+    def __setattr__(self, key, value):
+        # changing the gate invalidates the cached fingerprint
+        self.__dict__.pop("_fingerprint", None)
+        super().__setattr__(key, value)
+
+    def __getstate__(self):
+        # the cached fingerprint can refer to the identity of attributes, copies compute their own
+        state = dict(self.__dict__)
+        state.pop("_fingerprint", None)
+        return state
+
     def dagger(self):
         """
         :return: return the hermitian conjugate of the gate.
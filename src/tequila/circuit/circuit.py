@@ -404,6 +404,18 @@ class QCircuit():
     def __repr__(self):
         return self.__str__()
 
+    def fingerprint(self) -> tuple:
+        """
+        Canonical structural representation of the circuit, see tequila.utils.fingerprint
+        Built from the cached fingerprints of the gates.
+
+        Returns
+        -------
+        tuple:
+            hashable, equal for circuits with structurally equal gates in the same order
+        """
+        return "QCircuit", tuple(g.fingerprint() for g in self.gates), self._min_n_qubits
+
     @staticmethod
     def wrap_gate(gate: QGateImpl):
         """
@@ -3,15 +3,15 @@ from tequila.circuit.circuit import QCircuit
 from tequila.circuit.gates import Rx, Ry, H, X, Rz, ExpPauli, CNOT, Phase, T, Z, Y, S, CX
 from tequila.circuit._gates_impl import RotationGateImpl, PhaseGateImpl, QGateImpl, \
     ExponentialPauliGateImpl, TrotterizedGateImpl, PowerGateImpl
-from tequila.utils import to_float
+from tequila.utils import to_float, fingerprint
 from tequila.objective.objective import Variable
 from tequila.objective.objective import Objective, VectorObjective
-from tequila.objective.objective import ExpectationValueImpl
+from tequila.objective.objective import ExpectationValueImpl, ShiftedExpectationValueImpl
 from tequila.autograd_imports import numpy as jnp
 import numpy
 from numpy import pi as pi
 
-import copy, typing
+import collections, copy, typing
 import time
 
 
@@ -19,6 +19,81 @@ class TequilaCompilerException(TequilaException):
     pass
 
 
+class GateCompileCache:
+    """
+    Least recently used cache for the decomposition of single gates by the Compiler.
+
+    Entries are keyed on the structural fingerprint of the gate (see gate_fingerprint) and the compiler flags.
+    Gates built separately with the same structure (type, qubits, generator, parameter, ...) share their entry.
+
+    Attributes
+    ----------
+    maxsize:
+        the maximal number of stored decompositions, 0 disables the cache
+    hits:
+        number of decompositions taken from the cache
+    misses:
+        number of decompositions that had to be computed
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key):
+        """ a copy of the stored decomposition (the caller may change its gates) or None """
+        if key not in self._data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return copy.deepcopy(self._data[key][1])
+
+    def put(self, key, gate, compiled):
+        """
+        store a decomposition, the gate is kept alive with the entry,
+        so that the ids of its non-structural attributes in the key stay unique
+        """
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (gate, compiled)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+GATE_COMPILE_CACHE = GateCompileCache()
+
+
+def gate_fingerprint(gate) -> typing.Optional[tuple]:
+    """
+    Structural fingerprint of a gate for the GateCompileCache (see QGateImpl.fingerprint).
+
+    Parameters
+    ----------
+    gate:
+        the gate
+
+    Returns
+    -------
+    tuple:
+        hashable fingerprint, None if the decomposition of the gate can not be reused (randomized gates)
+    """
+    if getattr(gate, "randomize", False) or getattr(gate, "randomize_component_order", False):
+        return None
+    return gate.fingerprint()
+
+
 class Compiler:
     """
     an object that performs abstract compilation of QCircuits and Objectives.
@@ -124,6 +199,11 @@ class Compiler:
         self.y_gate = y_gate
         self.ch_gate = ch_gate
 
+    @property
+    def flags(self) -> tuple:
+        """ the compiler settings as hashable tuple """
+        return tuple(sorted(vars(self).items()))
+
     def __call__(self, objective: typing.Union[Objective, QCircuit, ExpectationValueImpl], variables=None, *args,
                  **kwargs):
 
@@ -171,17 +251,28 @@ class Compiler:
 
         argsets=objective.argsets
         compiled_sets=[]
+        # shifted expectationvalues with the same template keep sharing it
+        templates = {}
+        # structurally equal expectationvalues (also of different argsets) are compiled once and shared
+        already_processed = {}
         for argset in argsets:
             compiled_args = []
-            already_processed = {}
             for arg in argset:
-                if isinstance(arg, ExpectationValueImpl) or (hasattr(arg, "U") and hasattr(arg, "H")):
-                    if arg in already_processed:
-                        compiled_args.append(already_processed[arg])
-                    else:
-                        compiled = self.compile_objective_argument(arg, *args, **kwargs)
-                        compiled_args.append(compiled)
-                        already_processed[arg] = compiled
+                if isinstance(arg, ShiftedExpectationValueImpl):
+                    key = fingerprint(arg)
+                    if key not in already_processed:
+                        template_key = fingerprint(arg.template)
+                        if template_key not in templates:
+                            templates[template_key] = self.compile_objective_argument(arg.template, *args, **kwargs)
+                        already_processed[key] = ShiftedExpectationValueImpl(template=templates[template_key],
+                                                                             shifts=arg.shifts,
+                                                                             parameters=arg.parameters)
+                    compiled_args.append(already_processed[key])
+                elif isinstance(arg, ExpectationValueImpl) or (hasattr(arg, "U") and hasattr(arg, "H")):
+                    key = fingerprint(arg)
+                    if key not in already_processed:
+                        already_processed[key] = self.compile_objective_argument(arg, *args, **kwargs)
+                    compiled_args.append(already_processed[key])
                 else:
                     # nothing to process for non-expectation-value types, but acts as sanity check
                     compiled_args.append(self.compile_objective_argument(arg, *args, **kwargs))
@@ -209,7 +300,10 @@ class Compiler:
         """
 
 
-        if isinstance(arg, ExpectationValueImpl) or (hasattr(arg, "U") and hasattr(arg, "H")):
+        if isinstance(arg, ShiftedExpectationValueImpl):
+            return ShiftedExpectationValueImpl(template=self.compile_objective_argument(arg.template, *args, **kwargs),
+                                               shifts=arg.shifts, parameters=arg.parameters)
+        elif isinstance(arg, ExpectationValueImpl) or (hasattr(arg, "U") and hasattr(arg, "H")):
             return ExpectationValueImpl(H=arg.H,
                                         U=self.compile_circuit(abstract_circuit=arg.U, *args,
                                                                **kwargs))
@@ -251,66 +345,30 @@ class Compiler:
             gatelist = enumerate(abstract_circuit.gates)
         else:
             # check & compile only gates which depend on variables
-            gatelist = []
+            # gates depending on several of the variables are compiled only once
+            gatelist = {}
             for variable in variables:
-                gatelist += abstract_circuit._parameter_map[variable]
+                gatelist.update(dict(abstract_circuit._parameter_map[variable]))
+            gatelist = sorted(gatelist.items(), key=lambda x: x[0])
 
+        flags = self.flags
         compiled_gates = []
         for idx, gate in gatelist:
 
-            cg = gate
-            controlled = gate.is_controlled()
-
-            if not controlled and self.gradient_mode and (hasattr(cg, "eigenvalues_magnitude") or hasattr(cg, "shifted_gates")):
-                compiled_gates.append((idx, QCircuit.wrap_gate(cg)))
+            if not gate.is_controlled() and self.gradient_mode and (hasattr(gate, "eigenvalues_magnitude") or hasattr(gate, "shifted_gates")):
+                compiled_gates.append((idx, QCircuit.wrap_gate(gate)))
                 continue
-            else:
-                if hasattr(cg, "compile"):
-                    cg = cg.compile()
-
-            # order matters
-            # first the real multi-target gates
-            if controlled or self.trotterized:
-                cg = compile_trotterized_gate(gate=cg)
-            if controlled or self.generalized_rotation:
-                cg = compile_generalized_rotation_gate(gate=cg)
-            if controlled or self.exponential_pauli:
-                cg = compile_exponential_pauli_gate(gate=cg)
-            if self.swap:
-                cg = compile_swap(gate=cg)
-            if self.multicontrol:
-                raise NotImplementedError("Multicontrol compilation does not work yet")
-
-            if self.phase_to_z:
-                cg = compile_phase_to_z(gate=cg)
-            if self.power:
-                cg = compile_power_gate(gate=cg)
-            if self.phase:
-                cg = compile_phase(gate=cg)
-            if self.ch_gate:
-                cg = compile_ch(gate=cg)
-            if self.y_gate:
-                cg = compile_y(gate=cg)
-            if self.ry_gate:
-                cg = compile_ry(gate=cg, controlled_rotation=self.controlled_rotation)
-            if controlled:
-                if self.cc_max:
-                    cg = compile_to_single_control(gate=cg)
-                if self.controlled_exponential_pauli:
-                    cg = compile_exponential_pauli_gate(gate=cg)
-                if self.controlled_power:
-                    cg = compile_controlled_power(gate=cg)
-                if self.controlled_phase:
-                    cg = compile_controlled_phase(gate=cg)
-                    if self.phase:
-                        cg = compile_phase(gate=cg)
-                if self.toffoli:
-                    cg = compile_toffoli(gate=cg)
-                    if self.phase:
-                        cg = compile_phase(gate=cg)
-                if self.controlled_rotation:
-                    cg = compile_controlled_rotation(gate=cg)
 
+            fingerprint = gate_fingerprint(gate)
+            if fingerprint is None:
+                compiled_gates.append((idx, self.compile_gate(gate)))
+                continue
+            key = (fingerprint, flags)
+            cg = GATE_COMPILE_CACHE.get(key)
+            if cg is None:
+                cg = self.compile_gate(gate)
+                # the decomposition may contain the gate itself, which could be changed later on
+                GATE_COMPILE_CACHE.put(key, gate, copy.deepcopy(cg))
             compiled_gates.append((idx, cg))
 
         if len(compiled_gates) == 0:
@@ -321,6 +379,68 @@ class Compiler:
 
             return compiled
 
+    def compile_gate(self, gate) -> QCircuit:
+        """
+        compile a single gate with the chain of compile passes selected by the flags of the compiler.
+        Parameters
+        ----------
+        gate:
+            the gate to compile.
+
+        Returns
+        -------
+            QCircuit; the compiled gate.
+        """
+        cg = gate
+        controlled = gate.is_controlled()
+        if hasattr(cg, "compile"):
+            cg = cg.compile()
+
+        # order matters
+        # first the real multi-target gates
+        if controlled or self.trotterized:
+            cg = compile_trotterized_gate(gate=cg)
+        if controlled or self.generalized_rotation:
+            cg = compile_generalized_rotation_gate(gate=cg)
+        if controlled or self.exponential_pauli:
+            cg = compile_exponential_pauli_gate(gate=cg)
+        if self.swap:
+            cg = compile_swap(gate=cg)
+        if self.multicontrol:
+            raise NotImplementedError("Multicontrol compilation does not work yet")
+
+        if self.phase_to_z:
+            cg = compile_phase_to_z(gate=cg)
+        if self.power:
+            cg = compile_power_gate(gate=cg)
+        if self.phase:
+            cg = compile_phase(gate=cg)
+        if self.ch_gate:
+            cg = compile_ch(gate=cg)
+        if self.y_gate:
+            cg = compile_y(gate=cg)
+        if self.ry_gate:
+            cg = compile_ry(gate=cg, controlled_rotation=self.controlled_rotation)
+        if controlled:
+            if self.cc_max:
+                cg = compile_to_single_control(gate=cg)
+            if self.controlled_exponential_pauli:
+                cg = compile_exponential_pauli_gate(gate=cg)
+            if self.controlled_power:
+                cg = compile_controlled_power(gate=cg)
+            if self.controlled_phase:
+                cg = compile_controlled_phase(gate=cg)
+                if self.phase:
+                    cg = compile_phase(gate=cg)
+            if self.toffoli:
+                cg = compile_toffoli(gate=cg)
+                if self.phase:
+                    cg = compile_phase(gate=cg)
+            if self.controlled_rotation:
+                cg = compile_controlled_rotation(gate=cg)
+
+        return cg
+
 
 def compiler(f):
     """
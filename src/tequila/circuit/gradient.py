@@ -1,70 +1,188 @@
 from tequila.circuit.compiler import Compiler
 from tequila.objective.objective import Objective, ExpectationValueImpl, Variable,\
-    assign_variable, identity, VectorObjective
+    assign_variable, identity, VectorObjective, format_variable_dictionary, ShiftedExpectationValueImpl
+from tequila.circuit.circuit import QCircuit
 from tequila import TequilaException
 from tequila.simulators.simulator_api import compile
 import typing
 import copy
+import numpy
 from numpy import pi
 from tequila.autograd_imports import jax, __AUTOGRAD__BACKEND__
 
 
-def grad(objective: typing.Union[Objective,VectorObjective], variable: Variable = None, no_compile=False, *args, **kwargs):
+# methods that evaluate the derivatives of expectationvalues directly on simulated states
+SIMULATED_GRADIENT_METHODS = ["checkpoint", "adjoint"]
+
+
+def grad(objective: typing.Union[Objective,VectorObjective], variable: Variable = None, no_compile=False, method: str = None, *args, **kwargs):
 
     '''
     wrapper function for getting the gradients of Objectives,ExpectationValues, Unitaries (including single gates), and Transforms.
     :param obj (QCircuit,ParametrizedGateImpl,Objective,ExpectationValue,Transform,Variable): structure to be differentiated
     :param variables (list of Variable): parameter with respect to which obj should be differentiated.
         default None: total gradient.
+        A list gives a dictionary with the derivatives with respect to all its variables, like None.
+        The shifted expectationvalues of all those derivatives are written as shifts of one template
+        per expectationvalue (see ShiftedExpectationValueImpl) and share one compiled circuit.
+    :param method (str): optional, one of SIMULATED_GRADIENT_METHODS.
+        The derivatives of the expectationvalues are then computed on simulated states (see SimulatedGradient)
+        instead of being expanded into shifted expectationvalues.
+        The returned Objectives can be compiled and called but not be differentiated or combined further.
+        With backend="numpy_subspace" in the kwargs number conserving circuits are simulated in their sector.
     return: dictionary of Objectives, if called on gate, circuit, exp.value, or objective; if Variable or Transform, returns number.
     '''
 
-    if variable is None:
+    if method is not None:
+        return __grad_simulated(objective=objective, variable=variable, method=method, **kwargs)
+
+    if variable is None or isinstance(variable, (list, tuple)):
         # None means that all components are created
-        variables = objective.extract_variables()
-        result = {}
+        if variable is None:
+            variables = objective.extract_variables()
+        else:
+            variables = [assign_variable(k) for k in variable]
 
         if len(variables) == 0:
             raise TequilaException("Error in gradient: Objective has no variables")
 
+        # compile once, the components share the shift templates of the expectationvalues
+        compiled = objective if no_compile else __compile(objective, variables=variables)
+        templates = {}
+        result = {}
         for k in variables:
             assert (k is not None)
-            result[k] = grad(objective, k, no_compile=no_compile)
+            result[k] = __grad_compiled(objective=objective, compiled=compiled, variable=k, templates=templates)
         return result
     else:
         variable = assign_variable(variable)
 
-    if no_compile:
-        compiled = objective
+    compiled = objective if no_compile else __compile(objective, variables=[variable])
+    return __grad_compiled(objective=objective, compiled=compiled, variable=variable, templates={})
+
+
+def hessian(objective: typing.Union[Objective, VectorObjective], variable: typing.List[Variable] = None,
+            no_compile=False, gradient: dict = None, *args, **kwargs) -> dict:
+    '''
+    analytic Hessian of an Objective, the second-order shift rules are applied directly on the shift templates.
+    All entries are built from one compilation of the objective and of its gradient,
+    their shifted expectationvalues share the shift templates (see grad),
+    so every distinct (doubly) shifted expectationvalue is compiled once
+    and evaluated once in an EvaluationPlan over the entries.
+    Only one triangle is computed, the other one holds the same Objectives.
+    :param objective (Objective, ExpectationValue): structure to be differentiated
+    :param variable (list of Variable): parameters of the Hessian, default None: all variables of the objective
+    :param gradient (dict): optional, the gradient with respect to the same variables as returned by grad,
+        it is then not computed again and objective is not needed
+    :return: dictionary of Objectives with (Variable, Variable) keys, zero entries are empty Objectives
+    '''
+    if variable is None:
+        variables = objective.extract_variables() if gradient is None else list(gradient.keys())
+    elif isinstance(variable, (list, tuple)):
+        variables = [assign_variable(k) for k in variable]
     else:
-        compiler = Compiler(multitarget=True,
-                            trotterized=True,
-                            hadamard_power=True,
-                            power=True,
-                            controlled_phase=True,
-                            controlled_rotation=True,
-                            gradient_mode=True)
+        variables = [assign_variable(variable)]
+    if len(variables) == 0:
+        raise TequilaException("Error in hessian: Objective has no variables")
+
+    templates = {}
+    if gradient is None:
+        compiled = objective if no_compile else __compile(objective, variables=variables)
+        gradient = [__grad_compiled(objective=objective, compiled=compiled, variable=k, templates=templates)
+                    for k in variables]
+    else:
+        gradient = [gradient[k] for k in variables]
+
+    # one compilation for all components of the gradient,
+    # equal shift templates of different components become one
+    compiled_gradient = __compile(VectorObjective(argsets=[dO.args for dO in gradient],
+                                                  transformations=[dO._transformation for dO in gradient]),
+                                  variables=variables)
+
+    result = {}
+    for i, k in enumerate(variables):
+        dO = gradient[i]
+        compiled_dO = Objective(args=compiled_gradient.argsets[i], transformation=dO._transformation)
+        dependencies = compiled_dO.extract_variables()
+        for l in variables[i:]:
+            if l in dependencies:
+                ddO = __grad_compiled(objective=dO, compiled=compiled_dO, variable=l, templates=templates)
+            else:
+                ddO = Objective()
+            result[(k, l)] = ddO
+            result[(l, k)] = ddO
+    return result
+
 
-        compiled = compiler(objective, variables=[variable])
+def __compile(objective, variables):
+    compiler = Compiler(multitarget=True,
+                        trotterized=True,
+                        hadamard_power=True,
+                        power=True,
+                        controlled_phase=True,
+                        controlled_rotation=True,
+                        gradient_mode=True)
 
+    return compiler(objective, variables=variables)
+
+
+def __grad_compiled(objective, compiled, variable: Variable, templates: dict):
     if variable not in compiled.extract_variables():
         raise TequilaException("Error in taking gradient. Objective does not depend on variable {} ".format(variable))
 
     if isinstance(objective, ExpectationValueImpl):
-        return __grad_expectationvalue(E=objective, variable=variable)
+        return __grad_expectationvalue(E=objective, variable=variable, templates=templates)
     elif objective.is_expectationvalue():
-        return __grad_expectationvalue(E=compiled.args[-1], variable=variable)
+        return __grad_expectationvalue(E=compiled.args[-1], variable=variable, templates=templates)
     elif isinstance(compiled, Objective) or isinstance(compiled, VectorObjective):
-        return __grad_objective(objective=compiled, variable=variable)
+        # the outer derivatives are evaluated with the original expectationvalues,
+        # so they are recognized as the ones of the objective (see EvaluationPlan and ResultCache)
+        return __grad_objective(objective=compiled, variable=variable, templates=templates,
+                                outer_argsets=objective.argsets)
     else:
         raise TequilaException("Gradient not implemented for other types than ExpectationValue and Objective.")
 
 
-def __grad_objective(objective: typing.Union[Objective, VectorObjective], variable: Variable):
+def __grad_simulated(objective: typing.Union[Objective, VectorObjective], variable: Variable = None, method: str = None,
+                     **kwargs):
+    if method not in SIMULATED_GRADIENT_METHODS:
+        raise TequilaException("unknown gradient method {}, use one of {}".format(method, SIMULATED_GRADIENT_METHODS))
+    if isinstance(objective, ExpectationValueImpl):
+        objective = Objective(args=[objective])
+
+    if variable is None:
+        variables = objective.extract_variables()
+        if len(variables) == 0:
+            raise TequilaException("Error in gradient: Objective has no variables")
+    else:
+        variables = [assign_variable(variable)]
+        if variables[0] not in objective.extract_variables():
+            raise TequilaException(
+                "Error in taking gradient. Objective does not depend on variable {} ".format(variables[0]))
+
+    gradient = SimulatedGradient(objective=objective, method=method, **kwargs)
+    result = {}
+    for k in variables:
+        if isinstance(objective, VectorObjective):
+            result[k] = [Objective(args=[SimulatedGradientComponent(gradient, variable=k, position=i)])
+                         for i in range(len(objective))]
+            if len(result[k]) == 1:
+                result[k] = result[k][0]
+        else:
+            result[k] = Objective(args=[SimulatedGradientComponent(gradient, variable=k)])
+
+    if variable is None:
+        return result
+    return result[variables[0]]
+
+
+def __grad_objective(objective: typing.Union[Objective, VectorObjective], variable: Variable, templates: dict = None,
+                     outer_argsets: tuple = None):
     if isinstance(objective, VectorObjective):
-        return __grad_vector_objective(objective, variable)
+        return __grad_vector_objective(objective, variable, templates=templates, outer_argsets=outer_argsets)
     else:
         args = objective.args
+        outer_args = args if outer_argsets is None else outer_argsets[0]
         transformation = objective.transformation
         dO = None
 
@@ -81,18 +199,18 @@ def __grad_objective(objective: typing.Union[Objective, VectorObjective], variab
             if transformation is None or transformation == identity:
                 outer = 1.0
             else:
-                outer = Objective(args=args, transformation=df)
+                outer = Objective(args=outer_args, transformation=df)
 
             if hasattr(arg, "U"):
                 # save redundancies
                 if arg in processed_expectationvalues:
                     inner = processed_expectationvalues[arg]
                 else:
-                    inner = __grad_inner(arg=arg, variable=variable)
+                    inner = __grad_inner(arg=arg, variable=variable, templates=templates)
                     processed_expectationvalues[arg] = inner
             else:
                 # this means this inner derivative is purely variable dependent
-                inner = __grad_inner(arg=arg, variable=variable)
+                inner = __grad_inner(arg=arg, variable=variable, templates=templates)
 
             if inner == 0.0:
                 # don't pile up zero expectationvalues
@@ -108,12 +226,14 @@ def __grad_objective(objective: typing.Union[Objective, VectorObjective], variab
         return dO
 
 
-def __grad_vector_objective(objective: typing.Union[Objective,VectorObjective], variable: Variable):
+def __grad_vector_objective(objective: typing.Union[Objective,VectorObjective], variable: Variable, templates: dict = None,
+                            outer_argsets: tuple = None):
     argsets = objective.argsets
     transformations = objective._transformations
     outputs = []
     for pos in range(len(objective)):
         args = argsets[pos]
+        outer_args = args if outer_argsets is None else outer_argsets[pos]
         transformation = transformations[pos]
         dO = None
 
@@ -130,18 +250,18 @@ def __grad_vector_objective(objective: typing.Union[Objective,VectorObjective],
             if transformation is None or transformation == identity:
                 outer = 1.0
             else:
-                outer = Objective(args=args, transformation=df)
+                outer = Objective(args=outer_args, transformation=df)
 
             if hasattr(arg, "U"):
                 # save redundancies
                 if arg in processed_expectationvalues:
                     inner = processed_expectationvalues[arg]
                 else:
-                    inner = __grad_inner(arg=arg, variable=variable)
+                    inner = __grad_inner(arg=arg, variable=variable, templates=templates)
                     processed_expectationvalues[arg] = inner
             else:
                 # this means this inner derivative is purely variable dependent
-                inner = __grad_inner(arg=arg, variable=variable)
+                inner = __grad_inner(arg=arg, variable=variable, templates=templates)
 
             if inner == 0.0:
                 # don't pile up zero expectationvalues
@@ -160,12 +280,13 @@ def __grad_vector_objective(objective: typing.Union[Objective,VectorObjective],
     return outputs
 
 
-def __grad_inner(arg, variable):
+def __grad_inner(arg, variable, templates: dict = None):
     '''
     a modified loop over __grad_objective, which gets derivatives
      all the way down to variables, return 1 or 0 when a variable is (isnt) identical to var.
     :param arg: a transform or variable object, to be differentiated
     :param variable: the Variable with respect to which par should be differentiated.
+    :param templates: shift templates of the expectationvalues, shared between the components of a gradient
     :ivar var: the string representation of variable
     '''
 
@@ -176,24 +297,24 @@ def __grad_inner(arg, variable):
         else:
             return 0.0
     elif isinstance(arg, ExpectationValueImpl):
-        return __grad_expectationvalue(arg, variable=variable)
+        return __grad_expectationvalue(arg, variable=variable, templates=templates)
     elif hasattr(arg, "abstract_expectationvalue"):
         E = arg.abstract_expectationvalue
-        dE = __grad_expectationvalue(E, variable=variable)
+        dE = __grad_expectationvalue(E, variable=variable, templates=templates)
         return compile(dE, **arg._input_args)
     else:
-        return __grad_objective(objective=arg, variable=variable)
+        return __grad_objective(objective=arg, variable=variable, templates=templates)
 
 
-def __grad_expectationvalue(E: ExpectationValueImpl, variable: Variable):
+def __grad_expectationvalue(E: ExpectationValueImpl, variable: Variable, templates: dict = None):
     '''
     implements the analytic partial derivative of a unitary as it would appear in an expectation value. See the paper.
     :param unitary: the unitary whose gradient should be obtained
     :param variables (list, dict, str): the variables with respect to which differentiation should be performed.
+    :param templates: shift templates of the expectationvalues (see __shift_template), filled on demand
     :return: vector (as dict) of dU/dpi as Objective (without hamiltonian)
     '''
 
-    hamiltonian = E.H
     unitary = E.U
     assert (unitary.verify())
 
@@ -201,7 +322,18 @@ def __grad_expectationvalue(E: ExpectationValueImpl, variable: Variable):
     if variable not in unitary.extract_variables():
         return 0.0
 
-    param_gates = unitary._parameter_map[variable]
+    # the shifted expectationvalues are all written as shifts of one template
+    if isinstance(E, ShiftedExpectationValueImpl):
+        W = E
+    else:
+        if templates is None:
+            templates = {}
+        key = E.fingerprint()
+        if key not in templates:
+            templates[key] = __shift_template(E)
+        W = templates[key]
+
+    param_gates = W.U._parameter_map[variable]
 
     dO = Objective()
     for idx_g in param_gates:
@@ -212,7 +344,7 @@ def __grad_expectationvalue(E: ExpectationValueImpl, variable: Variable):
         if not hasattr(g, "eigenvalues_magnitude"):
             raise TequilaException('No shift found for gate {}'.format(g))
 
-        dOinc = __grad_shift_rule(unitary, g, idx, variable, hamiltonian)
+        dOinc = __grad_shift_rule(W, g, idx, variable)
 
         dO += dOinc
 
@@ -220,50 +352,192 @@ def __grad_expectationvalue(E: ExpectationValueImpl, variable: Variable):
     return dO
 
 
-def __grad_shift_rule(unitary, g, i, variable, hamiltonian):
+def __shift_template(E: ExpectationValueImpl) -> ShiftedExpectationValueImpl:
+    '''
+    rewrite E as template where every parametrized gate that follows the two-term shift rule
+    carries an additional shift variable, all shifts set to zero.
+    :param E: the (compiled) expectationvalue
+    :return: E as ShiftedExpectationValueImpl
+    '''
+    gates = []
+    shifts = {}
+    parameters = {}
+    for i, g in enumerate(E.U.gates):
+        if g.is_parametrized() and not g.is_controlled() and hasattr(g, "eigenvalues_magnitude") \
+                and not hasattr(g, "shifted_gates") and len(g.extract_variables()) > 0:
+            s = Variable(("__shift__", i))
+            parameters[s] = g._parameter
+            g = copy.deepcopy(g)
+            g._parameter = g._parameter + s
+            shifts[s] = 0.0
+        gates.append(g)
+    template = ExpectationValueImpl(U=QCircuit(gates=gates), H=E.H)
+    return ShiftedExpectationValueImpl(template=template, shifts=shifts, parameters=parameters)
+
+
+def __grad_shift_rule(W: ShiftedExpectationValueImpl, g, i, variable):
     '''
     function for getting the gradients of directly differentiable gates. Expects precompiled circuits.
-    :param unitary: QCircuit: the QCircuit object containing the gate to be differentiated
+    :param W: ShiftedExpectationValueImpl: the expectationvalue containing the gate to be differentiated
     :param g: a parametrized: the gate being differentiated
-    :param i: Int: the position in unitary at which g appears
+    :param i: Int: the position in W.U at which g appears
     :param variable: Variable or String: the variable with respect to which gate g is being differentiated
-    :param hamiltonian: the hamiltonian with respect to which unitary is to be measured, in the case that unitary
-        is contained within an ExpectationValue
     :return: an Objective, whose calculation yields the gradient of g w.r.t variable
     '''
 
-
     # possibility for overwride in custom gate construction
+    # those gates are replaced, the shifted expectationvalues get templates of their own
     if hasattr(g, "shifted_gates"):
         inner_grad=__grad_inner(g.parameter, variable)
         shifted = g.shifted_gates()
         dOinc = Objective()
         for x in shifted:
             w,g = x
-            Ux = unitary.replace_gates(positions=[i], circuits=[g])
+            Ux = W.U.replace_gates(positions=[i], circuits=[g])
             wx = w*inner_grad
-            Ex = Objective.ExpectationValue(U=Ux, H=hamiltonian)
-            dOinc += wx*Ex
+            Ex = ShiftedExpectationValueImpl(template=ExpectationValueImpl(U=Ux, H=W.H), shifts=W.shifts,
+                                             parameters=W.parameters)
+            dOinc += wx*Objective(args=[Ex])
         return dOinc
 
     if not hasattr(g, "eigenvalues_magnitude"):
         raise TequilaException("No shift-rule found for gate {}. Neither shifted_gates nor eigenvalues_magnitude not defined".format(g))
 
-    # neo_a and neo_b are the shifted versions of gate g needed to evaluate its gradient
-    shift_a = g._parameter + pi / (4 * g.eigenvalues_magnitude)
-    shift_b = g._parameter - pi / (4 * g.eigenvalues_magnitude)
-    neo_a = copy.deepcopy(g)
-    neo_a._parameter = shift_a
-    neo_b = copy.deepcopy(g)
-    neo_b._parameter = shift_b
+    shift = [k for k in g.extract_variables() if k in W.shifts]
+    if len(shift) != 1:
+        raise TequilaException("No shift variable found for gate {}".format(g))
+    shift = shift[0]
+    inner_grad = __grad_inner(W.parameters[shift], variable)
 
-    U1 = unitary.replace_gates(positions=[i], circuits=[neo_a])
-    w1 = g.eigenvalues_magnitude * __grad_inner(g.parameter, variable)
+    # Eplus and Eminus are the shifted versions of gate g needed to evaluate its gradient
+    Eplus = ShiftedExpectationValueImpl(template=W.template, parameters=W.parameters,
+                                        shifts={**W.shifts, shift: W.shifts[shift] + pi / (4 * g.eigenvalues_magnitude)})
+    w1 = g.eigenvalues_magnitude * inner_grad
 
-    U2 = unitary.replace_gates(positions=[i], circuits=[neo_b])
-    w2 = -g.eigenvalues_magnitude * __grad_inner(g.parameter, variable)
+    Eminus = ShiftedExpectationValueImpl(template=W.template, parameters=W.parameters,
+                                         shifts={**W.shifts, shift: W.shifts[shift] - pi / (4 * g.eigenvalues_magnitude)})
+    w2 = -g.eigenvalues_magnitude * inner_grad
 
-    Oplus = ExpectationValueImpl(U=U1, H=hamiltonian)
-    Ominus = ExpectationValueImpl(U=U2, H=hamiltonian)
-    dOinc = w1 * Objective(args=[Oplus]) + w2 * Objective(args=[Ominus])
+    dOinc = w1 * Objective(args=[Eplus]) + w2 * Objective(args=[Eminus])
     return dOinc
+
+
+class SimulatedGradient:
+    """
+    Gradient of an objective where the derivatives of the expectationvalues are computed on simulated states.
+    The objective is compiled to the numpy backend (or the numpy_subspace backend for number conserving circuits)
+    and each expectationvalue provides the derivatives
+    with respect to all of its variables in one go (see BackendExpectationValueNumpy.gradient).
+    Derivatives of the transformations are taken with the autodiff backend, as in grad.
+    The result for the last point is stored, so that the components of a gradient can be evaluated
+    one after the other without repeating the simulation.
+
+    Attributes
+    ----------
+    objective:
+        the compiled objective
+    method:
+        the method to differentiate the expectationvalues, one of SIMULATED_GRADIENT_METHODS
+    """
+
+    def __init__(self, objective: typing.Union[Objective, VectorObjective], method: str = "checkpoint",
+                 backend: str = "numpy", **kwargs):
+        if backend not in ["numpy", "numpy_subspace"]:
+            raise TequilaException("gradient method {} needs the numpy or numpy_subspace backend, got {}".format(
+                method, backend))
+        self.objective = compile(objective, backend=backend)
+        self.method = method
+        self.kwargs = kwargs
+        self._point = None
+        self._result = None
+
+    def extract_variables(self) -> list:
+        return self.objective.extract_variables()
+
+    def __call__(self, variables, samples: int = None, *args, **kwargs) -> dict:
+        """
+        Parameters
+        ----------
+        variables:
+            the point at which the gradient is evaluated
+        samples:
+            needs to be None, the derivatives are computed from exact simulation
+
+        Returns
+        -------
+        dict:
+            the derivative with respect to every variable of the objective,
+            for VectorObjectives arrays with one entry per output
+        """
+        if samples is not None:
+            raise TequilaException("gradient method {} needs exact simulation, got samples={}".format(self.method, samples))
+        variables = format_variable_dictionary(variables)
+        point = tuple((k, variables[k]) for k in self.extract_variables())
+        if self._point is not None and point == self._point:
+            return self._result
+
+        evaluated = {}
+        differentiated = {}
+        outputs = []
+        for args, transformation in zip(self.objective.argsets, self.objective.transformations):
+            values = []
+            for arg in args:
+                if arg not in evaluated:
+                    evaluated[arg] = arg(variables)
+                values.append(evaluated[arg])
+
+            dO = {k: 0.0 for k in self.extract_variables()}
+            for i, arg in enumerate(args):
+                if isinstance(arg, Variable):
+                    inner = {arg: 1.0}
+                elif hasattr(arg, "U"):
+                    if not hasattr(arg, "gradient"):
+                        raise TequilaException(
+                            "gradient method {} not supported by expectationvalue of type {}".format(self.method, type(arg)))
+                    if arg not in differentiated:
+                        differentiated[arg] = arg.gradient(variables, method=self.method, **self.kwargs)
+                    inner = differentiated[arg]
+                else:
+                    continue
+
+                if transformation is None or transformation == identity:
+                    outer = 1.0
+                elif __AUTOGRAD__BACKEND__ == "jax":
+                    outer = jax.grad(transformation, argnums=i)(*values)
+                elif __AUTOGRAD__BACKEND__ == "autograd":
+                    outer = jax.grad(transformation, argnum=i)(*values)
+                else:
+                    raise TequilaException("Can't differentiate without autograd or jax")
+
+                for k, v in inner.items():
+                    dO[k] += float(outer) * v
+            outputs.append(dO)
+
+        if isinstance(self.objective, VectorObjective):
+            result = {k: numpy.asarray([dO[k] for dO in outputs]) for k in self.extract_variables()}
+        else:
+            result = outputs[0]
+        self._point = point
+        self._result = result
+        return result
+
+
+class SimulatedGradientComponent:
+    """
+    The derivative with respect to a single variable, used as argument of the Objectives returned by grad.
+    Components of the same gradient share one SimulatedGradient.
+    """
+
+    def __init__(self, gradient: SimulatedGradient, variable: Variable, position: int = None):
+        self.gradient = gradient
+        self.variable = variable
+        self.position = position
+
+    def extract_variables(self) -> list:
+        return self.gradient.extract_variables()
+
+    def __call__(self, variables, *args, **kwargs):
+        result = self.gradient(variables, *args, **kwargs)[self.variable]
+        if self.position is not None:
+            return result[self.position]
+        return result
@@ -0,0 +1,418 @@
+"""
+Packed symplectic representation of sums of Pauli strings
+
+Every term is stored as two bitmasks x and z and a coefficient.
+Qubit q is bit q % 64 of the uint64 word q // 64 (no limit on the number of qubits),
+the Pauli acting on it is I, X, Z or Y for (x,z) = (0,0), (1,0), (0,1) or (1,1).
+The coefficients are the ones of the Pauli strings as in openfermion (Y is not written as XZ).
+All operations are vectorized over the terms, the term order follows openfermion (order of first appearance).
+"""
+import numbers
+import typing
+import numpy
+
+from openfermion.config import EQ_TOLERANCE
+from tequila.utils.exceptions import TequilaException
+
+_POPCOUNT = numpy.array([bin(i).count("1") for i in range(256)], dtype=numpy.int64)
+# i^k for k = 0,1,2,3
+_PHASES = numpy.array([1.0, 1.0j, -1.0, -1.0j])
+_PAULI_NAMES = numpy.array(["I", "X", "Z", "Y"])
+# rows of the bitmask arrays that are unpacked at once
+_BLOCK = 2 ** 16
+
+
+def popcount(words: numpy.ndarray) -> numpy.ndarray:
+    """
+    Parameters
+    ----------
+    words:
+        uint64 array, the last axis holds the words of one bitmask
+
+    Returns
+    -------
+        the number of set bits of every bitmask
+    """
+    words = numpy.ascontiguousarray(words, dtype="<u8")
+    return _POPCOUNT[words.view(numpy.uint8)].sum(axis=-1)
+
+
+def unpack_bits(words: numpy.ndarray) -> numpy.ndarray:
+    """ bitmasks as (n, 64*n_words) array of 0/1, column q belongs to qubit q """
+    words = numpy.ascontiguousarray(words, dtype="<u8")
+    return numpy.unpackbits(words.view(numpy.uint8), axis=-1, bitorder="little")
+
+
+def _products(x1, z1, x2, z2):
+    """ bitmasks of the products of the Pauli strings (x1,z1) and (x2,z2) and the exponents k of the phases i^k """
+    x = x1 ^ x2
+    z = z1 ^ z2
+    k = (popcount(x1 & z1) + popcount(x2 & z2) + 2 * popcount(z1 & x2) - popcount(x & z)) % 4
+    return x, z, k
+
+
+def _coefficients(values) -> numpy.ndarray:
+    """ float array for real numbers, complex for complex numbers and object array for anything else """
+    values = list(values)
+    if all(isinstance(v, numbers.Real) for v in values):
+        return numpy.asarray(values, dtype=numpy.float64)
+    if all(isinstance(v, numbers.Complex) for v in values):
+        return numpy.asarray(values, dtype=numpy.complex128)
+    coeffs = numpy.empty(len(values), dtype=object)
+    coeffs[:] = values
+    return coeffs
+
+
+def _issmall(coeffs: numpy.ndarray, tol: float = EQ_TOLERANCE) -> numpy.ndarray:
+    """ vectorized version of the small coefficient check of openfermion """
+    if coeffs.dtype != object:
+        return numpy.abs(coeffs) < tol
+    result = numpy.zeros(len(coeffs), dtype=bool)
+    for i, v in enumerate(coeffs):
+        try:
+            result[i] = abs(complex(v)) < tol
+        except TypeError:
+            result[i] = False
+    return result
+
+
+class PackedPauliTerms:
+    """
+    Sum of Pauli strings as bitmask arrays, see the module description
+
+    Attributes
+    ----------
+    x:
+        uint64 array of shape (n_terms, n_words), the qubits acted on by X or Y
+    z:
+        uint64 array of shape (n_terms, n_words), the qubits acted on by Z or Y
+    coeffs:
+        coefficients of the terms, float or complex array (object array for symbolic coefficients)
+    """
+
+    def __init__(self, x: numpy.ndarray, z: numpy.ndarray, coeffs: numpy.ndarray):
+        self.coeffs = numpy.asarray(coeffs)
+        self.x = numpy.asarray(x, dtype=numpy.uint64)
+        self.z = numpy.asarray(z, dtype=numpy.uint64)
+        if self.x.ndim == 1:
+            self.x = self.x.reshape(-1, 1)
+            self.z = self.z.reshape(-1, 1)
+        if self.x.shape != self.z.shape:
+            raise TequilaException("x and z bitmasks do not match: {} and {}".format(self.x.shape, self.z.shape))
+
+    @classmethod
+    def from_terms(cls, terms: dict) -> "PackedPauliTerms":
+        """
+        Parameters
+        ----------
+        terms:
+            dictionary in the format of openfermion.QubitOperator.terms, e.g. {((0, 'X'), (2, 'Y')): 1.0}
+
+        Returns
+        -------
+            the packed terms
+        """
+        keys = list(terms.keys())
+        rows = []
+        qubits = []
+        letters = []
+        for i, key in enumerate(keys):
+            for q, p in key:
+                rows.append(i)
+                qubits.append(q)
+                letters.append(p)
+        n_qubits = max(qubits) + 1 if qubits else 0
+        n_words = max(1, (n_qubits + 63) // 64)
+        x = numpy.zeros((len(keys), n_words), dtype=numpy.uint64)
+        z = numpy.zeros((len(keys), n_words), dtype=numpy.uint64)
+        if rows:
+            rows = numpy.asarray(rows, dtype=numpy.int64)
+            qubits = numpy.asarray(qubits, dtype=numpy.int64)
+            letters = numpy.char.upper(numpy.asarray(letters, dtype=str))
+            words = qubits // 64
+            bits = numpy.left_shift(numpy.uint64(1), (qubits % 64).astype(numpy.uint64))
+            for mask, selection in [(x, (letters == "X") | (letters == "Y")), (z, (letters == "Z") | (letters == "Y"))]:
+                numpy.bitwise_or.at(mask, (rows[selection], words[selection]), bits[selection])
+        return cls(x=x, z=z, coeffs=_coefficients(terms.values()))
+
+    @classmethod
+    def empty(cls, n_words: int = 1) -> "PackedPauliTerms":
+        """ no terms, i.e. zero """
+        return cls(x=numpy.zeros((0, n_words), dtype=numpy.uint64), z=numpy.zeros((0, n_words), dtype=numpy.uint64),
+                   coeffs=numpy.zeros(0, dtype=numpy.float64))
+
+    @classmethod
+    def unit(cls, coeff=1.0, n_words: int = 1) -> "PackedPauliTerms":
+        """ the identity with the given coefficient """
+        return cls(x=numpy.zeros((1, n_words), dtype=numpy.uint64), z=numpy.zeros((1, n_words), dtype=numpy.uint64),
+                   coeffs=_coefficients([coeff]))
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.coeffs)
+
+    @property
+    def n_words(self) -> int:
+        return self.x.shape[1]
+
+    def __len__(self):
+        return self.n_terms
+
+    def __getitem__(self, item) -> "PackedPauliTerms":
+        """ selection of terms by index array or boolean mask """
+        return PackedPauliTerms(x=self.x[item], z=self.z[item], coeffs=self.coeffs[item])
+
+    def keys(self) -> list:
+        """
+        Returns
+        -------
+            the terms as keys in the openfermion format, qubits in ascending order
+        """
+        keys = []
+        for start in range(0, self.n_terms, _BLOCK):
+            x = unpack_bits(self.x[start:start + _BLOCK])
+            z = unpack_bits(self.z[start:start + _BLOCK])
+            rows, columns = numpy.nonzero(x | z)
+            names = _PAULI_NAMES[x[rows, columns] + 2 * z[rows, columns]].tolist()
+            columns = columns.tolist()
+            position = 0
+            for count in numpy.bincount(rows, minlength=len(x)).tolist():
+                keys.append(tuple(zip(columns[position:position + count], names[position:position + count])))
+                position += count
+        return keys
+
+    def coefficients(self) -> list:
+        """ the coefficients as python numbers """
+        return self.coeffs.tolist()
+
+    def to_terms(self) -> dict:
+        """ the terms in the format of openfermion.QubitOperator.terms """
+        return dict(zip(self.keys(), self.coefficients()))
+
+    def qubits(self) -> list:
+        """ the qubits that are acted on by at least one term, in ascending order """
+        if self.n_terms == 0:
+            return []
+        support = numpy.bitwise_or.reduce(self.x | self.z, axis=0)
+        return numpy.flatnonzero(unpack_bits(support)).tolist()
+
+    def is_all_z(self) -> bool:
+        return not self.x.any()
+
+    def count_y(self) -> numpy.ndarray:
+        """ the number of Y operators in every term """
+        return popcount(self.x & self.z)
+
+    def resized(self, n_words: int) -> "PackedPauliTerms":
+        """ the same terms with (at least) n_words words per bitmask """
+        if n_words <= self.n_words:
+            return self
+        padding = numpy.zeros((self.n_terms, n_words - self.n_words), dtype=numpy.uint64)
+        return PackedPauliTerms(x=numpy.hstack([self.x, padding]), z=numpy.hstack([self.z, padding]),
+                                coeffs=self.coeffs)
+
+    @staticmethod
+    def concatenate(terms: typing.List["PackedPauliTerms"]) -> "PackedPauliTerms":
+        """ all terms in order, without combining equal Pauli strings """
+        n_words = max(t.n_words for t in terms)
+        terms = [t.resized(n_words) for t in terms]
+        coeffs = numpy.concatenate([t.coeffs for t in terms])
+        return PackedPauliTerms(x=numpy.vstack([t.x for t in terms]), z=numpy.vstack([t.z for t in terms]),
+                                coeffs=coeffs)
+
+    def combined(self) -> typing.Tuple["PackedPauliTerms", numpy.ndarray]:
+        """
+        Combine terms with equal Pauli strings
+
+        Returns
+        -------
+            the combined terms in order of first appearance, and the index of the combined term for every term
+        """
+        if self.n_terms == 0:
+            return self, numpy.zeros(0, dtype=numpy.int64)
+        rows = numpy.hstack([self.x, self.z])
+        _, first, inverse = numpy.unique(rows, axis=0, return_index=True, return_inverse=True)
+        order = numpy.argsort(first, kind="stable")
+        rank = numpy.empty_like(order)
+        rank[order] = numpy.arange(len(order))
+        groups = rank[inverse.reshape(-1)]
+        coeffs = numpy.zeros(len(order), dtype=self.coeffs.dtype)
+        numpy.add.at(coeffs, groups, self.coeffs)
+        return PackedPauliTerms(x=self.x[first[order]], z=self.z[first[order]], coeffs=coeffs), groups
+
+    def scaled(self, factor) -> "PackedPauliTerms":
+        return PackedPauliTerms(x=self.x, z=self.z, coeffs=self.coeffs * factor)
+
+    def add(self, other: "PackedPauliTerms", factor=1.0) -> "PackedPauliTerms":
+        """
+        self + factor*other with the conventions of openfermion:
+        terms of other are added one by one and removed if the sum is small
+
+        Parameters
+        ----------
+        other:
+            the terms to add
+        factor:
+            scales other
+
+        Returns
+        -------
+            the sum
+        """
+        other = other if factor == 1.0 else other.scaled(factor)
+        total, groups = PackedPauliTerms.concatenate([self, other]).combined()
+        touched = numpy.zeros(total.n_terms, dtype=bool)
+        touched[groups[self.n_terms:]] = True
+        return total[~(touched & _issmall(total.coeffs))]
+
+    def multiply(self, other: "PackedPauliTerms") -> "PackedPauliTerms":
+        """
+        Product of two sums of Pauli strings, terms are combined but not removed (like openfermion)
+        The phase of a product follows from sigma(x,z) = i^{x.z} X^x Z^z
+
+        Parameters
+        ----------
+        other:
+            right factor
+
+        Returns
+        -------
+            self*other
+        """
+        n_words = max(self.n_words, other.n_words)
+        left = self.resized(n_words)
+        right = other.resized(n_words)
+        i = numpy.repeat(numpy.arange(left.n_terms), right.n_terms)
+        j = numpy.tile(numpy.arange(right.n_terms), left.n_terms)
+        x, z, k = _products(left.x[i], left.z[i], right.x[j], right.z[j])
+        phases = _PHASES[k] if (k % 2).any() else _PHASES[k].real
+        coeffs = left.coeffs[i] * right.coeffs[j] * phases
+        return PackedPauliTerms(x=x, z=z, coeffs=coeffs).combined()[0]
+
+    def multiply_rows(self, other: "PackedPauliTerms") -> "PackedPauliTerms":
+        """
+        Products of the terms with equal index (both need the same number of terms), terms are not combined
+
+        Parameters
+        ----------
+        other:
+            right factors
+
+        Returns
+        -------
+            the terms self[i]*other[i]
+        """
+        if self.n_terms != other.n_terms:
+            raise TequilaException("row-wise product of {} and {} terms".format(self.n_terms, other.n_terms))
+        n_words = max(self.n_words, other.n_words)
+        left = self.resized(n_words)
+        right = other.resized(n_words)
+        x, z, k = _products(left.x, left.z, right.x, right.z)
+        phases = _PHASES[k] if (k % 2).any() else _PHASES[k].real
+        return PackedPauliTerms(x=x, z=z, coeffs=left.coeffs * right.coeffs * phases)
+
+    def anticommutation(self, other: "PackedPauliTerms" = None) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        other:
+            terms to compare with, default are the terms themselves
+
+        Returns
+        -------
+            boolean matrix, entry (i,j) is True if term i of self and term j of other anticommute
+        """
+        other = self if other is None else other
+        n_words = max(self.n_words, other.n_words)
+        left = self.resized(n_words)
+        right = other.resized(n_words)
+        result = numpy.empty((left.n_terms, right.n_terms), dtype=bool)
+        step = max(1, _BLOCK // max(1, right.n_terms))
+        for start in range(0, left.n_terms, step):
+            x1 = left.x[start:start + step, None, :]
+            z1 = left.z[start:start + step, None, :]
+            symplectic = (x1 & right.z[None, :, :]) ^ (z1 & right.x[None, :, :])
+            result[start:start + step] = popcount(symplectic) % 2 == 1
+        return result
+
+    def commutator(self, other: "PackedPauliTerms") -> "PackedPauliTerms":
+        """ [self, other], only anticommuting pairs of terms contribute 2*P*Q """
+        n_words = max(self.n_words, other.n_words)
+        left = self.resized(n_words)
+        right = other.resized(n_words)
+        i, j = numpy.nonzero(left.anticommutation(right))
+        if len(i) == 0:
+            return PackedPauliTerms.empty(n_words=n_words)
+        x, z, k = _products(left.x[i], left.z[i], right.x[j], right.z[j])
+        coeffs = 2.0 * left.coeffs[i] * right.coeffs[j] * _PHASES[k]
+        return PackedPauliTerms(x=x, z=z, coeffs=coeffs).combined()[0]
+
+    def simplified(self, threshold: float = 0.0) -> "PackedPauliTerms":
+        """ without the terms whose coefficients are zero up to threshold """
+        if self.coeffs.dtype == object:
+            keep = numpy.asarray([not numpy.isclose(v, 0.0, atol=threshold) for v in self.coeffs], dtype=bool)
+        else:
+            keep = numpy.abs(self.coeffs) > threshold
+        return self[keep]
+
+    def mapped(self, qubit_map: dict) -> "PackedPauliTerms":
+        """
+        Parameters
+        ----------
+        qubit_map:
+            maps the old to the new qubits, needs to contain all qubits that are acted on
+
+        Returns
+        -------
+            the terms acting on the new qubits
+        """
+        qubits = self.qubits()
+        targets = [qubit_map[q] for q in qubits]
+        n_words = max(1, (max(targets, default=-1) + 64) // 64)
+        x = numpy.zeros((self.n_terms, n_words), dtype=numpy.uint64)
+        z = numpy.zeros((self.n_terms, n_words), dtype=numpy.uint64)
+        for q, t in zip(qubits, targets):
+            source = numpy.uint64(q % 64)
+            target = numpy.uint64(t % 64)
+            x[:, t // 64] |= ((self.x[:, q // 64] >> source) & numpy.uint64(1)) << target
+            z[:, t // 64] |= ((self.z[:, q // 64] >> source) & numpy.uint64(1)) << target
+        return PackedPauliTerms(x=x, z=z, coeffs=self.coeffs)
+
+    def traced_out(self, qubits: list, states: list) -> "PackedPauliTerms":
+        """
+        Trace out qubits in the given product state:
+        the terms are multiplied with <psi|P|psi> for the Paulis P acting on those qubits, equal terms are combined
+        and small ones removed
+
+        Parameters
+        ----------
+        qubits:
+            the qubits to trace out
+        states:
+            the states a|0> + b|1> of the qubits as tuples (a,b)
+
+        Returns
+        -------
+            the reduced terms
+        """
+        factors = numpy.ones(self.n_terms, dtype=complex)
+        x = self.x.copy()
+        z = self.z.copy()
+        for q, (a, b) in zip(qubits, states):
+            if q // 64 >= self.n_words:
+                continue
+            word = q // 64
+            bit = numpy.uint64(1) << numpy.uint64(q % 64)
+            codes = ((x[:, word] & bit) != 0).astype(numpy.int64) + 2 * ((z[:, word] & bit) != 0).astype(numpy.int64)
+            ca = numpy.conjugate(a)
+            cb = numpy.conjugate(b)
+            # <psi|P|psi> for P = I, X, Z, Y, the identity does not change the term
+            table = numpy.asarray([1.0, ca * b + cb * a, ca * a - cb * b, -1.0j * ca * b + 1.0j * cb * a],
+                                  dtype=complex)
+            factors *= table[codes]
+            x[:, word] &= ~bit
+            z[:, word] &= ~bit
+        if not numpy.iscomplexobj(self.coeffs) and not factors.imag.any():
+            factors = factors.real
+        reduced, _ = PackedPauliTerms(x=x, z=z, coeffs=self.coeffs * factors).combined()
+        return reduced[~_issmall(reduced.coeffs)]
@@ -1,10 +1,13 @@
 import numbers
 import typing
 import numpy
+import scipy.sparse.linalg
 
 from tequila.tools import number_to_string
-from tequila.utils import to_float
+from tequila.utils import to_float, fingerprint
 from tequila import TequilaException
+from tequila.hamiltonian.packed import PackedPauliTerms
+from tequila.wavefunction.pauli_kernels import make_pauli_masks, sparse_matrix_from_masks, apply_masks, parity
 
 from openfermion import QubitOperator
 from functools import reduce
@@ -14,9 +17,8 @@ from collections import namedtuple
 BinaryPauli = namedtuple("BinaryPauli", "coeff, binary")
 
 """
-Explicit matrix forms for the Pauli operators for the tomatrix method
-For sparse matrices use the openfermion tool
-get the openfermion object with hamiltonian.hamiltonian
+Explicit matrix forms for the Pauli operators
+For sparse matrices use QubitHamiltonian.to_sparse or QubitHamiltonian.to_linear_operator
 """
 import numpy as np
 
@@ -82,6 +84,12 @@ class PauliString:
 
         self._all_z = all([x.lower() == "z" for x in data.values()])
 
+    def fingerprint(self) -> tuple:
+        """
+        :return: canonical structural representation (qubits, paulis and coefficient), see tequila.utils.fingerprint
+        """
+        return "PauliString", tuple(sorted((k, v.upper()) for k, v in self._data.items())), fingerprint(self._coeff)
+
     def trace_out_qubits(self, qubits, states=None):
         """
         See trace_out_qubits in QubitHamiltonian
@@ -247,7 +255,8 @@ class PauliString:
 class QubitHamiltonian:
     """
     Default QubitHamiltonian
-    Uses OpenFermion Structures for arithmetics
+    Arithmetics, tracing and mapping of qubits work on the packed bitmask representation (see PackedPauliTerms)
+    the OpenFermion QubitOperator is only constructed when it is requested
     """
 
     # convenience
@@ -258,6 +267,12 @@ class QubitHamiltonian:
     def from_openfermion(cls, qubit_operator: QubitOperator):
         return QubitHamiltonian(qubit_operator=qubit_operator)
 
+    @classmethod
+    def from_packed(cls, packed: PackedPauliTerms):
+        result = cls.__new__(cls)
+        result._set_packed(packed)
+        return result
+
     def to_openfermion(self) -> QubitOperator:
         return self.qubit_operator
 
@@ -265,22 +280,78 @@ class QubitHamiltonian:
     def qubit_operator(self) -> QubitOperator:
         """
         :return: The underlying OpenFermion QubitOperator
+        the returned operator can be modified by the caller, cached representations are therefore dropped
+        (tequila itself only reads the operator through _operator, which keeps them)
+        """
+        operator = self._operator()
+        self._set_operator(operator)
+        return operator
+
+    @qubit_operator.setter
+    def qubit_operator(self, other: QubitOperator) -> QubitOperator:
+        self._set_operator(other)
+
+    @property
+    def packed(self) -> PackedPauliTerms:
+        """
+        :return: The Hamiltonian as X/Z bitmasks and coefficients, see PackedPauliTerms
         """
+        if self._packed is None:
+            self._packed = PackedPauliTerms.from_terms(self._qubit_operator.terms)
+        return self._packed
+
+    def _operator(self) -> QubitOperator:
+        # read access to the openfermion operator, converted from the packed terms if necessary
+        if self._qubit_operator is None:
+            operator = QubitOperator.zero()
+            operator.terms = self._packed.to_terms()
+            self._qubit_operator = operator
         return self._qubit_operator
 
+    def _set_operator(self, operator: QubitOperator):
+        self._qubit_operator = operator
+        self._packed = None
+        self._paulistrings = None
+        self._fingerprint = None
+
+    def _set_packed(self, packed: PackedPauliTerms):
+        self._qubit_operator = None
+        self._packed = packed
+        self._paulistrings = None
+        self._fingerprint = None
+
     @property
     def qubits(self):
         """
         :return: All Qubits the Hamiltonian acts on
         """
-        accumulate = []
-        for ps in self.paulistrings:
-            accumulate += ps.qubits
-        return sorted(list(set(accumulate)))
+        return self.packed.qubits()
 
-    @qubit_operator.setter
-    def qubit_operator(self, other: QubitOperator) -> QubitOperator:
-        self._qubit_operator = other
+    def fingerprint(self) -> tuple:
+        """
+        Canonical structural representation of the Hamiltonian (terms and coefficients), see tequila.utils.fingerprint
+        Cached until the qubit_operator is reassigned (arithmetic with tequila operators does that)
+        :return: hashable tuple, equal for Hamiltonians with the same terms
+        """
+        if getattr(self, "_fingerprint", None) is None:
+            terms = self._operator().terms
+            self._fingerprint = "QubitHamiltonian", tuple(sorted((k, fingerprint(v)) for k, v in terms.items()))
+        return self._fingerprint
+
+    def __getstate__(self):
+        # the cached fingerprint can refer to the identity of coefficients, copies compute their own
+        # the other caches are rebuilt from the operator when needed
+        state = dict(self.__dict__)
+        state["_qubit_operator"] = self._operator()
+        state["_packed"] = None
+        state["_paulistrings"] = None
+        state["_fingerprint"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for cache in ["_packed", "_paulistrings", "_fingerprint"]:
+            self.__dict__.setdefault(cache, None)
 
     def index(self, ituple):
         return ituple[0]
@@ -303,13 +374,13 @@ class QubitHamiltonian:
         if Number: initialized as scaled unit operator
         """
         if isinstance(qubit_operator, str):
-            self._qubit_operator = self.from_string(string=qubit_operator)._qubit_operator
+            self._set_operator(self.from_string(string=qubit_operator)._operator())
         elif qubit_operator is None:
-            self._qubit_operator = QubitOperator.zero()
+            self._set_operator(QubitOperator.zero())
         elif isinstance(qubit_operator, numbers.Number):
-            self._qubit_operator = qubit_operator * QubitOperator.identity()
+            self._set_operator(qubit_operator * QubitOperator.identity())
         else:
-            self._qubit_operator = qubit_operator
+            self._set_operator(qubit_operator)
 
         assert (isinstance(self._qubit_operator, QubitOperator))
 
@@ -335,8 +406,7 @@ class QubitHamiltonian:
             # states should be given as list of individual tq.QubitWaveFunctions
             states = [tuple(s.to_array()) for s in states]
 
-        reduced_ps = [ps.trace_out_qubits(qubits=qubits, states=states) for ps in self.paulistrings]
-        return self.from_paulistrings(ps=reduced_ps).simplify(*args, **kwargs)
+        return self.from_packed(self.packed.traced_out(qubits=qubits, states=states)).simplify(*args, **kwargs)
 
     def count_measurements(self):
         if self.is_all_z():
@@ -345,7 +415,9 @@ class QubitHamiltonian:
             return len(self)
 
     def __len__(self):
-        return len(self.paulistrings)
+        if self._qubit_operator is None:
+            return self._packed.n_terms
+        return len(self._qubit_operator.terms)
 
     def __repr__(self):
         result = ""
@@ -354,20 +426,22 @@ class QubitHamiltonian:
         return result
 
     def __getitem__(self, item):
-        return self._qubit_operator.terms[item]
+        return self._operator().terms[item]
 
     def __setitem__(self, key, value):
-        self._qubit_operator.terms[key] = value
+        operator = self._operator()
+        operator.terms[key] = value
+        self._set_operator(operator)
         return self
 
     def items(self):
-        return self._qubit_operator.terms.items()
+        return self._operator().terms.items()
 
     def keys(self):
-        return self._qubit_operator.terms.keys()
+        return self._operator().terms.keys()
 
     def values(self):
-        return self._qubit_operator.terms.values()
+        return self._operator().terms.values()
 
     @classmethod
     def zero(cls):
@@ -435,30 +509,24 @@ class QubitHamiltonian:
                 H += QubitHamiltonian(qubit_operator=QubitOperator(term=x.key_openfermion(), coefficient=x.coeff))
             return H.simplify()
 
-    def __add__(self, other):
+    def _packed_terms(self, other) -> PackedPauliTerms:
+        # numbers are treated as multiples of the unit operator
         if isinstance(other, numbers.Number):
-            return QubitHamiltonian(qubit_operator=self.qubit_operator + other * self.unit().qubit_operator)
-        else:
-            return QubitHamiltonian(qubit_operator=self.qubit_operator + other.qubit_operator)
+            return PackedPauliTerms.unit(coeff=other)
+        return other.packed
+
+    def __add__(self, other):
+        return self.from_packed(self.packed.add(self._packed_terms(other)))
 
     def __sub__(self, other):
-        if isinstance(other, numbers.Number):
-            return QubitHamiltonian(qubit_operator=self.qubit_operator - other * self.unit().qubit_operator)
-        else:
-            return QubitHamiltonian(qubit_operator=self.qubit_operator - other.qubit_operator)
+        return self.from_packed(self.packed.add(self._packed_terms(other), -1.0))
 
     def __iadd__(self, other):
-        if isinstance(other, numbers.Number):
-            self.qubit_operator += other * self.unit().qubit_operator
-        else:
-            self.qubit_operator += other.qubit_operator
+        self._set_packed(self.packed.add(self._packed_terms(other)))
         return self
 
     def __isub__(self, other):
-        if isinstance(other, numbers.Number):
-            self.qubit_operator -= other * self.unit().qubit_operator
-        else:
-            self.qubit_operator -= other.qubit_operator
+        self._set_packed(self.packed.add(self._packed_terms(other), -1.0))
         return self
 
     def __mul__(self, other):
@@ -466,20 +534,20 @@ class QubitHamiltonian:
             # actually an apply operation
             return other.apply_qubitoperator(operator=self)
         elif isinstance(other, numbers.Number):
-            return QubitHamiltonian(qubit_operator=self.qubit_operator * other)
+            return self.from_packed(self.packed.scaled(other))
         else:
-            return QubitHamiltonian(qubit_operator=self.qubit_operator * other.qubit_operator)
+            return self.from_packed(self.packed.multiply(other.packed))
 
     def __imul__(self, other):
         if isinstance(other, numbers.Number):
-            self.qubit_operator *= other
+            self._set_packed(self.packed.scaled(other))
         else:
-            self.qubit_operator *= other.qubit_operator
+            self._set_packed(self.packed.multiply(other.packed))
         return self
 
     def __rmul__(self, other):
         assert isinstance(other, numbers.Number)
-        return QubitHamiltonian(qubit_operator=self.qubit_operator * other)
+        return self.from_packed(self.packed.scaled(other))
 
     def __radd__(self, other):
         return self.__add__(other=other)
@@ -488,30 +556,69 @@ class QubitHamiltonian:
         return self.__neg__().__add__(other=other)
 
     def __pow__(self, power):
-        return QubitHamiltonian(qubit_operator=self.qubit_operator ** power)
+        return QubitHamiltonian(qubit_operator=self._operator() ** power)
 
     def __neg__(self):
         return self.__mul__(other=-1.0)
 
     def __eq__(self, other):
-        return self._qubit_operator == other._qubit_operator
+        return self._operator() == other._operator()
 
     def is_hermitian(self):
+        terms = self._operator().terms
         try:
-            for k, v in self.qubit_operator.terms.items():
-                self.qubit_operator.terms[k] = to_float(v)
-            return True
+            converted = {k: to_float(v) for k, v in terms.items()}
         except TypeError:
             return False
+        # cast the coefficients to floats, the cached representations are only dropped if something changes
+        if any(not isinstance(v, float) for v in terms.values()):
+            operator = QubitOperator.zero()
+            operator.terms = converted
+            self._set_operator(operator)
+        return True
 
     def simplify(self, threshold=0.0):
-        simplified = {}
-        for k, v in self.qubit_operator.terms.items():
-            if not numpy.isclose(v, 0.0, atol=threshold):
-                simplified[k] = v
-        self._qubit_operator.terms = simplified
+        self._set_packed(self.packed.simplified(threshold=threshold))
         return self
 
+    def anticommutation_matrix(self, other=None) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        other
+            QubitHamiltonian to compare with, default is the Hamiltonian itself
+
+        Returns
+        -------
+            boolean matrix, entry (i,j) is True if the i-th paulistring of self and the j-th paulistring of other
+            anticommute (order as in paulistrings)
+        """
+        other = self if other is None else other
+        return self.packed.anticommutation(other.packed)
+
+    def commutator(self, other):
+        """
+        Returns
+        -------
+            the commutator [self, other] as QubitHamiltonian, only anticommuting pairs of paulistrings contribute
+        """
+        return self.from_packed(self.packed.commutator(other.packed))
+
+    def commutes_with(self, other, threshold=1.e-8) -> bool:
+        """
+        Parameters
+        ----------
+        other
+            QubitHamiltonian
+        threshold
+            coefficients of the commutator below threshold are considered zero
+
+        Returns
+        -------
+            True if the commutator of both Hamiltonians vanishes
+        """
+        return len(self.packed.commutator(other.packed).simplified(threshold=threshold)) == 0
+
     def split(self, *args, **kwargs) -> tuple:
         """
         Returns
@@ -520,9 +627,11 @@ class QubitHamiltonian:
         """
         hermitian = QubitHamiltonian.zero()
         anti_hermitian = QubitHamiltonian.zero()
-        for k, v in self.qubit_operator.terms.items():
-            hermitian.qubit_operator.terms[k] = numpy.float(v.real)
-            anti_hermitian.qubit_operator.terms[k] = 1.j * v.imag
+        hermitian_terms = hermitian.qubit_operator.terms
+        anti_hermitian_terms = anti_hermitian.qubit_operator.terms
+        for k, v in self.items():
+            hermitian_terms[k] = numpy.float(v.real)
+            anti_hermitian_terms[k] = 1.j * v.imag
 
         return hermitian.simplify(), anti_hermitian.simplify()
 
@@ -534,7 +643,7 @@ class QubitHamiltonian:
 
     def conjugate(self):
         conj_hamiltonian = QubitOperator("", 0)
-        for key, value in self._qubit_operator.terms.items():
+        for key, value in self.items():
             sign = 1
             for term in key:
                 p = self.pauli(term)
@@ -546,7 +655,7 @@ class QubitHamiltonian:
 
     def transpose(self):
         trans_hamiltonian = QubitOperator("", 0)
-        for key, value in self._qubit_operator.terms.items():
+        for key, value in self.items():
             sign = 1
             for term in key:
                 p = self.pauli(term)
@@ -558,13 +667,13 @@ class QubitHamiltonian:
 
     def dagger(self):
         dag_hamiltonian = QubitOperator("", 0)
-        for key, value in self._qubit_operator.terms.items():
+        for key, value in self.items():
             dag_hamiltonian.terms[key] = value.conjugate()
 
         return QubitHamiltonian(qubit_operator=dag_hamiltonian)
 
     def normalize(self):
-        self._qubit_operator.renormalize()
+        self.qubit_operator.renormalize()
         return self
 
     def to_matrix(self, ignore_unused_qubits=True):
@@ -584,23 +693,63 @@ class QubitHamiltonian:
 
         :return: numpy.ndarray(2**N, 2**N) with type numpy.complex
         """
+        return self.to_sparse(ignore_unused_qubits=ignore_unused_qubits).toarray().astype(numpy.complex)
+
+    def _matrix_masks(self, ignore_unused_qubits=True) -> tuple:
+        # number of qubits and bitmasks for the matrix representations, the first qubit is the leading one (like kron)
         qubits = self.qubits
         if ignore_unused_qubits:
-            nq = len(qubits)
+            qubit_map = {q: i for i, q in enumerate(qubits)}
         else:
-            nq = max(qubits)+1
-        I = numpy.eye(2, dtype=numpy.complex)
-        Hm = numpy.zeros((2 ** nq, 2 ** nq), dtype=numpy.complex)
+            qubit_map = {q: q for q in qubits}
+        n_qubits = len(qubit_map) if ignore_unused_qubits else max(qubits, default=-1) + 1
+        return n_qubits, make_pauli_masks(self, n_qubits=n_qubits, qubit_map=qubit_map)
 
-        for key, val in self.items():
-            term = [I] * nq
+    def to_sparse(self, ignore_unused_qubits=True):
+        """
+        Sparse matrix of the Hamiltonian, qubit ordering as in to_matrix
+        The non-zero entries are computed directly from the X/Z bitmasks of the paulistrings
 
-            for ind, op in key:
-                ind = qubits.index(ind)
-                term[ind] = pauli_matrices[op]
+        Parameters
+        ----------
+        ignore_unused_qubits
+            see to_matrix
+
+        Returns
+        -------
+            scipy.sparse.csr_matrix of dimension 2**N x 2**N
+        """
+        n_qubits, masks = self._matrix_masks(ignore_unused_qubits=ignore_unused_qubits)
+        return sparse_matrix_from_masks(*masks, n_qubits=n_qubits)
 
-            Hm += val * reduce(numpy.kron, term)
-        return Hm
+    def to_linear_operator(self, ignore_unused_qubits=True):
+        """
+        Matrix-free representation of the Hamiltonian, qubit ordering as in to_matrix
+        Only the bitmasks of the paulistrings are stored, H is applied to vectors on the fly
+        Can be used with scipy.sparse.linalg (e.g. eigsh or expm_multiply)
+
+        Parameters
+        ----------
+        ignore_unused_qubits
+            see to_matrix
+
+        Returns
+        -------
+            scipy.sparse.linalg.LinearOperator of dimension 2**N x 2**N
+        """
+        n_qubits, (xmasks, zmasks, coeffs) = self._matrix_masks(ignore_unused_qubits=ignore_unused_qubits)
+        dim = 2 ** n_qubits
+        # the paulistrings are hermitian, the adjoint only conjugates c in c i^{n_y}
+        adjoint_coeffs = coeffs.conj() * (1.0 - 2.0 * parity(xmasks & zmasks))
+
+        def apply(vectors, c):
+            # apply_masks expects the states in the last axis
+            return apply_masks(numpy.asarray(vectors).reshape(dim, -1).T, xmasks, zmasks, c).T
+
+        return scipy.sparse.linalg.LinearOperator(shape=(dim, dim), dtype=complex,
+                                                  matvec=lambda v: apply(v, coeffs).reshape(-1),
+                                                  rmatvec=lambda v: apply(v, adjoint_coeffs).reshape(-1),
+                                                  matmat=lambda v: apply(v, coeffs))
 
     @property
     def n_qubits(self):
@@ -611,7 +760,9 @@ class QubitHamiltonian:
         """
         :return: the Hamiltonian as list of PauliStrings
         """
-        return [PauliString.from_openfermion(key=k, coeff=v) for k, v in self.items()]
+        if self._paulistrings is None:
+            self._paulistrings = [PauliString.from_openfermion(key=k, coeff=v) for k, v in self.items()]
+        return list(self._paulistrings)
 
     @paulistrings.setter
     def paulistrings(self, other):
@@ -624,7 +775,7 @@ class QubitHamiltonian:
         for ps in other:
             tmp = QubitOperator(term=ps.key_openfermion(), value=ps.coeff)
             new_hamiltonian += tmp
-        self._qubit_operator = new_hamiltonian
+        self._set_operator(new_hamiltonian)
         return self
 
     def map_qubits(self, qubit_map: dict):
@@ -643,15 +794,7 @@ class QubitHamiltonian:
 
         """
 
-        mapped_terms = {}
-
-        for k, v in self.qubit_operator.terms.items():
-            mk = tuple([(qubit_map[x[0]], x[1]) for x in k])
-            mapped_terms[mk] = v
-
-        mapped = QubitOperator.zero()
-        mapped.terms = mapped_terms
-        return QubitHamiltonian(qubit_operator=mapped)
+        return self.from_packed(self.packed.mapped(qubit_map=qubit_map))
 
     def is_all_z(self):
         """
@@ -659,7 +802,4 @@ class QubitHamiltonian:
         -------
             returns True if all non-unit paulis in the hamiltonian are Z
         """
-        for p in self.paulistrings:
-            if not p.is_all_z():
-                return False
-        return True
+        return self.packed.is_all_z()
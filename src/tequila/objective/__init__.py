@@ -1,3 +1,3 @@
 from tequila.objective.objective import Objective,\
     VectorObjective, ExpectationValue, Variable, assign_variable, format_variable_list, \
-    format_variable_dictionary,vectorize
+    format_variable_dictionary,vectorize, EvaluationPlan
@@ -1,7 +1,7 @@
 import typing, copy, numbers
 
 from tequila import TequilaException
-from tequila.utils import JoinedTransformation, to_float
+from tequila.utils import JoinedTransformation, to_float, fingerprint
 from tequila.tools.convenience import list_assignment
 from tequila.hamiltonian import paulis
 from tequila.grouping.binary_rep import BinaryHamiltonian
@@ -77,6 +77,19 @@ class ExpectationValueImpl:
         if self.U is not None:
             self.U.replace_variables(replacement)
 
+    def fingerprint(self) -> tuple:
+        """
+        Canonical structural representation of the expectationvalue (circuit, hamiltonians, contraction and shape)
+        Expectationvalues with equal fingerprints have the same value, see tequila.utils.fingerprint
+
+        Returns
+        -------
+        tuple:
+            hashable, equal for structurally equal expectationvalues
+        """
+        return "ExpectationValue", fingerprint(self._unitary), fingerprint(self._hamiltonian), \
+               fingerprint(self._contraction), fingerprint(self._shape)
+
     def __init__(self, U=None, H=None, contraction=None, shape=None, *args, **kwargs):
         """
 
@@ -129,6 +142,48 @@ class ExpectationValueImpl:
             print("Hamiltonian:\n", str(self.H))
             print("\n", str(self.U))
 
+class ShiftedExpectationValueImpl(ExpectationValueImpl):
+    """
+    An expectationvalue whose circuit is a shared template with additional shift variables,
+    together with fixed values for those variables.
+
+    The shifted expectationvalues of parameter shift gradients only differ in the angles of single gates.
+    Written as shifts of the same template they can share one compiled circuit,
+    compiled they only rebind the shift variables (see BackendExpectationValue).
+
+    Attributes
+    ----------
+    template:
+        the ExpectationValueImpl whose circuit carries the shift variables
+    shifts:
+        dictionary assigning values to all shift variables of the template.
+        Shift variables are not reported by extract_variables.
+    parameters:
+        dictionary assigning to the shift variables the parameters of the gates they shift, without the shift
+    """
+
+    def __init__(self, template: ExpectationValueImpl, shifts: dict, parameters: dict = None):
+        self.template = template
+        self.shifts = shifts
+        self.parameters = parameters if parameters is not None else {}
+        # share circuit and hamiltonians with the template, no copies
+        self._unitary = template._unitary
+        self._hamiltonian = template._hamiltonian
+        self._contraction = template._contraction
+        self._shape = template._shape
+
+    def extract_variables(self) -> list:
+        return [k for k in self.template.extract_variables() if k not in self.shifts]
+
+    def fingerprint(self) -> tuple:
+        shifts = tuple(sorted(((fingerprint(k), fingerprint(v)) for k, v in self.shifts.items()), key=str))
+        return "ShiftedExpectationValue", self.template.fingerprint(), shifts
+
+    def map_qubits(self, qubit_map: dict):
+        return ShiftedExpectationValueImpl(template=self.template.map_qubits(qubit_map=qubit_map), shifts=self.shifts,
+                                           parameters=self.parameters)
+
+
 def identity(x):
     """
     Returns input unchanged.
@@ -161,6 +216,8 @@ class Objective:
     """
 
     def __init__(self, args: typing.Iterable = None, transformation: typing.Callable = None):
+        # evaluates the expectationvalues in parallel, set by compile
+        self._executor = None
         if args is None:
             self._args = tuple()
             self._transformation = lambda *x: 0.0
@@ -484,6 +541,10 @@ class Objective:
         else:
             return len(self.get_expectationvalues())
 
+    def fingerprint(self) -> tuple:
+        """ structural representation, see tequila.utils.fingerprint """
+        return "Objective", fingerprint(self.args), fingerprint(self.transformation)
+
     def __str__(self):
         return self.__repr__()
 
@@ -516,15 +577,54 @@ class Objective:
         ----------
         variables: dict:
             dictionary instantiating all variables that may appear within the objective.
+            A batch of variables can be passed as list of dictionaries
+            or as array of shape (n_points, n_variables) with columns ordered as in self.extract_variables()
         args
         kwargs
 
         Returns
         -------
-        float:
+        float or numpy.ndarray:
             the result of the calculation represented by this objective.
+            For batches, an array with one entry for each point
         """
+        if is_variable_batch(variables):
+            return self._call_batch(variables, *args, **kwargs)
+
         variables = format_variable_dictionary(variables)
+        self._check_variables(variables)
+
+        # avoid multiple evaluations
+        evaluated = _evaluate_args(self.args, variables, self._executor, False, *args, **kwargs)
+        return self._from_values(evaluated)
+
+    def _from_values(self, values: dict, n_points: int = None):
+        """
+        The output of the objective, given the values of its arguments.
+
+        Parameters
+        ----------
+        values: dict:
+            the value of every argument, for batches the list of its values at all points
+        n_points: int, optional:
+            the number of points of a batch, None for a single point
+
+        Returns
+        -------
+        float or numpy.ndarray:
+            the result, see __call__
+        """
+        if n_points is not None:
+            result = [self.transformation(*[values[E][i] for E in self.args]) for i in range(n_points)]
+            return onp.asarray(result, dtype=float)
+
+        result = onp.asarray(self.transformation(*[values[E] for E in self.args]), dtype=float)
+        if result.shape == ():
+            return float(result)
+        else:
+            return result
+
+    def _check_variables(self, variables):
         # failsafe
         check_variables = {k: k in variables for k in self.extract_variables()}
         if not all(list(check_variables.values())):
@@ -536,21 +636,28 @@ class Objective:
                                    " missing values for\n"
                                    " {}".format(variables, self.extract_variables(), [k for k,v in check_variables.items() if not v]))
 
-        # avoid multiple evaluations
-        evaluated = {}
-        ev_array = []
-        for E in self.args:
-            if E not in evaluated:
-                expval_result = E(variables=variables, *args, **kwargs)
-                evaluated[E] = expval_result
-            else:
-                expval_result = evaluated[E]
-            ev_array.append(expval_result)
-        result = onp.asarray(self.transformation(*ev_array),dtype=float)
-        if result.shape == ():
-            return float(result)
-        else:
-            return result
+    def _call_batch(self, variables, *args, **kwargs):
+        """
+        Evaluate the objective for a batch of variables.
+        Every expectationvalue is called once with the whole batch,
+        compiled expectationvalues evaluate all points in one go.
+
+        Parameters
+        ----------
+        variables:
+            list of dictionaries or array of shape (n_points, n_variables)
+
+        Returns
+        -------
+        numpy.ndarray:
+            the results, first axis enumerates the points of the batch
+        """
+        variables = format_variable_batch(variables, keys=self.extract_variables())
+        for v in variables:
+            self._check_variables(v)
+
+        evaluated = _evaluate_args(self.args, variables, self._executor, True, *args, **kwargs)
+        return self._from_values(evaluated, n_points=len(variables))
 
 
     def contract(self):
@@ -647,6 +754,8 @@ class VectorObjective:
             a (list, tuple) of Callable; these determine the output of call.
         """
 
+        # evaluates the expectationvalues in parallel, set by compile
+        self._executor = None
         if argsets is None:
             self._argsets = ((),)
             self._transformations = tuple([lambda *x: 0.0])
@@ -1114,6 +1223,10 @@ class VectorObjective:
         else:
             return len(self.get_expectationvalues())
 
+    def fingerprint(self) -> tuple:
+        """ structural representation, see tequila.utils.fingerprint """
+        return "VectorObjective", fingerprint(self.argsets), fingerprint(list(self.transformations))
+
     def count_expectationvalues_at(self,pos, unique=True):
         """
         Count all the expectationvalues in a certain argset.
@@ -1185,6 +1298,8 @@ class VectorObjective:
         ----------
         variables: dict:
             dictionary instantiating all variables that may appear within the objective.
+            A batch of variables can be passed as list of dictionaries
+            or as array of shape (n_points, n_variables) with columns ordered as in self.extract_variables()
         args
         kwargs
 
@@ -1192,25 +1307,44 @@ class VectorObjective:
         -------
         float or numpy.ndarray:
             the result of the calculation represented by this objective.
+            For batches, an array whose first axis enumerates the points
         """
-        variables = format_variable_dictionary(variables)
-        # avoid multiple evaluations
+        batch = is_variable_batch(variables)
+        if batch:
+            variables = format_variable_batch(variables, keys=self.extract_variables())
+        else:
+            variables = format_variable_dictionary(variables)
+        # avoid multiple evaluations, also of arguments shared by several argsets
+        evaluated = _evaluate_args(self.args, variables, self._executor, batch, *args, **kwargs)
+        return self._from_values(evaluated, n_points=len(variables) if batch else None)
+
+    def _from_values(self, values: dict, n_points: int = None):
+        """
+        The output of the objective, given the values of its arguments.
+
+        Parameters
+        ----------
+        values: dict:
+            the value of every argument, for batches the list of its values at all points
+        n_points: int, optional:
+            the number of points of a batch, None for a single point
+
+        Returns
+        -------
+        float or numpy.ndarray:
+            the result, see __call__
+        """
+        if n_points is not None:
+            called = [[f(*[values[E][j] for E in argset]) for argset, f in zip(self.argsets, self.transformations)]
+                      for j in range(n_points)]
+            if len(self.transformations) == 1:
+                return onp.asarray([c[0] for c in called])
+            else:
+                return onp.asarray(called)
 
-        eved = []
-        for argset in self.argsets:
-            evaluated = {}
-            ev_array = []
-            for E in argset:
-                if E not in evaluated:
-                    expval_result = E(variables=variables, *args, **kwargs)
-                    evaluated[E] = expval_result
-                else:
-                    expval_result = evaluated[E]
-                ev_array.append(expval_result)
-            eved.append(ev_array)
         called = []
-        for i, f in enumerate(self.transformations):
-            called.append(f(*eved[i]))
+        for argset, f in zip(self.argsets, self.transformations):
+            called.append(f(*[values[E] for E in argset]))
         if len(called) == 1:
             return called[0]
         else:
@@ -1269,6 +1403,171 @@ class VectorObjective:
         return VectorObjective(argsets=argsets, transformations=transformations)
 
 
+class EvaluationPlan:
+    """
+    Evaluates several compiled objectives at the same point, every distinct expectationvalue only once.
+
+    Compiled expectationvalues are identified by the structure of the abstract expectationvalue they were compiled
+    from (see ExpectationValueImpl.fingerprint) together with backend and compile options.
+    Expectationvalues with the same identity are evaluated once and share their result,
+    also between objectives that were built and compiled separately, like the components of a gradient or Hessian.
+
+    Attributes
+    ----------
+    entries:
+        the objectives to evaluate. Other callables are called with the variables, anything else is returned as it is.
+    """
+
+    def __init__(self, entries: typing.Iterable):
+        self.entries = list(entries)
+        # every expectationvalue of the entries mapped to its identity, and one representative per identity
+        self._keys = {}
+        self._unique = {}
+        self._executor = None
+        for entry in self.entries:
+            if not isinstance(entry, (Objective, VectorObjective)):
+                continue
+            if self._executor is None:
+                self._executor = entry._executor
+            for arg in entry.args:
+                if isinstance(arg, (Variable, FixedVariable)) or arg in self._keys:
+                    continue
+                key = self.evaluation_key(arg)
+                self._keys[arg] = key
+                self._unique.setdefault(key, arg)
+
+    @staticmethod
+    def evaluation_key(arg) -> typing.Hashable:
+        """
+        Parameters
+        ----------
+        arg:
+            argument of a compiled objective
+
+        Returns
+        -------
+        hashable:
+            equal for compiled expectationvalues that give the same result
+        """
+        E = getattr(arg, "abstract_expectationvalue", None)
+        if E is None or not hasattr(arg, "_input_args"):
+            return arg
+        # compiled expectationvalues don't change, the key is computed once
+        if getattr(arg, "_evaluation_key", None) is not None:
+            return arg._evaluation_key
+        options = []
+        for k, v in arg._input_args.items():
+            if k == "variables":
+                continue
+            try:
+                hash(v)
+            except TypeError:
+                v = "id", id(v)
+            options.append((k, v))
+        key = type(arg), E.fingerprint(), tuple(options)
+        arg._evaluation_key = key
+        return key
+
+    def count_expectationvalues(self) -> int:
+        """ the number of distinct expectationvalues, each is evaluated once per call """
+        return len(self._unique)
+
+    def extract_variables(self) -> list:
+        variables = []
+        for entry in self.entries:
+            if hasattr(entry, "extract_variables"):
+                variables += [k for k in entry.extract_variables() if k not in variables]
+        return variables
+
+    def __call__(self, variables, *args, **kwargs) -> list:
+        """
+        Parameters
+        ----------
+        variables:
+            the point at which all entries are evaluated, a batch of points as accepted by Objective.__call__
+        args
+        kwargs
+            passed to the expectationvalues (e.g. samples)
+
+        Returns
+        -------
+        list:
+            the results of the entries, in order
+        """
+        batch = is_variable_batch(variables)
+        if batch:
+            variables = format_variable_batch(variables, keys=self.extract_variables())
+        else:
+            variables = format_variable_dictionary(variables)
+            for entry in self.entries:
+                if hasattr(entry, "_check_variables"):
+                    entry._check_variables(variables)
+
+        results = {}
+        if self._executor is not None:
+            parallel = self._executor.evaluate(self._unique.values(), variables, *args, **kwargs)
+            results = {self._keys[E]: v for E, v in parallel.items()}
+        values = {}
+        for arg, key in self._keys.items():
+            if key not in results:
+                results[key] = self._unique[key](variables=variables, *args, **kwargs)
+            values[arg] = results[key]
+
+        output = []
+        for entry in self.entries:
+            if isinstance(entry, (Objective, VectorObjective)):
+                for arg in entry.args:
+                    if arg not in values:
+                        values[arg] = [arg(v) for v in variables] if batch else arg(variables)
+                output.append(entry._from_values(values, n_points=len(variables) if batch else None))
+            elif callable(entry):
+                output.append(entry(variables=variables, *args, **kwargs))
+            else:
+                output.append(entry)
+        return output
+
+
+def _evaluate_args(objective_args: list, variables, executor=None, batch: bool = False, *args, **kwargs) -> dict:
+    """
+    Evaluate the arguments of an objective, structurally equal expectationvalues only once
+    (see EvaluationPlan.evaluation_key)
+
+    Parameters
+    ----------
+    objective_args:
+        the arguments
+    variables:
+        the variables, a dictionary or a formatted batch
+    executor:
+        evaluates the registered expectationvalues in parallel (optional)
+    batch:
+        if variables is a batch
+    args
+    kwargs
+        passed to the expectationvalues (e.g. samples)
+
+    Returns
+    -------
+    dict:
+        the value of each argument
+    """
+    evaluated = {}
+    if executor is not None:
+        evaluated = executor.evaluate(objective_args, variables, *args, **kwargs)
+    results = {EvaluationPlan.evaluation_key(E): v for E, v in evaluated.items()}
+    for E in objective_args:
+        if E in evaluated:
+            continue
+        key = EvaluationPlan.evaluation_key(E)
+        if key not in results:
+            if batch and isinstance(E, (Variable, FixedVariable)):
+                results[key] = [E(v) for v in variables]
+            else:
+                results[key] = E(variables=variables, *args, **kwargs)
+        evaluated[E] = results[key]
+    return evaluated
+
+
 def ExpectationValue(U, H, optimize_measurements: bool = False, *args, **kwargs) -> VectorObjective:
     """
     Initialize an VectorObjective which is just a single expectationvalue
@@ -1348,6 +1647,10 @@ class Variable:
     def __hash__(self):
         return hash(self.name)
 
+    def fingerprint(self) -> tuple:
+        """ structural representation, see tequila.utils.fingerprint """
+        return "Variable", self.name
+
     def __init__(self, name: typing.Union[str, typing.Hashable]):
         """
         Parameters
@@ -1559,6 +1862,53 @@ def format_variable_dictionary(variables: typing.Dict[typing.Hashable, typing.An
         return Variables(variables)
 
 
+def is_variable_batch(variables) -> bool:
+    """
+    Check if variables hold a batch of variable assignments instead of a single one.
+    Batches are either 2-D arrays of shape (n_points, n_variables) or lists of dictionaries.
+
+    Parameters
+    ----------
+    variables:
+        anything that could be given to a call of an objective
+
+    Returns
+    -------
+    bool:
+        True if variables are a batch
+    """
+    if isinstance(variables, onp.ndarray):
+        return variables.ndim == 2
+    if isinstance(variables, (list, tuple)):
+        return len(variables) > 0 and all(hasattr(v, "keys") for v in variables)
+    return False
+
+
+def format_variable_batch(variables, keys: typing.List[typing.Hashable] = None) -> list:
+    """
+    Convenience function to assign a batch of tequila variables.
+
+    Parameters
+    ----------
+    variables:
+        a list of dictionaries or a 2-D array of shape (n_points, n_variables)
+    keys:
+        the variables which belong to the columns of an array
+
+    Returns
+    -------
+    list:
+        list of Variables, one for each point in the batch
+    """
+    if isinstance(variables, onp.ndarray):
+        keys = format_variable_list(keys)
+        if keys is None or variables.shape[1] != len(keys):
+            raise TequilaException(
+                "batch of variables has {} columns, but the variables are {}".format(variables.shape[1], keys))
+        return [Variables(zip(keys, row)) for row in variables.tolist()]
+    return [v if isinstance(v, Variables) else format_variable_dictionary(v) for v in variables]
+
+
 def assign_variable(variable: typing.Union[typing.Hashable, numbers.Real, Variable, FixedVariable]) -> typing.Union[
     Variable, FixedVariable]:
     """
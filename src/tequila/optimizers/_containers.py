@@ -1,5 +1,5 @@
 import numpy
-from tequila.objective import format_variable_dictionary
+from tequila.objective import format_variable_dictionary, EvaluationPlan
 from tequila.tools.qng import evaluate_qng
 """
 Define Containers for SciPy usage
@@ -43,6 +43,7 @@ class _EvalContainer:
         self.save_history = save_history
         self.print_level = print_level
         self.passive_angles = passive_angles
+        self._plan = None
         if save_history:
             self.history = []
             self.history_angles = []
@@ -102,18 +103,93 @@ class _GradContainer(_EvalContainer):
         numpy.array:
             value of self.objective with p translated into variables, as a numpy array.
         """
+        dE_vec = self.evaluate_gradient(p)
+        memory = dict()
+        for i in range(self.N):
+            memory[self.param_keys[i]] = dE_vec[i]
+
+        self.history.append(memory)
+        return dE_vec
+
+    def evaluate_gradient(self, p):
+        """
+        evaluate the wrapped gradient without keeping history
+
+        Parameters
+        ----------
+        p: numpy array:
+            Parameters with which to call gradient
+
+        Returns
+        -------
+        numpy.array:
+            the gradient at p
+        """
         dO = self.objective
         dE_vec = numpy.zeros(self.N)
-        memory = dict()
         variables = dict((self.param_keys[i], p[i]) for i in range(len(self.param_keys)))
         if self.passive_angles is not None:
             variables = {**variables, **self.passive_angles}
+        # the components share expectationvalues, evaluate each only once
+        if self._plan is None:
+            self._plan = EvaluationPlan([dO[k] for k in self.param_keys])
+        values = self._plan(variables=variables, samples=self.samples)
         for i in range(self.N):
-            dE_vec[i] = dO[self.param_keys[i]](variables=variables, samples=self.samples)
-            memory[self.param_keys[i]] = dE_vec[i]
+            dE_vec[i] = values[i]
+        return numpy.asarray(dE_vec, dtype=numpy.float64)  # jax types confuse optimizers
+
 
+class _HessVecContainer(_GradContainer):
+    """
+    Container Class to access scipy and keep the optimization history.
+    This class is used by the SciPy optimizer and should not be used elsewhere.
+    Evaluates Hessian-vector products as central differences of the analytic gradient along the vector,
+    so every product needs two gradient evaluations instead of the full Hessian.
+    see _EvalContainer for details.
+
+    Attributes
+    ----------
+    objective:
+        the compiled gradient, as for _GradContainer
+    stepsize:
+        length of the step along the (normalized) vector
+    """
+
+    def __init__(self, objective, param_keys, stepsize: float = 1.e-4, **kwargs):
+        super().__init__(objective=objective, param_keys=param_keys, **kwargs)
+        self.stepsize = stepsize
+
+    def __call__(self, p, v, *args, **kwargs):
+        """
+        call the wrapped Hessian-vector product.
+
+        Parameters
+        ----------
+        p: numpy array:
+            Parameters at which to evaluate the hessian
+        v: numpy array:
+            the vector to multiply the hessian with
+        args
+        kwargs
+
+        Returns
+        -------
+        numpy.array:
+            the hessian at p multiplied with v, as a numpy array.
+        """
+        p = numpy.asarray(p, dtype=numpy.float64)
+        v = numpy.asarray(v, dtype=numpy.float64)
+        norm = numpy.linalg.norm(v)
+        if norm == 0.0:
+            Hv = numpy.zeros(self.N)
+        else:
+            step = self.stepsize / norm
+            Hv = (self.evaluate_gradient(p + step * v) - self.evaluate_gradient(p - step * v)) / (2.0 * step)
+        memory = dict()
+        for i in range(self.N):
+            memory[self.param_keys[i]] = Hv[i]
         self.history.append(memory)
-        return numpy.asarray(dE_vec, dtype=numpy.float64)  # jax types confuse optimizers
+        return Hv
 
 
 class _QngContainer(_EvalContainer):
@@ -214,10 +290,15 @@ class _HessContainer(_EvalContainer):
         variables = dict((self.param_keys[i], p[i]) for i in range(len(self.param_keys)))
         if self.passive_angles is not None:
             variables = {**variables, **self.passive_angles}
+        keys = [(self.param_keys[i], self.param_keys[j]) for i in range(self.N) for j in range(i, self.N)]
+        # the components share expectationvalues, evaluate each only once
+        if self._plan is None:
+            self._plan = EvaluationPlan([ddO[key] for key in keys])
+        values = dict(zip(keys, self._plan(variables=variables, samples=self.samples)))
         for i in range(self.N):
             for j in range(i, self.N):
                 key = (self.param_keys[i], self.param_keys[j])
-                value = ddO[key](variables=variables, samples=self.samples)
+                value = values[key]
                 ddE_mat[i, j] = value
                 ddE_mat[j, i] = value
                 memory[key] = value
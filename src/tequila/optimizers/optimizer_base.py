@@ -5,13 +5,17 @@ import typing, numbers, copy, warnings
 
 from tequila.utils.exceptions import TequilaException, TequilaWarning
 from tequila.simulators.simulator_api import compile, pick_backend
-from tequila.objective import Objective
-from tequila.circuit.gradient import grad
+from tequila.objective import Objective, VectorObjective
+from tequila.circuit.gradient import grad, hessian as hessian_of, SIMULATED_GRADIENT_METHODS
 from dataclasses import dataclass, field
 from tequila.objective.objective import assign_variable, Variable, format_variable_dictionary, format_variable_list
 import numpy
 
 
+# gradient estimators with a constant number of objective evaluations, independent of the number of variables
+STOCHASTIC_GRADIENT_METHODS = ["spsa", "random-subspace"]
+
+
 class TequilaOptimizerException(TequilaException):
     pass
 
@@ -469,6 +473,11 @@ class Optimizer:
             the variables to take gradients with resepct to.
         gradient, optional:
             special argument to change what structure is used to calculate the gradient, like numerical, or QNG.
+            A method from STOCHASTIC_GRADIENT_METHODS (as str or as dict with key 'method' and the options
+            of _StochasticGradient) estimates the gradient from a few evaluations of the objective.
+            A method from SIMULATED_GRADIENT_METHODS (as str or as dict with key 'method' and the options
+            of SimulatedGradient, e.g. 'max_batch_size' or 'backend') computes
+            the analytic gradients directly on simulated states, see grad.
             Default: use regular, analytic gradients.
         args
         kwargs
@@ -478,8 +487,27 @@ class Optimizer:
         tuple:
             both the uncompiled and compiled gradients of objective, w.r.t variables.
         """
+        method = gradient.get("method", None) if isinstance(gradient, dict) else gradient
         if gradient is None:
-            dO = {k: grad(objective=objective, variable=k, *args, **kwargs) for k in variables}
+            # all components at once, so they share the shift templates of the expectationvalues
+            dO = grad(objective=objective, variable=list(variables), *args, **kwargs)
+            compiled_grad = {k: self.compile_objective(objective=dO[k], *args, **kwargs) for k in variables}
+
+        elif isinstance(method, str) and method.lower() in STOCHASTIC_GRADIENT_METHODS:
+            options = {k: v for k, v in gradient.items() if k != "method"} if isinstance(gradient, dict) else {}
+            dO = None
+            compiled = self.compile_objective(objective=objective, *args, **kwargs)
+            estimator = _StochasticGradient(objective=compiled, variables=list(variables), method=method.lower(),
+                                            **options)
+            compiled_grad = {k: _StochasticGradientComponent(estimator=estimator, variable=k) for k in variables}
+
+        elif isinstance(method, str) and method.lower() in SIMULATED_GRADIENT_METHODS:
+            if self.samples is not None or self.noise is not None:
+                raise TequilaOptimizerException(
+                    "gradient method {} needs exact simulation without noise".format(method))
+            options = {k: v for k, v in gradient.items() if k != "method"} if isinstance(gradient, dict) else {}
+            dO = grad(objective=objective, method=method.lower(), **options)
+            dO = {k: dO[k] for k in variables}
             compiled_grad = {k: self.compile_objective(objective=dO[k], *args, **kwargs) for k in variables}
 
         elif isinstance(gradient, dict):
@@ -531,15 +559,19 @@ class Optimizer:
                 raise TequilaOptimizerException("Can not combine analytical Hessian with numerical Gradient\n"
                                                 "hessian instruction was: {}".format(hessian))
 
+            # one triangle, the entries share their shifted expectationvalues
+            ddO = hessian_of(objective=None, variable=list(variables), gradient=dO)
+            keys = [(k, l) for i, k in enumerate(variables) for l in variables[i:]]
+            # compiled in one go, so every distinct expectationvalue is compiled once
+            compiled = self.compile_objective(VectorObjective(argsets=[ddO[key].args for key in keys],
+                                                              transformations=[ddO[key]._transformation for key in
+                                                                               keys]), *args, **kwargs)
             compiled_hessian = {}
-            ddO = {}
-            for k in variables:
-                dOk = dO[k]
-                for l in variables:
-                    ddO[(k, l)] = grad(objective=dOk, variable=l)
-                    compiled_hessian[(k, l)] = self.compile_objective(ddO[(k, l)])
-                    ddO[(l, k)] = ddO[(k, l)]
-                    compiled_hessian[(l, k)] = compiled_hessian[(k, l)]
+            for i, (k, l) in enumerate(keys):
+                entry = Objective(args=compiled.argsets[i], transformation=ddO[(k, l)]._transformation)
+                # all arguments are compiled, this only attaches the executor
+                compiled_hessian[(k, l)] = self.compile_objective(entry, *args, **kwargs)
+                compiled_hessian[(l, k)] = compiled_hessian[(k, l)]
 
         elif isinstance(hessian, dict):
             if all([isinstance(x, Objective) for x in hessian.values()]):
@@ -743,3 +775,176 @@ class _NumGrad:
             how many expectationvalues are in self.objective
         """
         return self.objective.count_expectationvalues(*args, **kwargs)
+
+
+class _StochasticGradient:
+    """ Stochastic estimator of the full gradient of an objective.
+
+    Should not be used outside of optimizers.
+    Can't interact with other tequila structures.
+    The number of objective evaluations per estimate does not depend on the number of variables.
+    All components of a gradient are taken from one estimate,
+    it is renewed when the point changes or a component is requested again.
+
+    Attributes
+    ----------
+    objective:
+        the (compiled) objective whose gradient is to be estimated.
+    variables:
+        the variables of the gradient.
+    method:
+        one of STOCHASTIC_GRADIENT_METHODS.
+        'spsa': simultaneous perturbation along a random direction of +-1 entries,
+        two evaluations per repetition.
+        'random-subspace': central differences along the orthonormal directions of a random subspace,
+        projected back and scaled by len(variables)/dimension, 2*dimension evaluations per repetition.
+    stepsize:
+        the size of the perturbation, or a callable giving it for the number of the estimate (starting from 0).
+    gamma:
+        decay of the perturbation with the number of the estimate, stepsize/(k+1)**gamma.
+        Ignored for callable stepsizes.
+    dimension:
+        dimension of the random subspace ('random-subspace' only).
+    repetitions:
+        number of independent estimates that are averaged.
+    iteration:
+        the number of estimates taken so far.
+    """
+
+    def __init__(self, objective, variables: list, method: str = "spsa", stepsize=None, gamma: float = None,
+                 dimension: int = 1, repetitions: int = 1, seed: int = None):
+        """
+
+        Parameters
+        ----------
+        objective: Objective:
+            the objective whose gradient is to be estimated.
+        variables: list:
+            the variables of the gradient.
+        method: str:
+            one of STOCHASTIC_GRADIENT_METHODS.
+        stepsize: float or callable, optional:
+            size of the perturbation. Default: 0.1 for 'spsa', 1.e-2 for 'random-subspace'.
+        gamma: float, optional:
+            decay of the perturbation. Default: 0.101 for 'spsa' (Spall's choice), 0.0 for 'random-subspace'.
+        dimension: int:
+            dimension of the random subspace.
+        repetitions: int:
+            number of independent estimates that are averaged.
+        seed: int, optional:
+            seed for the random directions.
+        """
+        if method not in STOCHASTIC_GRADIENT_METHODS:
+            raise TequilaOptimizerException(
+                "unknown stochastic gradient method {}, use one of {}".format(method, STOCHASTIC_GRADIENT_METHODS))
+        self.objective = objective
+        self.variables = list(variables)
+        self.method = method
+        if stepsize is None:
+            stepsize = 0.1 if method == "spsa" else 1.e-2
+        if gamma is None:
+            gamma = 0.101 if method == "spsa" else 0.0
+        self.stepsize = stepsize
+        self.gamma = gamma
+        self.dimension = min(int(dimension), len(self.variables))
+        if self.dimension < 1 or repetitions < 1:
+            raise TequilaOptimizerException(
+                "need positive dimension and repetitions, got {} and {}".format(dimension, repetitions))
+        self.repetitions = int(repetitions)
+        self.iteration = 0
+        self._rng = numpy.random.default_rng(seed)
+        self._point = None
+        self._result = None
+        # components that were handed out from the current estimate
+        self._consumed = set()
+
+    def perturbation(self, iteration: int) -> float:
+        """ the size of the perturbation for the estimate with the given number """
+        if callable(self.stepsize):
+            return self.stepsize(iteration)
+        return self.stepsize / (iteration + 1) ** self.gamma
+
+    def directions(self) -> numpy.ndarray:
+        """
+        Returns
+        -------
+        numpy.ndarray:
+            the random directions of one repetition as rows and the factors to project them back on the gradient
+        """
+        n = len(self.variables)
+        if self.method == "spsa":
+            delta = self._rng.choice([-1.0, 1.0], size=(1, n))
+            # 1/delta_i = delta_i
+            return delta, delta
+        q, _ = numpy.linalg.qr(self._rng.normal(size=(n, self.dimension)))
+        q = q.T
+        return q, q * (n / self.dimension)
+
+    def __call__(self, variables, component=None, *args, **kwargs) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        variables:
+            the point at which the gradient is estimated
+        component: optional:
+            the variable of the component that is requested, the current estimate is reused
+            if it was taken at the same point and did not give this component yet.
+            Default: always a new estimate.
+        args
+        kwargs
+            passed to the objective, e.g. samples
+
+        Returns
+        -------
+        numpy.ndarray:
+            the estimated gradient, ordered as self.variables
+        """
+        variables = format_variable_dictionary(variables)
+        point = tuple(variables[k] for k in self.variables)
+        if component is not None and point == self._point and component not in self._consumed:
+            self._consumed.add(component)
+            return self._result
+
+        x = numpy.asarray(point, dtype=numpy.float64)
+        c = self.perturbation(self.iteration)
+        estimate = numpy.zeros(len(self.variables))
+        for repetition in range(self.repetitions):
+            directions, projections = self.directions()
+            for d, w in zip(directions, projections):
+                plus = {**variables, **dict(zip(self.variables, x + c * d))}
+                minus = {**variables, **dict(zip(self.variables, x - c * d))}
+                slope = (self.objective(plus, *args, **kwargs) - self.objective(minus, *args, **kwargs)) / (2.0 * c)
+                estimate += float(slope) * w
+        self.iteration += 1
+        self._point = point
+        self._result = estimate / self.repetitions
+        self._consumed = {component}
+        return self._result
+
+    def count_expectationvalues(self, *args, **kwargs):
+        return self.objective.count_expectationvalues(*args, **kwargs)
+
+
+class _StochasticGradientComponent:
+    """ One component of a _StochasticGradient, callable like a compiled gradient objective.
+
+    Should not be used outside of optimizers.
+
+    Attributes
+    ----------
+    estimator:
+        the shared estimator of the gradient.
+    variable:
+        the variable of this component.
+    """
+
+    def __init__(self, estimator: _StochasticGradient, variable):
+        self.estimator = estimator
+        self.variable = variable
+        self._index = estimator.variables.index(variable)
+
+    def __call__(self, variables, *args, **kwargs):
+        return self.estimator(variables, self.variable, *args, **kwargs)[self._index]
+
+    def count_expectationvalues(self, *args, **kwargs):
+        return self.estimator.count_expectationvalues(*args, **kwargs)
@@ -1,7 +1,7 @@
 import numpy, typing, numbers
 from tequila.objective import Objective
 from tequila.objective.objective import Variable, format_variable_dictionary
-from .optimizer_base import Optimizer, OptimizerResults, dataclass
+from .optimizer_base import Optimizer, OptimizerResults, dataclass, STOCHASTIC_GRADIENT_METHODS
 from tequila.circuit.noise import NoiseModel
 from tequila.tools.qng import get_qng_combos, CallableVector, QNGVector
 from tequila.utils import TequilaException
@@ -221,6 +221,8 @@ class OptimizerGD(Optimizer):
         gradient: optional:
             how to calculate gradients. if str '2-point', will use 2-point numerical gradients;
             if str 'qng' will use the default qng optimizer. Other more complex options possible.
+            'spsa' or 'random-subspace' (or a dict with their options, see _StochasticGradient)
+            estimate the gradient with a constant number of evaluations of the objective.
         args
         kwargs
 
@@ -353,6 +355,8 @@ class OptimizerGD(Optimizer):
                                         samples=self.samples, noise=self.noise,
                                         )
                 dE = QNGVector(combos)
+            elif gradient.lower() in STOCHASTIC_GRADIENT_METHODS:
+                gradient = {"method": gradient.lower()}
             else:
                 gradient = {"method": gradient, "stepsize": 1.e-4}
 
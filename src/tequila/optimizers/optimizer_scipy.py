@@ -1,11 +1,12 @@
 import scipy, numpy, typing, numbers
 from tequila.objective import Objective
 from tequila.objective.objective import assign_variable, Variable, format_variable_dictionary, format_variable_list
-from .optimizer_base import Optimizer, OptimizerResults
-from ._containers import _EvalContainer, _GradContainer, _HessContainer, _QngContainer
+from .optimizer_base import Optimizer, OptimizerResults, STOCHASTIC_GRADIENT_METHODS
+from ._containers import _EvalContainer, _GradContainer, _HessContainer, _HessVecContainer, _QngContainer
 from tequila.utils.exceptions import TequilaException
 from tequila.circuit.noise import NoiseModel
 from tequila.tools.qng import get_qng_combos
+from tequila.circuit.gradient import SIMULATED_GRADIENT_METHODS
 
 from dataclasses import dataclass
 
@@ -42,6 +43,8 @@ class OptimizerSciPy(Optimizer):
     gradient_free_methods = ['NELDER-MEAD', 'COBYLA', 'POWELL', 'SLSQP']
     gradient_based_methods = ['L-BFGS-B', 'BFGS', 'CG', 'TNC']
     hessian_based_methods = ["TRUST-KRYLOV", "NEWTON-CG", "DOGLEG", "TRUST-NCG", "TRUST-EXACT", "TRUST-CONSTR"]
+    # methods that can work with hessian-vector products instead of the full hessian (hessian="hessp")
+    hessp_methods = ["TRUST-KRYLOV", "NEWTON-CG", "TRUST-NCG", "TRUST-CONSTR"]
 
     @classmethod
     def available_methods(cls):
@@ -120,6 +123,8 @@ class OptimizerSciPy(Optimizer):
             Information or object used to calculate the gradient of objective. Defaults to None: get analytically.
         hessian: optional:
             Information or object used to calculate the hessian of objective. Defaults to None: get analytically.
+            'hessp' (or a dict with 'method': 'hessp' and optionally 'stepsize') passes hessian-vector products,
+            central differences of the analytic gradient, to methods in hessp_methods instead.
         reset_history: bool: Default = True:
             whether or not to reset all history before optimizing.
         args
@@ -186,6 +191,12 @@ class OptimizerSciPy(Optimizer):
                                         samples=self.samples, noise=self.noise)
                 dE = _QngContainer(combos=combos, param_keys=param_keys, passive_angles=passive_angles)
                 infostring += "{:15} : QNG {}\n".format("gradient", dE)
+            elif gradient.lower() in STOCHASTIC_GRADIENT_METHODS:
+                infostring += "{:15} : {}\n".format("gradient", gradient)
+            elif gradient.lower() in SIMULATED_GRADIENT_METHODS:
+                if compile_hessian and not isinstance(hessian, str):
+                    raise TequilaException('Sorry, gradient method {} and hessian not yet supported together.'.format(gradient))
+                infostring += "{:15} : {}\n".format("gradient", gradient)
             else:
                 dE = gradient
                 compile_gradient = False
@@ -208,7 +219,23 @@ class OptimizerSciPy(Optimizer):
                 dE = _QngContainer(combos=combos, param_keys=param_keys, passive_angles=passive_angles)
                 infostring += "{:15} : QNG {}\n".format("gradient", dE)
 
-        if isinstance(hessian, str):
+        # hessian-vector products from the compiled gradient, see _HessVecContainer
+        hessp = None
+        hessp_options = None
+        if isinstance(hessian, str) and hessian.lower() == "hessp":
+            hessp_options = {}
+        elif isinstance(hessian, dict) and str(hessian.get("method", "")).lower() == "hessp":
+            hessp_options = {k: v for k, v in hessian.items() if k != "method"}
+        if hessp_options is not None:
+            if self.method not in self.hessp_methods:
+                raise TequilaScipyException(
+                    "hessian-vector products are not supported by method {}, use one of {}".format(self.method,
+                                                                                                   self.hessp_methods))
+            if not compile_gradient:
+                raise TequilaScipyException("hessian-vector products need the analytic gradient, got gradient={}".format(gradient))
+            compile_hessian = False
+
+        if isinstance(hessian, str) and hessp_options is None:
             ddE = hessian
             compile_hessian = False
 
@@ -222,6 +249,15 @@ class OptimizerSciPy(Optimizer):
                                 passive_angles=passive_angles,
                                 save_history=self.save_history,
                                 print_level=self.print_level)
+            if hessp_options is not None:
+                hessp = _HessVecContainer(objective=comp_grad_obj,
+                                          param_keys=param_keys,
+                                          samples=self.samples,
+                                          passive_angles=passive_angles,
+                                          save_history=self.save_history,
+                                          print_level=self.print_level,
+                                          **hessp_options)
+                infostring += "{:15} : hessian-vector products of the gradient\n".format("hessian")
         if compile_hessian:
             hess_obj, comp_hess_obj = self.compile_hessian(variables=variables,
                                                            hessian=hessian,
@@ -262,7 +298,7 @@ class OptimizerSciPy(Optimizer):
                     optimizer_instance.kwargs['callback'](E.history_angles[-1])
 
         callback = SciPyCallback()
-        res = scipy.optimize.minimize(E, x0=param_values, jac=dE, hess=ddE,
+        res = scipy.optimize.minimize(E, x0=param_values, jac=dE, hess=ddE, hessp=hessp,
                                       args=(Es,),
                                       method=self.method, tol=self.tol,
                                       bounds=bounds,
@@ -357,10 +393,14 @@ def minimize(objective: Objective,
         dictionary of variables and tequila objective to define own gradient,
         None for automatic construction (default)
         Other options include 'qng' to use the quantum natural gradient.
+        'spsa' or 'random-subspace' (or a dict with their options) estimate the gradient stochastically
+        with a constant number of evaluations of the objective.
     hessian: typing.Union[str, typing.Dict[Variable, Objective], None], optional:
         '2-point', 'cs' or '3-point' for numerical gradient evaluation (does not work in combination with all optimizers),
         dictionary (keys:tuple of variables, values:tequila objective) to define own gradient,
         None for automatic construction (default)
+        'hessp' for hessian-vector products from the analytic gradient (only methods in OptimizerSciPy.hessp_methods),
+        {'method': 'hessp', 'stepsize': ...} to set the step of the central differences
     initial_values: typing.Dict[typing.Hashable, numbers.Real], optional:
         Initial values as dictionary of Hashable types (variable keys) and floating point numbers. If given None they will all be set to zero
     variables: typing.List[typing.Hashable], optional:
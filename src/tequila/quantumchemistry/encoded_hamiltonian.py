@@ -0,0 +1,133 @@
+"""
+Qubit Hamiltonian built directly from the molecular integrals
+
+Every spin orbital j is mapped to its two Majorana operators c_j = a^dagger_j + a_j and d_j = i(a^dagger_j - a_j),
+for Jordan-Wigner and Bravyi-Kitaev encodings both are single Pauli strings.
+With a^dagger_j = (c_j - i d_j)/2 and a_j = (c_j + i d_j)/2 all one- and two-body terms are expanded
+into products of Majorana strings which are multiplied and merged as bitmask arrays (see hamiltonian/packed.py),
+so no intermediate FermionOperator or QubitOperator dictionary over the O(N^4) terms is created.
+Spin orbitals are interleaved as in openfermion: 2p is alpha and 2p+1 is beta of spatial orbital p.
+"""
+import copy
+import itertools
+import typing
+import numpy
+
+from openfermion import FermionOperator
+from openfermion.config import EQ_TOLERANCE
+from tequila.utils import TequilaException
+from tequila.hamiltonian.packed import PackedPauliTerms
+
+# Majorana coefficients of creators and annihilators: a^dagger = c/2 - i d/2 and a = c/2 + i d/2
+_LADDER = {True: (0.5, -0.5j), False: (0.5, 0.5j)}
+
+
+def majorana_strings(transformation: typing.Callable, n_spin_orbitals: int, **kwargs) -> PackedPauliTerms:
+    """
+    Parameters
+    ----------
+    transformation:
+        openfermion transformation of FermionOperators (e.g. jordan_wigner or bravyi_kitaev)
+    n_spin_orbitals:
+        number of spin orbitals
+    kwargs:
+        passed to the transformation
+
+    Returns
+    -------
+        the Pauli strings of c_0, d_0, c_1, d_1, ... (all with coefficient 1)
+    """
+    strings = {}
+    for j in range(n_spin_orbitals):
+        creator = transformation(FermionOperator(((j, 1),)), **kwargs)
+        annihilator = transformation(FermionOperator(((j, 0),)), **kwargs)
+        for majorana in [creator + annihilator, 1.0j * (creator - annihilator)]:
+            majorana.compress()
+            if len(majorana.terms) != 1 or not numpy.isclose(list(majorana.terms.values())[0], 1.0):
+                raise TequilaException(
+                    "transformation {} does not map the Majorana operators of spin orbital {} to Pauli strings".format(
+                        transformation, j))
+            strings[list(majorana.terms.keys())[0]] = 1.0
+    if len(strings) != 2 * n_spin_orbitals:
+        raise TequilaException("transformation {} maps different Majorana operators to the same Pauli string".format(
+            transformation))
+    return PackedPauliTerms.from_terms(strings)
+
+
+def _ladder_products(majoranas: PackedPauliTerms, orbitals: list, daggers: list,
+                     coeffs: numpy.ndarray) -> PackedPauliTerms:
+    """ coeffs[i] times the product of the ladder operators on the spin orbitals orbitals[k][i], combined """
+    parts = []
+    for choice in itertools.product([0, 1], repeat=len(orbitals)):
+        factor = numpy.prod([_LADDER[dagger][c] for dagger, c in zip(daggers, choice)])
+        strings = majoranas[2 * orbitals[0] + choice[0]]
+        for orbital, c in zip(orbitals[1:], choice[1:]):
+            strings = strings.multiply_rows(majoranas[2 * orbital + c])
+        parts.append(strings.scaled(factor * coeffs))
+    return PackedPauliTerms.concatenate(parts).combined()[0]
+
+
+def make_encoded_hamiltonian(one_body_integrals: numpy.ndarray, two_body_integrals, majoranas: PackedPauliTerms,
+                             constant: float = 0.0, threshold: float = 1.e-8,
+                             max_block: int = 2 ** 16) -> PackedPauliTerms:
+    """
+    H = constant + sum_pq h_pq a^pq + 1/2 sum_pqrs g_pqrs a^pq_rs over spin orbitals (with spin summation)
+    as for openfermion.get_molecular_hamiltonian, encoded with the given Majorana strings
+
+    Parameters
+    ----------
+    one_body_integrals:
+        h_pq over spatial orbitals
+    two_body_integrals:
+        g_pqrs over spatial orbitals in openfermion ordering, or an NBodyTensor (any ordering)
+    majoranas:
+        Pauli strings of the Majorana operators of the 2*n_orbitals spin orbitals, see majorana_strings
+    constant:
+        coefficient of the identity
+    threshold:
+        terms with smaller coefficients are removed
+    max_block:
+        number of two-body index tuples that are expanded at once (limits the memory)
+
+    Returns
+    -------
+        the packed Pauli terms, real coefficients if all imaginary parts vanish
+    """
+    if hasattr(two_body_integrals, "reorder"):
+        two_body_integrals = copy.copy(two_body_integrals).reorder(to="openfermion").elems
+    h = numpy.asarray(one_body_integrals)
+    g = numpy.asarray(two_body_integrals)
+    h = numpy.where(numpy.abs(h) < EQ_TOLERANCE, 0.0, h)
+    g = numpy.where(numpy.abs(g) < EQ_TOLERANCE, 0.0, g)
+    if majoranas.n_terms != 4 * h.shape[0]:
+        raise TequilaException("{} Majorana strings given for {} spatial orbitals".format(majoranas.n_terms,
+                                                                                          h.shape[0]))
+
+    result = PackedPauliTerms.unit(coeff=constant, n_words=majoranas.n_words)
+
+    p, q = numpy.nonzero(h)
+    for sigma in [0, 1]:
+        one_body = _ladder_products(majoranas, [2 * p + sigma, 2 * q + sigma], [True, False], h[p, q])
+        result = PackedPauliTerms.concatenate([result, one_body]).combined()[0]
+
+    # a^PQ_RS = a^QP_SR: for the usual symmetry of the integrals only P<Q is needed (with twice the weight)
+    symmetric = numpy.allclose(g, g.transpose(1, 0, 3, 2))
+    p, q, r, s = numpy.nonzero(g)
+    indices = []
+    for sigma, tau in itertools.product([0, 1], repeat=2):
+        P, Q, R, S = 2 * p + sigma, 2 * q + tau, 2 * r + tau, 2 * s + sigma
+        keep = (P != Q) & (R != S)
+        if symmetric:
+            keep &= P < Q
+        indices.append(numpy.vstack([P, Q, R, S, p, q, r, s])[:, keep])
+    indices = numpy.hstack(indices)
+    weight = 1.0 if symmetric else 0.5
+    for start in range(0, indices.shape[1], max_block):
+        P, Q, R, S, p, q, r, s = indices[:, start:start + max_block]
+        two_body = _ladder_products(majoranas, [P, Q, R, S], [True, True, False, False], weight * g[p, q, r, s])
+        result = PackedPauliTerms.concatenate([result, two_body]).combined()[0]
+
+    result = result.simplified(threshold=threshold)
+    if numpy.iscomplexobj(result.coeffs) and numpy.allclose(result.coeffs.imag, 0.0, atol=1.e-6):
+        result = PackedPauliTerms(x=result.x, z=result.z, coeffs=result.coeffs.real.copy())
+    return result
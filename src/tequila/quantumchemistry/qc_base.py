@@ -6,7 +6,8 @@ from tequila.circuit import QCircuit, gates, _gates_impl
 from tequila.objective.objective import Variable, Variables, ExpectationValue
 
 from tequila.simulators.simulator_api import simulate
-from tequila.utils import to_float
+from tequila.quantumchemistry.sector_hamiltonian import SectorHamiltonian
+from tequila.quantumchemistry.encoded_hamiltonian import majorana_strings, make_encoded_hamiltonian
 
 from tequila.objective import assign_variable
 
@@ -824,8 +825,6 @@ class QuantumChemistryBase:
         # check if the operator is hermitian and cast coefficients to floats
         # in order to avoid trouble with the simulation backends
         assert qop.is_hermitian()
-        for k, v in qop.qubit_operator.terms.items():
-            qop.qubit_operator.terms[k] = to_float(v)
 
         qop = qop.simplify()
 
@@ -1016,6 +1015,20 @@ class QuantumChemistryBase:
         if active_indices is None and self.active_space is not None:
             active_indices = self.active_space.active_orbitals
 
+        if occupied_indices is None and active_indices is None:
+            constant = self.molecule.nuclear_repulsion
+            one_body = self.molecule.one_body_integrals
+            two_body = self.molecule.two_body_integrals
+        else:
+            core, one_body, two_body = self.molecule.get_active_space_integrals(occupied_indices, active_indices)
+            constant = self.molecule.nuclear_repulsion + core
+
+        # Jordan-Wigner and Bravyi-Kitaev are built directly from the integrals
+        majoranas = self._majorana_strings(n_qubits=2 * one_body.shape[0])
+        if majoranas is not None:
+            return QubitHamiltonian.from_packed(
+                make_encoded_hamiltonian(one_body, two_body, majoranas, constant=constant, threshold=threshold))
+
         fop = openfermion.transforms.get_fermion_operator(
             self.molecule.get_molecular_hamiltonian(occupied_indices, active_indices))
         try:
@@ -1027,6 +1040,96 @@ class QuantumChemistryBase:
         result.is_hermitian()
         return result
 
+    def _majorana_strings(self, n_qubits: int):
+        """
+        Majorana strings of the spin orbitals for the direct construction of the Hamiltonian (see encoded_hamiltonian.py)
+        None if the transformation is not supported there (the Hamiltonian is then built with openfermion)
+        """
+        trafo = self.transformation._trafo
+        kwargs = self.transformation._kwargs
+        if trafo == openfermion.jordan_wigner and len(kwargs) == 0:
+            return majorana_strings(trafo, n_qubits)
+        if trafo in [openfermion.bravyi_kitaev, openfermion.bravyi_kitaev_tree] and set(kwargs) <= {"n_qubits"}:
+            kwargs = {"n_qubits": n_qubits, **kwargs}
+            if kwargs["n_qubits"] >= n_qubits:
+                return majorana_strings(trafo, n_qubits, **kwargs)
+        return None
+
+    def make_sector_hamiltonian(self, n_alpha: int = None, n_beta: int = None) -> SectorHamiltonian:
+        """
+        The molecular Hamiltonian restricted to determinants with fixed numbers of alpha and beta electrons
+        (active space as in make_hamiltonian)
+
+        Parameters
+        ----------
+        n_alpha
+            number of alpha electrons, default follows from n_electrons and the multiplicity
+        n_beta
+            number of beta electrons, default follows from n_electrons and the multiplicity
+
+        Returns
+        -------
+            the SectorHamiltonian, see sector_hamiltonian.py
+        """
+        if n_alpha is None or n_beta is None:
+            n_unpaired = self.parameters.multiplicity - 1
+            default_alpha = (self.n_electrons + n_unpaired) // 2
+            n_alpha = default_alpha if n_alpha is None else n_alpha
+            n_beta = self.n_electrons - default_alpha if n_beta is None else n_beta
+
+        if self.active_space is None:
+            constant = 0.0
+            one_body = self.molecule.one_body_integrals
+            two_body = self.molecule.two_body_integrals
+        else:
+            constant, one_body, two_body = self.molecule.get_active_space_integrals(
+                occupied_indices=self.active_space.frozen_reference_orbitals,
+                active_indices=self.active_space.active_orbitals)
+        two_body = NBodyTensor(elems=numpy.asarray(two_body), ordering="openfermion").reorder(to="chem").elems
+        return SectorHamiltonian(one_body_integrals=numpy.asarray(one_body), two_body_integrals=two_body,
+                                 n_alpha=n_alpha, n_beta=n_beta, constant=constant + self.molecule.nuclear_repulsion)
+
+    def compute_exact_states(self, n_states: int = 1, n_alpha: int = None, n_beta: int = None,
+                             wavefunctions: bool = False, *args, **kwargs):
+        """
+        Exact (FCI) energies of the lowest states with fixed numbers of alpha and beta electrons
+        The Hamiltonian is applied within the sector (see make_sector_hamiltonian) and diagonalized with Lanczos,
+        so the memory scales with the number of determinants instead of 2**n_qubits
+
+        Parameters
+        ----------
+        n_states
+            number of states
+        n_alpha
+            number of alpha electrons, default follows from n_electrons and the multiplicity
+        n_beta
+            number of beta electrons, default follows from n_electrons and the multiplicity
+        wavefunctions
+            also return the states as QubitWaveFunction (only for the Jordan-Wigner transformation)
+        args
+        kwargs
+            passed to scipy.sparse.linalg.eigsh
+
+        Returns
+        -------
+            the energies as numpy array, and the list of wavefunctions if requested
+        """
+        H = self.make_sector_hamiltonian(n_alpha=n_alpha, n_beta=n_beta)
+        energies, vectors = H.eigenstates(n_states, *args, **kwargs)
+        if not wavefunctions:
+            return energies
+        if self.transformation._trafo != openfermion.jordan_wigner:
+            raise TequilaException(
+                "wavefunctions of the exact states are only available for the Jordan-Wigner transformation, "
+                "got {}".format(self.transformation))
+        from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
+        n_qubits = 2 * H.n_orbitals
+        keys = [BitString.from_int(integer=k, nbits=n_qubits) for k in H.qubit_indices().reshape(-1).tolist()]
+        signs = H.qubit_signs().reshape(-1)
+        states = [QubitWaveFunction(state=dict(zip(keys, (signs * vector).tolist())), n_qubits=n_qubits)
+                  for vector in vectors.T]
+        return energies, states
+
     def make_molecular_hamiltonian(self):
         if self.active_space:
             return self.molecule.get_molecular_hamiltonian(occupied_indices=self.active_space.frozen_reference_orbitals,
@@ -0,0 +1,225 @@
+"""
+Molecular Hamiltonian restricted to a fixed number of alpha and beta electrons
+
+Determinants are pairs of alpha and beta strings (integers with a bit for every occupied spatial orbital),
+the strings are taken from tequila.utils.hamming_weight_basis.
+The Hamiltonian is applied with the spin-free excitation operators E_pq (Knowles-Handy)
+H = sum_pq k_pq E_pq + 1/2 sum_pqrs (pq|rs) E_pq E_rs  with  k_pq = h_pq - 1/2 sum_r (pr|rq)
+so the matrix is never stored, the memory is dominated by n_orbitals**2 vectors of the sector dimension
+(half of it for real orbitals, where E_pq and E_qp are applied together).
+"""
+import typing
+import numpy
+import scipy.sparse
+import scipy.sparse.linalg
+
+from tequila.utils import TequilaException, hamming_weight_basis
+from tequila.wavefunction.pauli_kernels import parity
+
+
+def _orbital_pairs(n_orbitals: int, symmetric: bool) -> list:
+    """ all pairs (p,q), or only p<=q if E_pq and E_qp are combined """
+    return [(p, q) for p in range(n_orbitals) for q in range(n_orbitals) if not symmetric or p <= q]
+
+
+class _Excitations:
+    """
+    Single excitations a^dagger_p a_q of all strings with a fixed number of electrons
+    The operators for all pairs are stored as one sparse matrix:
+    stacked has the blocks on top of each other (in the order of the pairs), combined has them side by side
+    For symmetric integrals the block of a pair p<q is E_pq + E_qp
+    """
+
+    def __init__(self, n_orbitals: int, n_electrons: int, symmetric: bool):
+        self.strings = hamming_weight_basis(n_orbitals, n_electrons)
+        size = len(self.strings)
+        pairs = _orbital_pairs(n_orbitals, symmetric)
+        rows = []
+        columns = []
+        signs = []
+        for block, (p, q) in enumerate(pairs):
+            for p, q in ([(p, q), (q, p)] if symmetric and p != q else [(p, q)]):
+                occupied = (self.strings >> q) & 1 == 1
+                if p != q:
+                    occupied &= (self.strings >> p) & 1 == 0
+                sources = numpy.flatnonzero(occupied)
+                excited = self.strings[sources] ^ (1 << q) ^ (1 << p)
+                # sign from the occupied orbitals between p and q
+                between = ((1 << max(p, q)) - 1) ^ ((1 << (min(p, q) + 1)) - 1) if p != q else 0
+                rows.append(block * size + numpy.searchsorted(self.strings, excited))
+                columns.append(sources)
+                signs.append(1.0 - 2.0 * parity(self.strings[sources] & between))
+        rows = numpy.concatenate(rows)
+        columns = numpy.concatenate(columns)
+        signs = numpy.concatenate(signs)
+        self.stacked = scipy.sparse.csr_matrix((signs, (rows, columns)), shape=(len(pairs) * size, size))
+        targets = rows % size
+        self.combined = scipy.sparse.csr_matrix((signs, (targets, rows - targets + columns)),
+                                                shape=(size, len(pairs) * size))
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class SectorHamiltonian:
+    """
+    Molecular Hamiltonian in the space of determinants with n_alpha and n_beta electrons
+    The sector vectors are arrays of shape (n_alpha_strings, n_beta_strings), or flattened
+
+    Attributes
+    ----------
+    constant:
+        constant energy shift (nuclear repulsion and frozen core)
+    n_orbitals:
+        number of (active) spatial orbitals
+    """
+
+    def __init__(self, one_body_integrals: numpy.ndarray, two_body_integrals: numpy.ndarray, n_alpha: int,
+                 n_beta: int, constant: float = 0.0):
+        """
+        Parameters
+        ----------
+        one_body_integrals:
+            h_pq over spatial orbitals
+        two_body_integrals:
+            (pq|rs) over spatial orbitals in chemist (mulliken) ordering
+        n_alpha:
+            number of alpha electrons
+        n_beta:
+            number of beta electrons
+        constant:
+            added to the energies
+        """
+        self.n_orbitals = one_body_integrals.shape[0]
+        if not (0 <= n_alpha <= self.n_orbitals and 0 <= n_beta <= self.n_orbitals):
+            raise TequilaException("sector with {} alpha and {} beta electrons does not fit into {} orbitals".format(
+                n_alpha, n_beta, self.n_orbitals))
+        self.constant = constant
+        self.n_alpha = n_alpha
+        self.n_beta = n_beta
+        h = numpy.asarray(one_body_integrals)
+        g = numpy.asarray(two_body_integrals)
+        k = h - 0.5 * numpy.einsum("prrq->pq", g)
+        # for real orbitals E_pq and E_qp have the same coefficients and are applied together
+        symmetric = numpy.allclose(k, k.T) and numpy.allclose(g, g.transpose(1, 0, 2, 3)) and numpy.allclose(
+            g, g.transpose(0, 1, 3, 2))
+        pairs = _orbital_pairs(self.n_orbitals, symmetric)
+        p, q = numpy.asarray(pairs).T
+        self._k = k[p, q]
+        self._g = 0.5 * g[p, q][:, p, q]
+        self._alpha = _Excitations(self.n_orbitals, n_alpha, symmetric)
+        self._beta = _Excitations(self.n_orbitals, n_beta, symmetric)
+        self._blocks = len(pairs)
+        self.dtype = numpy.result_type(self._k, self._g)
+
+    @property
+    def shape(self) -> tuple:
+        return len(self._alpha), len(self._beta)
+
+    @property
+    def dimension(self) -> int:
+        return len(self._alpha) * len(self._beta)
+
+    @property
+    def alpha_strings(self) -> numpy.ndarray:
+        return self._alpha.strings
+
+    @property
+    def beta_strings(self) -> numpy.ndarray:
+        return self._beta.strings
+
+    def apply(self, vector: numpy.ndarray) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        vector:
+            sector vector, flat or of shape (n_alpha_strings, n_beta_strings)
+
+        Returns
+        -------
+            H|vector> (without the constant) in the same shape as vector
+        """
+        blocks = self._blocks
+        n_a, n_b = self.shape
+        c = numpy.asarray(vector).reshape(self.shape)
+        # E_pq c for all pairs, alpha excitations act on the rows and beta excitations on the columns
+        excited = (self._alpha.stacked @ c).reshape(blocks, n_a, n_b)
+        excited += (self._beta.stacked @ c.T).reshape(blocks, n_b, n_a).transpose(0, 2, 1)
+        result = numpy.tensordot(self._k, excited, axes=1)
+        contracted = numpy.tensordot(self._g, excited, axes=1)
+        # sum_pq E_pq contracted_pq
+        result += self._alpha.combined @ contracted.reshape(blocks * n_a, n_b)
+        result += (self._beta.combined @ contracted.transpose(0, 2, 1).reshape(blocks * n_b, n_a)).T
+        return result.reshape(numpy.shape(vector))
+
+    def to_linear_operator(self) -> scipy.sparse.linalg.LinearOperator:
+        """
+        Returns
+        -------
+            the sector Hamiltonian (without the constant) as scipy LinearOperator on flat vectors
+        """
+        return scipy.sparse.linalg.LinearOperator(shape=(self.dimension, self.dimension), dtype=self.dtype,
+                                                  matvec=self.apply, rmatvec=self.apply)
+
+    def eigenstates(self, n_states: int = 1, *args, **kwargs) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Lowest eigenstates with the Lanczos solver of scipy (eigsh), dense diagonalization for small sectors
+
+        Parameters
+        ----------
+        n_states:
+            number of eigenstates
+        args, kwargs:
+            passed to scipy.sparse.linalg.eigsh
+
+        Returns
+        -------
+            the energies (including the constant) and the eigenvectors as columns
+        """
+        if n_states > self.dimension:
+            raise TequilaException("asked for {} states in a sector of dimension {}".format(n_states, self.dimension))
+        if self.dimension <= max(64, 2 * n_states + 1):
+            matrix = numpy.stack([self.apply(v) for v in numpy.eye(self.dimension, dtype=self.dtype)], axis=1)
+            energies, vectors = numpy.linalg.eigh(matrix)
+            energies, vectors = energies[:n_states], vectors[:, :n_states]
+        else:
+            energies, vectors = scipy.sparse.linalg.eigsh(self.to_linear_operator(), k=n_states, which="SA", *args,
+                                                          **kwargs)
+            order = numpy.argsort(energies)
+            energies, vectors = energies[order], vectors[:, order]
+        return energies + self.constant, vectors
+
+    def qubit_signs(self) -> numpy.ndarray:
+        """
+        Signs between the determinants used here (alpha electrons before beta electrons) and
+        the ordered product over the interleaved spin orbitals 2p (alpha) and 2p+1 (beta)
+
+        Returns
+        -------
+            array of the sector shape with +1 and -1
+        """
+        # a beta creator in front of an alpha creator with larger spatial orbital needs to be moved past it
+        swaps = numpy.zeros(self.shape, dtype=numpy.int64)
+        for p in range(self.n_orbitals):
+            occupied = (self.alpha_strings >> p) & 1
+            swaps += occupied[:, None] * parity(self.beta_strings & ((1 << p) - 1))[None, :]
+        return 1.0 - 2.0 * (swaps % 2)
+
+    def qubit_indices(self, n_qubits: int = None) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        n_qubits:
+            total number of qubits, default is 2*n_orbitals
+
+        Returns
+        -------
+            the computational basis states (integer, MSB convention as BitString) of the determinants
+            in the Jordan-Wigner encoding with interleaved spin orbitals
+        """
+        n_qubits = 2 * self.n_orbitals if n_qubits is None else n_qubits
+        indices = numpy.zeros(self.shape, dtype=numpy.int64)
+        for p in range(self.n_orbitals):
+            indices += ((self.alpha_strings >> p) & 1)[:, None] << (n_qubits - 1 - 2 * p)
+            indices += ((self.beta_strings >> p) & 1)[None, :] << (n_qubits - 2 - 2 * p)
+        return indices
@@ -0,0 +1,183 @@
+"""
+Parallel evaluation of the expectationvalues in compiled objectives.
+
+Objectives compiled with an executor (see tequila.compile) hand their distinct expectationvalues
+to the executor, which distributes them over a pool of worker processes.
+The workers are forked after the expectationvalues were compiled, so they hold the compiled
+circuits in their memory and every call only transfers the variables and the results.
+"""
+import itertools
+import multiprocessing
+import numpy
+import typing
+import weakref
+
+from tequila.utils.exceptions import TequilaException
+from tequila.objective.objective import EvaluationPlan
+
+# the expectationvalues known to the worker process, set by the initializer of the pool
+_WORKER_EXPECTATIONVALUES = {}
+
+
+def _initialize_worker(expectationvalues: dict):
+    global _WORKER_EXPECTATIONVALUES
+    _WORKER_EXPECTATIONVALUES = expectationvalues
+    # forked workers inherit the random state, sampling would be correlated otherwise
+    numpy.random.seed()
+
+
+def _evaluate_in_worker(task):
+    key, variables, args, kwargs = task
+    return _WORKER_EXPECTATIONVALUES[key](variables, *args, **kwargs)
+
+
+class ExpectationValueExecutor:
+    """
+    Evaluates the expectationvalues of compiled objectives in parallel on a pool of processes.
+
+    Expectationvalues are registered when an objective is compiled with the executor.
+    The executor only holds weak references, entries of compiled objectives that were deleted are dropped.
+    The pool is forked lazily on the first evaluation and forked again only when an evaluation needs
+    expectationvalues that were registered after that, the new workers hold the live expectationvalues.
+    Unregistered arguments are evaluated by the calling process.
+
+    Needs the 'fork' start method of multiprocessing (not available on Windows).
+
+    Attributes
+    ----------
+    max_workers:
+        number of worker processes, default is the number of cores
+    min_expectationvalues:
+        calls with fewer registered expectationvalues are evaluated in the calling process
+    """
+
+    def __init__(self, max_workers: int = None, min_expectationvalues: int = 2):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise TequilaException("ExpectationValueExecutor needs the 'fork' start method of multiprocessing")
+        self.max_workers = max_workers if max_workers is not None else multiprocessing.cpu_count()
+        self.min_expectationvalues = min_expectationvalues
+        self._keys = weakref.WeakKeyDictionary()
+        self._expectationvalues = {}
+        self._counter = itertools.count()
+        self._pool = None
+        self._pool_keys = set()
+
+    def register(self, expectationvalue) -> int:
+        """
+        Register a compiled expectationvalue, registered expectationvalues are evaluated by the workers.
+
+        Parameters
+        ----------
+        expectationvalue:
+            the compiled expectationvalue
+
+        Returns
+        -------
+        int:
+            the key of the expectationvalue in the workers
+        """
+        if expectationvalue not in self._keys:
+            key = next(self._counter)
+            self._keys[expectationvalue] = key
+            registry = self._expectationvalues
+            self._expectationvalues[key] = weakref.ref(expectationvalue, lambda _: registry.pop(key, None))
+        return self._keys[expectationvalue]
+
+    def evaluate(self, expectationvalues: typing.Iterable, variables, *args, **kwargs) -> dict:
+        """
+        Evaluate the registered expectationvalues among the given arguments in parallel.
+
+        Parameters
+        ----------
+        expectationvalues:
+            arguments of an objective, entries that are not registered are skipped
+        variables:
+            the variables, a dictionary or a batch as accepted by the expectationvalues
+        args
+        kwargs
+            passed to the expectationvalues (e.g. samples)
+
+        Returns
+        -------
+        dict:
+            the results for the registered expectationvalues
+        """
+        # structurally equal expectationvalues are evaluated once
+        registered = {}
+        unique = {}
+        for E in expectationvalues:
+            if E in self._keys and E not in registered:
+                key = EvaluationPlan.evaluation_key(E)
+                registered[E] = key
+                unique.setdefault(key, E)
+        if len(unique) < self.min_expectationvalues:
+            return {}
+
+        keys = [self._keys[E] for E in unique.values()]
+        pool = self._get_pool(keys)
+        tasks = [(key, variables, args, kwargs) for key in keys]
+        chunksize = max(1, len(tasks) // (4 * self.max_workers))
+        results = dict(zip(unique.keys(), pool.map(_evaluate_in_worker, tasks, chunksize=chunksize)))
+        return {E: results[key] for E, key in registered.items()}
+
+    def __len__(self):
+        """ number of registered expectationvalues that are still alive """
+        return len(self._expectationvalues)
+
+    def _get_pool(self, keys: list):
+        """ the pool, forked again if the workers do not know all keys """
+        if self._pool is None or not self._pool_keys.issuperset(keys):
+            self.shutdown()
+            # the pool keeps its initargs, weak references do not keep the expectationvalues alive there
+            # (the forked workers hold copies of everything that was alive in the calling process)
+            expectationvalues = weakref.WeakValueDictionary()
+            for key, ref in list(self._expectationvalues.items()):
+                E = ref()
+                if E is not None:
+                    expectationvalues[key] = E
+            context = multiprocessing.get_context("fork")
+            self._pool = context.Pool(processes=self.max_workers, initializer=_initialize_worker,
+                                      initargs=(expectationvalues,))
+            self._pool_keys = set(expectationvalues.keys())
+        return self._pool
+
+    def shutdown(self):
+        """ stop the worker processes, they are started again on the next evaluation """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        self._pool = None
+        self._pool_keys = set()
+
+    def __del__(self):
+        try:
+            self.shutdown()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+# executor used by compile if none is given
+_DEFAULT_EXECUTOR = None
+
+
+def set_default_executor(executor: ExpectationValueExecutor = None):
+    """
+    Set the executor used for all objectives compiled afterwards without explicit executor.
+
+    Parameters
+    ----------
+    executor:
+        the executor, None switches parallel evaluation off
+    """
+    global _DEFAULT_EXECUTOR
+    _DEFAULT_EXECUTOR = executor
+
+
+def get_default_executor() -> typing.Optional[ExpectationValueExecutor]:
+    return _DEFAULT_EXECUTOR
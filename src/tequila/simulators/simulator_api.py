@@ -1,23 +1,20 @@
 from collections import namedtuple
-import typing, warnings
+import typing, warnings, collections, importlib, importlib.util
 from numbers import Real as RealNumber
 from typing import Dict, Union, Hashable
-import pkg_resources
-from pkg_resources import DistributionNotFound
 
 from tequila.objective import Objective, Variable, assign_variable, format_variable_dictionary, VectorObjective
+from tequila.objective.objective import ShiftedExpectationValueImpl
 from tequila.utils.exceptions import TequilaException, TequilaWarning
+from tequila.utils import fingerprint, has_identity
 from tequila.simulators.simulator_base import BackendCircuit, BackendExpectationValue
+from tequila.simulators.executor import ExpectationValueExecutor, get_default_executor
 from tequila.circuit.noise import NoiseModel
 
-SUPPORTED_BACKENDS = ["qulacs_gpu", "qulacs",'qibo', "qiskit", "cirq", "pyquil", "symbolic"]
+SUPPORTED_BACKENDS = ["qulacs_gpu", "qulacs",'qibo', "qiskit", "cirq", "pyquil", "numpy", "numpy_subspace", "symbolic"]
 SUPPORTED_NOISE_BACKENDS = ["qiskit",'qibo', 'cirq', 'pyquil', 'qulacs', "qulacs_gpu"]
 BackendTypes = namedtuple('BackendTypes', 'CircType ExpValueType')
-INSTALLED_SIMULATORS = {}
-INSTALLED_SAMPLERS = {}
 
-HAS_QULACS = True
-INSTALLED_NOISE_SAMPLERS = {}
 if typing.TYPE_CHECKING:
     from tequila.objective import Objective, Variable
     from tequila.circuit.gates import QCircuit
@@ -27,91 +24,183 @@ if typing.TYPE_CHECKING:
 """
 Check which simulators are installed
 We are distinguishing two classes of simulators: Samplers and full wavefunction simulators
+Backends are only probed here (without importing the packages),
+the backend modules are imported when a backend is picked for the first time (see load_backend)
 """
 
 
-HAS_QISKIT = True
-try:
-    from tequila.simulators.simulator_qiskit import BackendCircuitQiskit, BackendExpectationValueQiskit
-    HAS_QISKIT = True
-    INSTALLED_SIMULATORS["qiskit"] = BackendTypes(BackendCircuitQiskit, BackendExpectationValueQiskit)
-    INSTALLED_SAMPLERS["qiskit"] = BackendTypes(BackendCircuitQiskit, BackendExpectationValueQiskit)
-    INSTALLED_NOISE_SAMPLERS["qiskit"] = BackendTypes(BackendCircuitQiskit, BackendExpectationValueQiskit)
-except ImportError:
-    HAS_QISKIT = False
-
-HAS_QIBO = True
-try:
-    from tequila.simulators.simulator_qibo import BackendCircuitQibo, BackendExpectationValueQibo
-    HAS_QIBO = True
-    INSTALLED_SIMULATORS["qibo"] = BackendTypes(BackendCircuitQibo, BackendExpectationValueQibo)
-    INSTALLED_SAMPLERS["qibo"] = BackendTypes(BackendCircuitQibo, BackendExpectationValueQibo)
-    INSTALLED_NOISE_SAMPLERS["qibo"] = BackendTypes(BackendCircuitQibo, BackendExpectationValueQibo)
-except ImportError:
-    HAS_QIBO = False
-
-HAS_CIRQ = True
-try:
-    from tequila.simulators.simulator_cirq import BackendCircuitCirq, BackendExpectationValueCirq
-
-    HAS_CIRQ = True
-    INSTALLED_SIMULATORS["cirq"] = BackendTypes(CircType=BackendCircuitCirq, ExpValueType=BackendExpectationValueCirq)
-    INSTALLED_SAMPLERS["cirq"] = BackendTypes(CircType=BackendCircuitCirq, ExpValueType=BackendExpectationValueCirq)
-    INSTALLED_NOISE_SAMPLERS["cirq"] = BackendTypes(CircType=BackendCircuitCirq,
-                                                    ExpValueType=BackendExpectationValueCirq)
-
-except ImportError:
-    HAS_CIRQ = False
-
-try:
-    pkg_resources.require("qulacs")
-    import qulacs
-    from tequila.simulators.simulator_qulacs import BackendCircuitQulacs, BackendExpectationValueQulacs
-
-    HAS_QULACS = True
-    INSTALLED_SIMULATORS["qulacs"] = BackendTypes(CircType=BackendCircuitQulacs,
-                                                  ExpValueType=BackendExpectationValueQulacs)
-    INSTALLED_SAMPLERS["qulacs"] = BackendTypes(CircType=BackendCircuitQulacs,
-                                                ExpValueType=BackendExpectationValueQulacs)
-    INSTALLED_NOISE_SAMPLERS["qulacs"] = BackendTypes(CircType=BackendCircuitQulacs,
-                                                      ExpValueType=BackendExpectationValueQulacs)
-except (ImportError, DistributionNotFound):
-    HAS_QULACS = False
-
-try:
-    pkg_resources.require("qulacs-gpu")
-    import qulacs
-    from tequila.simulators.simulator_qulacs_gpu import BackendCircuitQulacsGpu, BackendExpectationValueQulacsGpu
-
-    HAS_QULACS_GPU = True
-    INSTALLED_SIMULATORS["qulacs_gpu"] = BackendTypes(CircType=BackendCircuitQulacsGpu,
-                                                  ExpValueType=BackendExpectationValueQulacsGpu)
-    INSTALLED_SAMPLERS["qulacs_gpu"] = BackendTypes(CircType=BackendCircuitQulacsGpu,
-                                                ExpValueType=BackendExpectationValueQulacsGpu)
-    INSTALLED_NOISE_SAMPLERS["qulacs_gpu"] = BackendTypes(CircType=BackendCircuitQulacsGpu,
-                                                      ExpValueType=BackendExpectationValueQulacsGpu)
-except (ImportError, DistributionNotFound):
-    HAS_QULACS_GPU = False
-
-
-HAS_PYQUIL = True
-
-try:
-    from tequila.simulators.simulator_pyquil import BackendCircuitPyquil, BackendExpectationValuePyquil
-
-    HAS_PYQUIL = True
-    INSTALLED_SIMULATORS["pyquil"] = BackendTypes(BackendCircuitPyquil, BackendExpectationValuePyquil)
-    INSTALLED_SAMPLERS["pyquil"] = BackendTypes(BackendCircuitPyquil, BackendExpectationValuePyquil)
-    INSTALLED_NOISE_SAMPLERS["pyquil"] = BackendTypes(BackendCircuitPyquil, BackendExpectationValuePyquil)
-except ImportError:
-    HAS_PYQUIL = False
-
-from tequila.simulators.simulator_symbolic import BackendCircuitSymbolic, BackendExpectationValueSymbolic
-
-INSTALLED_SIMULATORS["symbolic"] = BackendTypes(CircType=BackendCircuitSymbolic,
-                                                ExpValueType=BackendExpectationValueSymbolic)
+def _has_module(name: str) -> bool:
+    """ check if a module can be found without importing it """
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _has_distribution(name: str) -> bool:
+    """ check if a distribution is installed without importing it (needed to distinguish qulacs and qulacs-gpu) """
+    try:
+        from importlib import metadata
+    except ImportError:
+        # python < 3.8
+        import pkg_resources
+        try:
+            pkg_resources.get_distribution(name)
+            return True
+        except pkg_resources.DistributionNotFound:
+            return False
+    try:
+        metadata.distribution(name)
+        return True
+    except metadata.PackageNotFoundError:
+        return False
+
+
+# name: (module, circuit type, expectationvalue type)
+BACKEND_MODULES = {
+    "qulacs_gpu": ("tequila.simulators.simulator_qulacs_gpu", "BackendCircuitQulacsGpu",
+                   "BackendExpectationValueQulacsGpu"),
+    "qulacs": ("tequila.simulators.simulator_qulacs", "BackendCircuitQulacs", "BackendExpectationValueQulacs"),
+    "qibo": ("tequila.simulators.simulator_qibo", "BackendCircuitQibo", "BackendExpectationValueQibo"),
+    "qiskit": ("tequila.simulators.simulator_qiskit", "BackendCircuitQiskit", "BackendExpectationValueQiskit"),
+    "cirq": ("tequila.simulators.simulator_cirq", "BackendCircuitCirq", "BackendExpectationValueCirq"),
+    "pyquil": ("tequila.simulators.simulator_pyquil", "BackendCircuitPyquil", "BackendExpectationValuePyquil"),
+    "numpy": ("tequila.simulators.simulator_numpy", "BackendCircuitNumpy", "BackendExpectationValueNumpy"),
+    "numpy_subspace": ("tequila.simulators.simulator_numpy_subspace", "BackendCircuitNumpySubspace",
+                       "BackendExpectationValueNumpySubspace"),
+    "symbolic": ("tequila.simulators.simulator_symbolic", "BackendCircuitSymbolic", "BackendExpectationValueSymbolic"),
+}
+
+HAS_QISKIT = _has_module("qiskit")
+HAS_QIBO = _has_module("qibo")
+HAS_CIRQ = _has_module("cirq")
+HAS_QULACS = _has_module("qulacs") and _has_distribution("qulacs")
+HAS_QULACS_GPU = _has_module("qulacs") and _has_distribution("qulacs-gpu")
+HAS_PYQUIL = _has_module("pyquil")
+HAS_NUMPY = True
 HAS_SYMBOLIC = True
 
+_FOUND = {"qulacs_gpu": HAS_QULACS_GPU, "qulacs": HAS_QULACS, "qibo": HAS_QIBO, "qiskit": HAS_QISKIT, "cirq": HAS_CIRQ,
+          "pyquil": HAS_PYQUIL, "numpy": HAS_NUMPY, "numpy_subspace": HAS_NUMPY, "symbolic": HAS_SYMBOLIC}
+
+_LOADED_BACKENDS = {}
+
+
+class LazyBackendDict(collections.abc.Mapping):
+    """
+    Dictionary of installed backends (names as keys, BackendTypes as values).
+    The names are probed without importing the backends at import time of tequila.
+    The backend modules are imported when the dictionary is first read
+    (membership tests only import the backend in question), backends that fail to import are dropped.
+    """
+
+    def __init__(self, names: typing.Iterable[str] = None, parents: typing.Iterable['LazyBackendDict'] = None):
+        self._names = [] if names is None else list(names)
+        self._parents = [] if parents is None else list(parents)
+
+    @property
+    def names(self) -> list:
+        self._validate(list(self._names))
+        names = list(self._names)
+        for parent in self._parents:
+            names += [k for k in parent.names if k not in names]
+        return names
+
+    def _validate(self, keys: list):
+        """ import the probed backends among keys, the ones that fail are dropped (see load_backend) """
+        for key in keys:
+            if key in self._names and key not in _LOADED_BACKENDS:
+                try:
+                    load_backend(key)
+                except TequilaException:
+                    pass
+
+    def __contains__(self, key):
+        self._validate([key])
+        return key in self._names or any(key in parent for parent in self._parents)
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return load_backend(key)
+
+    def __setitem__(self, key, value: BackendTypes):
+        """ register a backend by hand """
+        _LOADED_BACKENDS[key] = value
+        if key not in self._names:
+            self._names.append(key)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def discard(self, key):
+        if key in self._names:
+            self._names.remove(key)
+
+    def __repr__(self):
+        return "LazyBackendDict({})".format(self.names)
+
+
+INSTALLED_SIMULATORS = LazyBackendDict(k for k in SUPPORTED_BACKENDS if _FOUND[k])
+INSTALLED_SAMPLERS = LazyBackendDict(k for k in SUPPORTED_BACKENDS if _FOUND[k] and k != "symbolic")
+INSTALLED_NOISE_SAMPLERS = LazyBackendDict(k for k in SUPPORTED_BACKENDS if _FOUND[k] and k in SUPPORTED_NOISE_BACKENDS)
+INSTALLED_BACKENDS = LazyBackendDict(parents=[INSTALLED_SIMULATORS, INSTALLED_SAMPLERS])
+
+
+def load_backend(backend: str) -> BackendTypes:
+    """
+    Import the module of a backend and return its types.
+    Backends that fail to import are removed from the installed backends.
+
+    Parameters
+    ----------
+    backend: str:
+        name of the backend
+
+    Returns
+    -------
+    BackendTypes:
+        circuit and expectationvalue type of the backend
+    """
+    if backend not in _LOADED_BACKENDS:
+        if backend not in BACKEND_MODULES:
+            raise TequilaException("Backend {backend} not supported ".format(backend=backend))
+        module_name, circuit_type, expectationvalue_type = BACKEND_MODULES[backend]
+        try:
+            module = importlib.import_module(module_name)
+            types = BackendTypes(CircType=getattr(module, circuit_type),
+                                 ExpValueType=getattr(module, expectationvalue_type))
+        except Exception as E:
+            # not only ImportError: incompatible versions of a package fail with all kinds of errors
+            for installed in [INSTALLED_SIMULATORS, INSTALLED_SAMPLERS, INSTALLED_NOISE_SAMPLERS]:
+                installed.discard(backend)
+            raise TequilaException("Backend {backend} is installed but failed to import:\n{error}: {message}".format(
+                backend=backend, error=type(E).__name__, message=str(E)))
+        _LOADED_BACKENDS[backend] = types
+    return _LOADED_BACKENDS[backend]
+
+
+def __getattr__(name):
+    """ the backend types used to be imported into this module, resolve them on access """
+    for backend, (module_name, circuit_type, expectationvalue_type) in BACKEND_MODULES.items():
+        if name in [circuit_type, expectationvalue_type]:
+            return getattr(importlib.import_module(module_name), name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+def _first_loadable(candidates: typing.Iterable[str]) -> typing.Optional[str]:
+    """ return the first of the candidates that can be imported """
+    for backend in candidates:
+        try:
+            load_backend(backend)
+            return backend
+        except TequilaException:
+            continue
+    return None
+
 
 def show_available_simulators():
     """ """
@@ -159,23 +248,23 @@ def pick_backend(backend: str = None, samples: int = None, noise: NoiseModel = N
     if backend is None:
         if noise is None:
             if samples is None:
-                for f in SUPPORTED_BACKENDS:
-                    if f in INSTALLED_SIMULATORS:
-                        return f
+                backend = _first_loadable(f for f in SUPPORTED_BACKENDS if f in INSTALLED_SIMULATORS)
             else:
-                for f in INSTALLED_SAMPLERS.keys():
-                    return f
+                backend = _first_loadable(INSTALLED_SAMPLERS.keys())
+            if backend is None:
+                raise TequilaException("No simulators installed on your system")
+            return backend
         else:
             if samples is None:
                 raise TequilaException(
                     "Noise requires sampling; please provide a positive, integer value for samples")
-            for f in SUPPORTED_NOISE_BACKENDS:
-                if noise == 'device':
-                    raise TequilaException('device noise requires a device, which requires a named backend!')
-                else:
-                    return f
-            raise TequilaException(
-                            'Could not find any installed sampler!')
+            if noise == 'device':
+                raise TequilaException('device noise requires a device, which requires a named backend!')
+            backend = _first_loadable(f for f in SUPPORTED_NOISE_BACKENDS if f in INSTALLED_NOISE_SAMPLERS)
+            if backend is None:
+                raise TequilaException(
+                                'Could not find any installed sampler!')
+            return backend
 
 
     if hasattr(backend, "lower"):
@@ -213,15 +302,52 @@ def pick_backend(backend: str = None, samples: int = None, noise: NoiseModel = N
         raise TequilaException(
             "Backend {backend} not installed or else Noise has not been implemented".format(backend=backend))
 
+    # import the backend now, so that broken installations are reported here
+    load_backend(backend)
     return backend
 
 
+# least recently used compiled templates of shifted expectationvalues, see _compile_template
+_TEMPLATE_CACHE = collections.OrderedDict()
+TEMPLATE_CACHE_SIZE = 16
+
+
+def _compile_template(E: 'ShiftedExpectationValueImpl', ExpValueType, variables, noise=None, device=None, *args,
+                      **kwargs) -> BackendExpectationValue:
+    """
+    Compile the template of a shifted expectationvalue.
+    Without noise, device and further options the result is kept in a small module-level cache
+    (at most TEMPLATE_CACHE_SIZE entries, keyed on the structure of the template, the backend and the variables),
+    so that all shifted expectationvalues of a gradient share one compiled circuit, also over several calls of compile.
+    """
+    template = E.template
+    key = None
+    if noise is None and device is None and len(args) == 0 and len(kwargs) == 0 and all(
+            isinstance(v, RealNumber) for v in variables.values()):
+        key = (fingerprint(template), ExpValueType,
+               tuple(sorted(((fingerprint(k), float(v)) for k, v in variables.items()), key=str)))
+        if has_identity(key):
+            # objects without structural representation, their ids could be reused later
+            key = None
+        elif key in _TEMPLATE_CACHE:
+            _TEMPLATE_CACHE.move_to_end(key)
+            return _TEMPLATE_CACHE[key]
+    compiled = ExpValueType(template, variables={**variables, **{k: 0.0 for k in E.shifts}}, noise=noise,
+                            device=device, *args, **kwargs)
+    if key is not None and TEMPLATE_CACHE_SIZE > 0:
+        _TEMPLATE_CACHE[key] = compiled
+        while len(_TEMPLATE_CACHE) > TEMPLATE_CACHE_SIZE:
+            _TEMPLATE_CACHE.popitem(last=False)
+    return compiled
+
+
 def compile_objective(objective: typing.Union['Objective','VectorObjective'],
                       variables: typing.Dict['Variable', 'RealNumber'] = None,
                       backend: str = None,
                       samples: int = None,
                       device: str = None,
                       noise: NoiseModel = None,
+                      executor: ExpectationValueExecutor = None,
                       *args,
                       **kwargs) -> Objective:
     """
@@ -240,6 +366,9 @@ def compile_objective(objective: typing.Union['Objective','VectorObjective'],
         the device on which the objective should (perhaps emulatedly) sample.
     noise: str or NoiseModel, optional:
         the noise to apply to all circuits in the objective.
+    executor: ExpectationValueExecutor, optional:
+        evaluate the distinct expectationvalues of the compiled objective in parallel on the processes of the executor.
+        Default: the executor set with set_default_executor, None means sequential evaluation.
     args
     kwargs
 
@@ -250,6 +379,8 @@ def compile_objective(objective: typing.Union['Objective','VectorObjective'],
     """
 
     backend = pick_backend(backend=backend, samples=samples, noise=noise, device=device)
+    if executor is None:
+        executor = get_default_executor()
 
     # dummy variables
     if variables is None:
@@ -268,29 +399,47 @@ def compile_objective(objective: typing.Union['Objective','VectorObjective'],
             all_compiled = False
 
     if all_compiled:
-        return objective
+        return _attach_executor(objective, executor=executor)
 
     argsets = objective.argsets
     compiled_sets = []
+    # avoid double compilations of structurally equal expectationvalues, also across argsets
+    expectationvalues = {}
     for argset in argsets:
         compiled_args = []
-        # avoid double compilations
-        expectationvalues = {}
         for arg in argset:
-            if hasattr(arg, "H") and hasattr(arg, "U") and not isinstance(arg, BackendExpectationValue):
-                if arg not in expectationvalues:
-                    compiled_expval = ExpValueType(arg, variables=variables, noise=noise, device=device, *args, **kwargs)
-                    expectationvalues[arg] = compiled_expval
-                else:
-                    compiled_expval = expectationvalues[arg]
-                compiled_args.append(compiled_expval)
+            if isinstance(arg, ShiftedExpectationValueImpl):
+                key = fingerprint(arg)
+                if key not in expectationvalues:
+                    template = _compile_template(arg, ExpValueType=ExpValueType, variables=variables, noise=noise,
+                                                 device=device, *args, **kwargs)
+                    expectationvalues[key] = template.shifted(arg)
+                compiled_args.append(expectationvalues[key])
+            elif hasattr(arg, "H") and hasattr(arg, "U") and not isinstance(arg, BackendExpectationValue):
+                key = fingerprint(arg)
+                if key not in expectationvalues:
+                    expectationvalues[key] = ExpValueType(arg, variables=variables, noise=noise, device=device,
+                                                          *args, **kwargs)
+                compiled_args.append(expectationvalues[key])
             else:
                 compiled_args.append(arg)
         compiled_sets.append(compiled_args)
     if isinstance(objective, Objective):
-        return type(objective)(args=compiled_sets[0], transformation=objective.transformation)
-    if isinstance(objective, VectorObjective):
-        return type(objective)(argsets=compiled_sets, transformations=objective.transformations)
+        compiled = type(objective)(args=compiled_sets[0], transformation=objective.transformation)
+    elif isinstance(objective, VectorObjective):
+        compiled = type(objective)(argsets=compiled_sets, transformations=objective.transformations)
+    return _attach_executor(compiled, executor=executor)
+
+
+def _attach_executor(objective: typing.Union['Objective', 'VectorObjective'],
+                     executor: ExpectationValueExecutor = None) -> typing.Union['Objective', 'VectorObjective']:
+    """ register the compiled expectationvalues of the objective with the executor that will evaluate them """
+    if executor is not None:
+        for arg in objective.args:
+            if isinstance(arg, BackendExpectationValue):
+                executor.register(arg)
+        objective._executor = executor
+    return objective
 
 
 def compile_circuit(abstract_circuit: 'QCircuit',
@@ -498,6 +647,8 @@ def compile(objective: typing.Union['Objective', 'QCircuit'],
         the noise model to apply to the objective or QCircuit.
     device: optional:
         a device on which (or in emulation of which) to sample the circuit.
+    executor: ExpectationValueExecutor, optional:
+        only for objectives: evaluate their distinct expectationvalues in parallel, see compile_objective
     Returns
     -------
     simulators.BackendCircuit or Objective
@@ -559,5 +710,3 @@ def compile_to_function(objective: typing.Union['Objective', 'QCircuit'], *args,
 
     return objective_function
 
-
-INSTALLED_BACKENDS = {**INSTALLED_SIMULATORS, **INSTALLED_SAMPLERS}
@@ -1,14 +1,16 @@
-from tequila.utils import TequilaException, to_float, TequilaWarning
+from tequila.utils import TequilaException, to_float, TequilaWarning, has_identity
 from tequila.circuit.circuit import QCircuit
 from tequila.utils.keymap import KeyMapSubregisterToRegister
 from tequila.utils.misc import to_float
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila.circuit.compiler import change_basis
 from tequila import BitString
-from tequila.objective.objective import Variable, format_variable_dictionary
+from tequila.objective.objective import Variable, format_variable_dictionary, format_variable_batch, \
+    is_variable_batch, ShiftedExpectationValueImpl, EvaluationPlan
 from tequila.circuit import compiler
+from tequila.wavefunction.pauli_kernels import make_pauli_masks, expectationvalue_from_counts, parity
 
-import numbers, typing, numpy, copy, warnings
+import numbers, typing, numpy, copy, warnings, collections
 
 from dataclasses import dataclass
 
@@ -428,7 +430,14 @@ class BackendCircuit():
         counts = self.sample(samples=samples, read_out_qubits=abstract_qubits_H, variables=variables, *args, **kwargs)
         read_out_map = {q: i for i, q in enumerate(abstract_qubits_H)}
 
-        # compute energy
+        # compute energy, the parities of all terms and outcomes in one go
+        if len(abstract_qubits_H) <= 63:
+            outcomes, occurrences = counts.to_sparse_arrays(n_qubits=len(abstract_qubits_H))
+            # small failsafe
+            assert numpy.isclose(occurrences.real.sum(), samples)
+            _, zmasks, coeffs = make_pauli_masks(hamiltonian, n_qubits=len(abstract_qubits_H), qubit_map=read_out_map)
+            return to_float(expectationvalue_from_counts(outcomes, occurrences.real, zmasks, coeffs) / samples)
+
         E = 0.0
         for paulistring in hamiltonian.paulistrings:
             n_samples = 0
@@ -438,9 +447,9 @@ class BackendCircuit():
                 # and mapp them to the backend qubits
                 mapped_ps_support = [read_out_map[i] for i in paulistring._data.keys()]
                 # count all measurements that resulted in |1> for those qubits
-                parity = [k for i, k in enumerate(key.array) if i in mapped_ps_support].count(1)
+                n_ones = [k for i, k in enumerate(key.array) if i in mapped_ps_support].count(1)
                 # evaluate the PauliString
-                sign = (-1) ** parity
+                sign = (-1) ** n_ones
                 Etmp += sign * count
                 n_samples += count
             E += (Etmp / samples) * paulistring.coeff
@@ -490,16 +499,38 @@ class BackendCircuit():
         counts = self.sample(samples=samples, circuit=circuit, read_out_qubits=qubits, variables=variables, *args,
                              **kwargs)
         # compute energy
-        E = 0.0
-        n_samples = 0
-        for key, count in counts.items():
-            parity = key.array.count(1)
-            sign = (-1) ** parity
-            E += sign * count
-            n_samples += count
-        assert n_samples == samples
-        E = E / samples * paulistring.coeff
-        return E
+        return self.paulistring_from_counts(counts=counts, samples=samples, n_qubits=len(qubits),
+                                            coeff=paulistring.coeff)
+
+    @staticmethod
+    def paulistring_from_counts(counts: QubitWaveFunction, samples: int, n_qubits: int,
+                                coeff: numbers.Number = 1.0) -> numbers.Real:
+        """
+        Evaluate a paulistring from the counts measured in its eigenbasis.
+
+        Parameters
+        ----------
+        counts:
+            the measured counts, one bit for each qubit of the paulistring
+        samples:
+            the number of samples that were taken
+        n_qubits:
+            number of measured qubits
+        coeff:
+            the coefficient of the paulistring
+
+        Returns
+        -------
+        float:
+            the average result of the paulistring
+        """
+        if n_qubits > 63:
+            E = sum((-1) ** key.array.count(1) * count for key, count in counts.items())
+            return E / samples * coeff
+        outcomes, occurrences = counts.to_sparse_arrays(n_qubits=n_qubits)
+        assert numpy.isclose(occurrences.real.sum(), samples)
+        signs = 1.0 - 2.0 * parity(outcomes)
+        return numpy.dot(signs, occurrences.real) / samples * coeff
 
     def do_sample(self, samples, circuit, noise, abstract_qubits=None, *args, **kwargs) -> QubitWaveFunction:
         """
@@ -660,6 +691,88 @@ class BackendCircuit():
         return type(self)(**self._input_args)
 
 
+class ResultCache:
+    """
+    Least recently used cache for the results of compiled expectationvalues in exact simulation.
+
+    Entries are keyed on the structure of the compiled expectationvalue (see EvaluationPlan.evaluation_key),
+    the exact values of its variables and the number of samples.
+    Structurally equal expectationvalues share their entries, also if they were built and compiled separately,
+    e.g. an objective and its gradient evaluated at the same point by an optimizer.
+    Only the keys and the results are stored, no circuits or Hamiltonians are kept alive.
+
+    One global instance (RESULT_CACHE) is used by all compiled expectationvalues.
+    It is off by default (maxsize 0) and switched on with tq.set_result_cache_size.
+    Expectationvalues whose structure contains objects without structural representation (see has_identity)
+    are not cached. The values of globals read by transformations are taken when the key is first computed,
+    results of an expectationvalue are not updated if such a global is changed later on.
+
+    Attributes
+    ----------
+    maxsize:
+        the maximal number of stored results, 0 disables the cache
+    hits:
+        number of results taken from the cache
+    misses:
+        number of results that had to be computed
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key):
+        """ the stored result or None """
+        if key not in self._data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, result):
+        """ store a result """
+        if self.maxsize <= 0:
+            return
+        self._data[key] = result
+        self._data.move_to_end(key)
+        self.resize(self.maxsize)
+
+    def resize(self, maxsize: int):
+        """ change maxsize, the least recently used results beyond it are dropped """
+        self.maxsize = maxsize
+        while len(self._data) > max(maxsize, 0):
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+# the cache used by all compiled expectationvalues, off by default
+RESULT_CACHE = ResultCache()
+
+
+def set_result_cache_size(maxsize: int = 1024):
+    """
+    Set the number of results kept by the global cache of exact expectationvalue evaluations (see ResultCache).
+    Useful if structurally equal expectationvalues are evaluated repeatedly at the same point,
+    e.g. by an optimizer evaluating an objective and its gradient.
+
+    Parameters
+    ----------
+    maxsize:
+        the maximal number of stored results, 0 switches the cache off and drops all stored results
+    """
+    RESULT_CACHE.resize(maxsize)
+
+
 class BackendExpectationValue:
     """
     Class representing an ExpectationValue for evaluation by some backend.
@@ -726,7 +839,7 @@ class BackendExpectationValue:
         """
         result = []
         if self.U is not None:
-            result = self.U.extract_variables()
+            result = [k for k in self.U.extract_variables() if k not in self._shifts]
         return result
 
     def __init__(self, E, variables, noise, device, *args, **kwargs):
@@ -745,6 +858,7 @@ class BackendExpectationValue:
         """
         self.abstract_expectationvalue = E
         self._input_args = {"variables": variables, "device": device, "noise": noise, **kwargs}
+        self._shifts = E.shifts if isinstance(E, ShiftedExpectationValueImpl) else {}
         self._U = self.initialize_unitary(E.U, variables=variables, noise=noise, device=device, **kwargs)
         self._reduced_hamiltonians = self.reduce_hamiltonians(self.abstract_expectationvalue.H)
         self._H = self.initialize_hamiltonian(self._reduced_hamiltonians)
@@ -752,6 +866,30 @@ class BackendExpectationValue:
         self._variables = E.extract_variables()
         self._contraction = E._contraction
         self._shape = E._shape
+        # structural identity, computed on first use (see EvaluationPlan.evaluation_key)
+        self._evaluation_key = None
+
+    def shifted(self, E: ShiftedExpectationValueImpl) -> "BackendExpectationValue":
+        """
+        Backend expectationvalue for a ShiftedExpectationValueImpl whose template was compiled to self.
+        Compiled circuit and hamiltonians are shared, only the values of the shift variables differ.
+
+        Parameters
+        ----------
+        E:
+            the shifted expectationvalue, E.template needs to be the abstract expectationvalue of self
+
+        Returns
+        -------
+            the compiled shifted expectationvalue
+        """
+        result = object.__new__(type(self))
+        result.__dict__.update(self.__dict__)
+        result.abstract_expectationvalue = E
+        result._variables = E.extract_variables()
+        result._shifts = E.shifts
+        result._evaluation_key = None
+        return result
 
     def __copy__(self):
         return self.__deepcopy__()
@@ -760,19 +898,78 @@ class BackendExpectationValue:
         return type(self)(self.abstract_expectationvalue, **self._input_args)
 
     def __call__(self, variables, samples: int = None, *args, **kwargs):
+        """
+        Simulate or sample the expectationvalue.
+
+        Parameters
+        ----------
+        variables:
+            dictionary assigning values to the variables of the circuit.
+            A batch of variables can be passed as list of dictionaries or as array of shape (n_points, n_variables)
+            with columns ordered as the variables of the expectationvalue
+        samples: int, optional:
+            how many shots to sample with. If None, perform full wavefunction simulation.
+
+        Returns
+        -------
+            the result of the expectationvalue, for batches an array whose first axis enumerates the points
+        """
+        if is_variable_batch(variables):
+            variables = format_variable_batch(variables, keys=self._variables)
+            for v in variables:
+                self._check_variables(v)
+            variables = [self._add_shifts(v) for v in variables]
+            if samples is None:
+                data = self.simulate_batch(variables=variables, *args, **kwargs)
+            else:
+                data = [self.sample(variables=v, samples=samples, *args, **kwargs) for v in variables]
+            return numpy.asarray([self._contract(d) for d in data])
 
         variables = format_variable_dictionary(variables=variables)
+        self._check_variables(variables)
+
+        # exact simulations are deterministic, the results can be reused
+        key = None
+        if samples is None and len(args) == 0 and len(kwargs) == 0 and RESULT_CACHE.maxsize > 0 \
+                and self._input_args.get("noise", None) is None and self._result_cacheable():
+            key = (EvaluationPlan.evaluation_key(self), tuple(float(variables[k]) for k in self._variables), samples)
+            result = RESULT_CACHE.get(key)
+            if result is not None:
+                return copy.copy(result)
+
+        variables = self._add_shifts(variables)
+
+        if samples is None:
+            data = self.simulate(variables=variables, *args, **kwargs)
+        else:
+            data = self.sample(variables=variables, samples=samples, *args, **kwargs)
+
+        result = self._contract(data)
+        if key is not None:
+            RESULT_CACHE.put(key, result=copy.copy(result))
+        return result
+
+    def _result_cacheable(self) -> bool:
+        """ the key does not identify objects by their id (which could be reused after they are deleted) """
+        if getattr(self, "_cacheable", None) is None:
+            self._cacheable = not has_identity(EvaluationPlan.evaluation_key(self))
+        return self._cacheable
+
+    def _check_variables(self, variables):
         if self._variables is not None and len(self._variables) > 0:
             if variables is None or (not set(self._variables) <= set(variables.keys())):
                 raise TequilaException(
                     "BackendExpectationValue received not all variables. Circuit depends on variables {}, you gave {}".format(
                         self._variables, variables))
 
-        if samples is None:
-            data = self.simulate(variables=variables, *args, **kwargs)
-        else:
-            data = self.sample(variables=variables, samples=samples, *args, **kwargs)
+    def _add_shifts(self, variables):
+        """ add the values of the shift variables (see ShiftedExpectationValueImpl) """
+        if len(self._shifts) == 0:
+            return variables
+        return format_variable_dictionary({**variables, **self._shifts})
 
+    def _contract(self, data):
+        """ bring the raw data from simulate or sample into the shape of the expectationvalue """
         if self._shape is None and self._contraction is None:
             # this is the default
             return numpy.sum(data)
@@ -852,6 +1049,24 @@ class BackendExpectationValue:
             result.append(to_float(E))
         return numpy.asarray(result)
 
+    def simulate_batch(self, variables: list, *args, **kwargs) -> list:
+        """
+        Simulate the expectationvalue for a batch of variables.
+        The default evaluates one point after the other,
+        overwrite in inheritors that can simulate the whole batch at once.
+
+        Parameters
+        ----------
+        variables: list:
+            list of formatted variable dictionaries
+
+        Returns
+        -------
+        list:
+            the results of simulate for each point
+        """
+        return [self.simulate(variables=v, *args, **kwargs) for v in variables]
+
     def simulate(self, variables, *args, **kwargs):
         """
         Simulate the expectationvalue.
@@ -869,12 +1084,7 @@ class BackendExpectationValue:
             the result of simulation.
         """
         self.update_variables(variables)
-        result = []
-        for H in self.H:
-            final_E = 0.0
-            # TODO inefficient,
-            # Always better to overwrite this function
-            wfn = self.U.simulate(variables=variables, *args, **kwargs)
-            final_E += wfn.compute_expectationvalue(operator=H)
-            result.append(to_float(final_E))
-        return numpy.asarray(result)
+        # simulate once and evaluate all hamiltonians on the same state
+        wfn = self.U.simulate(variables=variables, *args, **kwargs)
+        result = wfn.compute_expectationvalues(operators=self.H)
+        return numpy.asarray([to_float(E) for E in result])
@@ -0,0 +1,753 @@
+import numbers, typing, numpy
+from dataclasses import dataclass
+from tequila import TequilaException
+from tequila.utils.bitstrings import BitNumbering, BitString
+from tequila.objective.objective import Variable
+from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
+from tequila.wavefunction.pauli_kernels import make_pauli_masks, expectationvalue_from_masks, apply_masks
+from tequila.simulators.simulator_base import BackendCircuit, BackendExpectationValue, QCircuit
+
+"""
+Dependency free statevector simulator
+
+The wavefunction of n qubits is stored as complex numpy array of shape (2,)*n
+Axis k of that array belongs to backend qubit k, so that a flat C-ordered view
+follows the MSB convention of tequila (qubit 0 is the most significant bit).
+Gates are applied as tensor contractions over the target axes,
+controls are realized by restricting the contraction to the sub-tensor where all control axes are 1.
+Hamiltonians are translated into integer bitmasks and evaluated with vectorized kernels.
+All kernels only address the last n axes of a state, leading axes are left untouched.
+"""
+
+
+class TequilaNumpyException(TequilaException):
+    def __str__(self):
+        return "Error in numpy backend:" + self.message
+
+
+_X = numpy.array([[0.0, 1.0], [1.0, 0.0]], dtype=complex)
+_Y = numpy.array([[0.0, -1.0j], [1.0j, 0.0]], dtype=complex)
+_Z = numpy.array([[1.0, 0.0], [0.0, -1.0]], dtype=complex)
+_H = numpy.array([[1.0, 1.0], [1.0, -1.0]], dtype=complex) / numpy.sqrt(2.0)
+_I = numpy.eye(2, dtype=complex)
+
+_PAULI_MATRICES = {"X": _X, "Y": _Y, "Z": _Z}
+
+
+def _rotation_matrix(axis: str, angle: typing.Union[numbers.Real, numpy.ndarray]) -> numpy.ndarray:
+    """ matrix of exp(-i angle/2 P) with P the Pauli matrix of the given axis, one matrix for each angle of an array """
+    c = numpy.cos(numpy.asarray(angle) / 2.0)[..., None, None]
+    s = numpy.sin(numpy.asarray(angle) / 2.0)[..., None, None]
+    return c * _I - 1.0j * s * _PAULI_MATRICES[axis]
+
+
+@dataclass
+class NumpyGate:
+    """
+    Instruction for the numpy simulator.
+    name: the tequila name of the gate
+    target: backend qubit numbers
+    control: backend qubit numbers
+    parameter: callable returning the angle of the gate for given variables (None for unparametrized gates)
+               for a list of variables (a batch) the angles are evaluated for each entry
+    paulistring: dict mapping backend qubit numbers to 'X','Y','Z' (only for Exp-Pauli gates)
+    abstract_parameter: the tequila parameter of the abstract gate, the angle is abstract_parameter * scale
+    scale: see abstract_parameter
+    """
+    name: str
+    target: tuple
+    control: tuple = ()
+    parameter: typing.Callable = None
+    paulistring: dict = None
+    abstract_parameter: typing.Any = None
+    scale: numbers.Number = 1.0
+
+    def angle(self, variables) -> typing.Union[numbers.Real, numpy.ndarray]:
+        if isinstance(variables, list):
+            return numpy.asarray([self.parameter(v) for v in variables], dtype=float)
+        return self.parameter(variables)
+
+    def matrix(self, variables, shift: numbers.Real = 0.0) -> numpy.ndarray:
+        if self.name in ["Rx", "Ry", "Rz"]:
+            return _rotation_matrix(axis=self.name[1].upper(), angle=self.angle(variables) + shift)
+        elif self.name == "I":
+            return _I
+        elif self.name == "H":
+            return _H
+        else:
+            return _PAULI_MATRICES[self.name]
+
+
+# parameter shift rules as (shift, weight) pairs for gates exp(-i angle/2 P)
+# controlled gates have the generator eigenvalues (0, +-1/2) and need four shifts
+_SHIFT_RULE = ((numpy.pi / 2, 0.5), (-numpy.pi / 2, -0.5))
+_CONTROLLED_SHIFT_RULE = ((numpy.pi / 2, (numpy.sqrt(2.0) + 1.0) / (4.0 * numpy.sqrt(2.0))),
+                          (-numpy.pi / 2, -(numpy.sqrt(2.0) + 1.0) / (4.0 * numpy.sqrt(2.0))),
+                          (3 * numpy.pi / 2, -(numpy.sqrt(2.0) - 1.0) / (4.0 * numpy.sqrt(2.0))),
+                          (-3 * numpy.pi / 2, (numpy.sqrt(2.0) - 1.0) / (4.0 * numpy.sqrt(2.0))))
+
+
+def _control_view(state: numpy.ndarray, control: tuple, n_qubits: int) -> numpy.ndarray:
+    """ view on the sub-tensor where all control qubits are in state 1 """
+    if len(control) == 0:
+        return state
+    index = [Ellipsis] + [slice(None)] * n_qubits
+    for c in control:
+        index[1 + c] = 1
+    return state[tuple(index)]
+
+
+def _axis(qubit: int, control: tuple, n_qubits: int) -> int:
+    """ negative axis of qubit in the control view """
+    return qubit - n_qubits + len([c for c in control if c > qubit])
+
+
+def apply_matrix(state: numpy.ndarray, matrix: numpy.ndarray, target: int, n_qubits: int, control: tuple = ()):
+    """
+    apply a single qubit matrix (in-place) on the last n_qubits axes of state
+    a stack of matrices of shape (batch, 2, 2) is applied to a batch of states of shape (batch, 2, ..., 2)
+    """
+    view = _control_view(state, control=control, n_qubits=n_qubits)
+    axis = _axis(target, control=control, n_qubits=n_qubits)
+    if matrix.ndim == 2:
+        view[...] = numpy.moveaxis(numpy.tensordot(matrix, view, axes=([1], [view.ndim + axis])), 0, axis)
+    else:
+        contracted = numpy.einsum("nab,n...b->n...a", matrix, numpy.moveaxis(view, axis, -1))
+        view[...] = numpy.moveaxis(contracted, -1, axis)
+
+
+def apply_swap(state: numpy.ndarray, first: int, second: int, n_qubits: int, control: tuple = ()):
+    """ swap two qubits (in-place) on the last n_qubits axes of state """
+    view = _control_view(state, control=control, n_qubits=n_qubits)
+    a = _axis(first, control=control, n_qubits=n_qubits)
+    b = _axis(second, control=control, n_qubits=n_qubits)
+    view[...] = numpy.swapaxes(view, a, b).copy()
+
+
+def apply_exponential_pauli(state: numpy.ndarray, paulistring: dict, angle: typing.Union[numbers.Real, numpy.ndarray],
+                            n_qubits: int, control: tuple = ()):
+    """
+    apply exp(-i angle/2 P) = cos(angle/2) - i sin(angle/2) P (in-place) on the last n_qubits axes of state
+    an array of angles is applied to a batch of states of shape (batch, 2, ..., 2)
+    """
+    view = _control_view(state, control=control, n_qubits=n_qubits)
+    angle = numpy.reshape(angle, numpy.shape(angle) + (1,) * (view.ndim - numpy.ndim(angle)))
+    pview = view.copy()
+    for q, p in paulistring.items():
+        axis = _axis(q, control=control, n_qubits=n_qubits)
+        pview = numpy.moveaxis(numpy.tensordot(_PAULI_MATRICES[p], pview, axes=([1], [pview.ndim + axis])), 0, axis)
+    view[...] = numpy.cos(angle / 2.0) * view - 1.0j * numpy.sin(angle / 2.0) * pview
+
+
+class BackendCircuitNumpy(BackendCircuit):
+    """
+    Class representing circuits compiled to the native numpy statevector simulator.
+    See BackendCircuit for documentation of features and methods inherited therefrom
+
+    Attributes
+    ----------
+    measurements:
+        the abstract qubits that are read out when sampling
+    variables:
+        the variables given in the last call to update_variables
+
+    Methods
+    -------
+    apply_circuit:
+        apply the gates of the circuit to a statevector (in-place)
+    apply_gate:
+        apply a single, possibly shifted, gate to a statevector (in-place)
+    apply_inverse_gate:
+        apply the inverse of a single gate to a statevector (in-place)
+    apply_generator:
+        apply the generator of a parametrized gate to a statevector
+    angle_derivatives:
+        derivatives of the gate angles with respect to the variables
+    shift_rule:
+        parameter shift rule of a parametrized gate
+    initialize_state:
+        create the statevector for a given basis state
+    dimension:
+        number of amplitudes of the statevectors
+    """
+
+    compiler_arguments = {
+        "trotterized": True,
+        "swap": False,
+        "multitarget": True,
+        "controlled_rotation": False,
+        "generalized_rotation": True,
+        "exponential_pauli": False,
+        "controlled_exponential_pauli": True,
+        "phase": True,
+        "power": True,
+        "hadamard_power": True,
+        "controlled_power": True,
+        "controlled_phase": True,
+        "toffoli": False,
+        "phase_to_z": True,
+        "cc_max": False
+    }
+
+    numbering = BitNumbering.MSB
+
+    def __init__(self, abstract_circuit, noise=None, *args, **kwargs):
+        """
+
+        Parameters
+        ----------
+        abstract_circuit: QCircuit:
+            the circuit to compile to numpy instructions
+        noise: optional:
+            noise is not supported by this backend
+        args
+        kwargs
+        """
+        if noise is not None:
+            raise TequilaNumpyException("noisy simulation is not supported by the numpy backend")
+        self.measurements = None
+        self.variables = None
+        self._angle_derivatives = None
+        super().__init__(abstract_circuit=abstract_circuit, noise=noise, *args, **kwargs)
+
+    def initialize_circuit(self, *args, **kwargs):
+        """
+        Returns
+        -------
+        list:
+            an empty list that will hold NumpyGate instructions
+        """
+        return []
+
+    def initialize_state(self, initial_state: int = 0, n_qubits: int = None, batch_size: int = None) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        initial_state: int:
+            the basis state in MSB convention
+        n_qubits:
+            number of qubits, defaults to the qubits of the circuit
+        batch_size:
+            if given, a stack of batch_size identical states is created
+
+        Returns
+        -------
+        numpy.ndarray:
+            the statevector of shape (2,)*n_qubits or (batch_size,)+(2,)*n_qubits
+        """
+        if n_qubits is None:
+            n_qubits = self.n_qubits
+        batch = () if batch_size is None else (batch_size,)
+        state = numpy.zeros(batch + (2 ** n_qubits,), dtype=complex)
+        state[..., initial_state] = 1.0
+        return state.reshape(batch + (2,) * n_qubits)
+
+    def dimension(self, initial_state: int = 0) -> int:
+        """
+        Returns
+        -------
+        int:
+            the number of amplitudes of the statevectors
+        """
+        return 2 ** self.n_qubits
+
+    def update_variables(self, variables):
+        """
+        angles are evaluated on the fly, so only store the variables
+        """
+        self.variables = variables
+
+    def add_parametrized_gate(self, gate, circuit, *args, **kwargs):
+        """
+        add a parametrized gate (rotations and exponential paulis).
+        Parameters
+        ----------
+        gate: QGateImpl:
+            the gate to add to the circuit.
+        circuit: list:
+            the circuit to which the gate is to be added
+        """
+        if gate.name == "Exp-Pauli":
+            paulistring = {self.qubit(k): v.upper() for k, v in gate.paulistring.items()}
+            coeff = gate.paulistring.coeff
+            circuit.append(NumpyGate(name=gate.name, target=tuple(paulistring.keys()),
+                                     control=tuple(self.qubit(c) for c in gate.control),
+                                     parameter=lambda variables, p=gate.parameter: p(variables) * coeff,
+                                     paulistring=paulistring, abstract_parameter=gate.parameter, scale=coeff))
+        elif gate.name in ["Rx", "Ry", "Rz"]:
+            for t in gate.target:
+                circuit.append(NumpyGate(name=gate.name, target=(self.qubit(t),),
+                                         control=tuple(self.qubit(c) for c in gate.control),
+                                         parameter=gate.parameter, abstract_parameter=gate.parameter))
+        else:
+            raise TequilaNumpyException("parametrized gate {} not supported".format(gate.name))
+
+    def add_basic_gate(self, gate, circuit, *args, **kwargs):
+        """
+        add an unparametrized gate to the circuit.
+        Parameters
+        ----------
+        gate: QGateImpl:
+            the gate to be added to the circuit.
+        circuit: list:
+            the circuit, to which a gate is to be added.
+        """
+        if gate.name not in ["I", "X", "Y", "Z", "H", "SWAP"]:
+            raise TequilaNumpyException("gate {} not supported".format(gate.name))
+        control = tuple(self.qubit(c) for c in gate.control)
+        if gate.name == "SWAP":
+            circuit.append(NumpyGate(name=gate.name, target=tuple(self.qubit(t) for t in gate.target), control=control))
+        else:
+            for t in gate.target:
+                circuit.append(NumpyGate(name=gate.name, target=(self.qubit(t),), control=control))
+
+    def add_measurement(self, circuit, target_qubits, *args, **kwargs):
+        """
+        store the qubits that are measured, measurements are executed in do_sample
+        """
+        self.measurements = sorted(target_qubits)
+        return circuit
+
+    def apply_circuit(self, state: numpy.ndarray, circuit: list = None, variables=None) -> numpy.ndarray:
+        """
+        Apply circuit instructions to a statevector (in-place)
+
+        Parameters
+        ----------
+        state:
+            numpy array whose last self.n_qubits axes are of dimension 2
+        circuit:
+            list of NumpyGate instructions, defaults to self.circuit
+        variables:
+            defaults to the variables of the last update_variables call
+            if a list of variables is given, state needs to be a batch of states of the same length
+
+        Returns
+        -------
+            the updated state
+        """
+        if circuit is None:
+            circuit = self.circuit
+        if variables is None:
+            variables = self.variables
+        for gate in circuit:
+            self.apply_gate(state, gate=gate, variables=variables)
+        return state
+
+    def apply_gate(self, state: numpy.ndarray, gate: NumpyGate, variables, shift: numbers.Real = 0.0) -> numpy.ndarray:
+        """
+        Apply a single instruction to a statevector (in-place)
+
+        Parameters
+        ----------
+        state:
+            numpy array whose last self.n_qubits axes are of dimension 2
+        gate:
+            the NumpyGate instruction
+        variables:
+            the variables (or list of variables) that determine the angle of parametrized gates
+        shift:
+            added to the angle of parametrized gates
+
+        Returns
+        -------
+            the updated state
+        """
+        n_qubits = self.n_qubits
+        if gate.name == "Exp-Pauli":
+            apply_exponential_pauli(state, paulistring=gate.paulistring, angle=gate.angle(variables) + shift,
+                                    n_qubits=n_qubits, control=gate.control)
+        elif gate.name == "SWAP":
+            apply_swap(state, *gate.target, n_qubits=n_qubits, control=gate.control)
+        else:
+            apply_matrix(state, matrix=gate.matrix(variables, shift=shift), target=gate.target[0], n_qubits=n_qubits,
+                         control=gate.control)
+        return state
+
+    def apply_inverse_gate(self, state: numpy.ndarray, gate: NumpyGate, variables) -> numpy.ndarray:
+        """
+        Apply the inverse of a single instruction to a statevector (in-place)
+        Unparametrized gates are self-inverse, rotations are applied with negated angle
+
+        Parameters
+        ----------
+        state:
+            numpy array whose last self.n_qubits axes are of dimension 2
+        gate:
+            the NumpyGate instruction
+        variables:
+            the variables that determine the angle of parametrized gates
+
+        Returns
+        -------
+            the updated state
+        """
+        if gate.parameter is None:
+            return self.apply_gate(state, gate=gate, variables=variables)
+        return self.apply_gate(state, gate=gate, variables=variables, shift=-2.0 * gate.angle(variables))
+
+    def apply_generator(self, state: numpy.ndarray, gate: NumpyGate) -> numpy.ndarray:
+        """
+        Apply the generator of a parametrized gate exp(-i angle/2 P) to a statevector.
+        For controlled gates the generator is P on the subspace where all controls are 1 and zero elsewhere.
+
+        Parameters
+        ----------
+        state:
+            numpy array whose last self.n_qubits axes are of dimension 2, not changed
+        gate:
+            the NumpyGate instruction of a rotation or exponential pauli
+
+        Returns
+        -------
+            a new state holding P|state>
+        """
+        n_qubits = self.n_qubits
+        result = numpy.zeros_like(state)
+        _control_view(result, control=gate.control, n_qubits=n_qubits)[...] = _control_view(state, control=gate.control,
+                                                                                           n_qubits=n_qubits)
+        if gate.name == "Exp-Pauli":
+            paulistring = gate.paulistring.items()
+        else:
+            paulistring = [(gate.target[0], gate.name[1].upper())]
+        for q, p in paulistring:
+            apply_matrix(result, matrix=_PAULI_MATRICES[p], target=q, n_qubits=n_qubits, control=gate.control)
+        return result
+
+    def shift_rule(self, gate: NumpyGate) -> tuple:
+        """
+        Parameters
+        ----------
+        gate:
+            the NumpyGate instruction of a rotation or exponential pauli
+
+        Returns
+        -------
+        tuple:
+            the (shift, weight) pairs of the parameter shift rule for the angle of the gate
+        """
+        return _CONTROLLED_SHIFT_RULE if len(gate.control) > 0 else _SHIFT_RULE
+
+    def angle_derivatives(self) -> dict:
+        """
+        Derivatives of the gate angles with respect to the variables they depend on.
+        Computed on first call and stored afterwards.
+
+        Returns
+        -------
+        dict:
+            maps the position of each variable dependent gate in self.circuit
+            to a dictionary {Variable: derivative} where derivatives are numbers or callables of the variables
+        """
+        if self._angle_derivatives is None:
+            from tequila.circuit.gradient import grad
+            result = {}
+            for k, gate in enumerate(self.circuit):
+                parameter = gate.abstract_parameter
+                if parameter is None or not hasattr(parameter, "extract_variables"):
+                    continue
+                derivatives = {}
+                for variable in parameter.extract_variables():
+                    if isinstance(parameter, Variable):
+                        derivatives[variable] = gate.scale
+                    else:
+                        derivatives[variable] = gate.scale * grad(parameter, variable)
+                if len(derivatives) > 0:
+                    result[k] = derivatives
+            self._angle_derivatives = result
+        return self._angle_derivatives
+
+    def do_simulate(self, variables, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
+        """
+        Helper function to perform simulation.
+
+        Parameters
+        ----------
+        variables: dict:
+            variables to supply to the circuit.
+        initial_state: int:
+            the basis state on which the circuit acts (MSB convention on the active qubits)
+
+        Returns
+        -------
+        QubitWaveFunction:
+            QubitWaveFunction representing result of the simulation.
+        """
+        state = self.apply_circuit(self.initialize_state(initial_state), variables=variables)
+        return QubitWaveFunction.from_array(arr=state.reshape(-1), numbering=self.numbering)
+
+    def do_sample(self, samples, circuit, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
+        """
+        Helper function for performing sampling.
+        The probabilities of the measured qubits are computed from the statevector
+        and all samples are drawn at once.
+
+        Parameters
+        ----------
+        samples: int:
+            the number of samples to be taken.
+        circuit:
+            the circuit to sample from.
+        initial_state:
+            the basis state to which circuit is applied.
+
+        Returns
+        -------
+        QubitWaveFunction:
+            the results of sampling, as a Qubit Wave Function.
+        """
+        state = self.apply_circuit(self.initialize_state(initial_state), circuit=circuit)
+        probabilities = numpy.abs(state) ** 2
+        measured = [self.qubit(q) for q in self.measurements]
+        traced = tuple(i for i in range(self.n_qubits) if i not in measured)
+        probabilities = numpy.sum(probabilities, axis=traced)
+        # remaining axes are sorted by backend number, bring them into the order of the measurements
+        order = sorted(range(len(measured)), key=lambda i: measured[i])
+        probabilities = numpy.transpose(probabilities, numpy.argsort(order)).reshape(-1)
+        counts = numpy.random.multinomial(samples, probabilities / numpy.sum(probabilities))
+        result = QubitWaveFunction()
+        for k in numpy.flatnonzero(counts):
+            result._state[BitString.from_int(integer=int(k), nbits=len(measured))] = int(counts[k])
+        return result
+
+    def no_translation(self, abstract_circuit):
+        return False
+
+
+class BackendExpectationValueNumpy(BackendExpectationValue):
+    """
+    Class representing Expectation Values compiled for the numpy backend.
+
+    Overrides some methods of BackendExpectationValue, which should be seen for details.
+    Hamiltonians are stored as bitmasks (see make_pauli_masks)
+    """
+    use_mapping = True
+    BackendCircuitType = BackendCircuitNumpy
+
+    def initialize_hamiltonian(self, hamiltonians: tuple) -> tuple:
+        """
+        Convert the reduced hamiltonians to bitmask representation.
+
+        Parameters
+        ----------
+        hamiltonians:
+            the reduced hamiltonians
+
+        Returns
+        -------
+        tuple:
+            tuple of (xmasks, zmasks, coeffs) for each hamiltonian
+        """
+        qubit_map = {k: v.number for k, v in self.U.qubit_map.items()}
+        return tuple(make_pauli_masks(H, qubit_map=qubit_map, n_qubits=self.n_qubits) for H in hamiltonians)
+
+    def expectationvalues(self, state: numpy.ndarray) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        state:
+            flat statevector, leading axes (e.g. for batches of states) are allowed
+
+        Returns
+        -------
+        numpy.ndarray:
+            the expectationvalues of all hamiltonians, the last axis runs over the hamiltonians
+        """
+        return numpy.stack([expectationvalue_from_masks(state, xmasks=xmasks, zmasks=zmasks, coeffs=coeffs).real
+                            for xmasks, zmasks, coeffs in self.H], axis=-1)
+
+    def apply_hamiltonians(self, state: numpy.ndarray) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        state:
+            flat statevector
+
+        Returns
+        -------
+        numpy.ndarray:
+            the states H|state> of all hamiltonians stacked along the first axis
+        """
+        return numpy.stack([apply_masks(state, xmasks=xmasks, zmasks=zmasks, coeffs=coeffs)
+                            for xmasks, zmasks, coeffs in self.H])
+
+    def simulate(self, variables, *args, **kwargs) -> numpy.array:
+        """
+        Perform simulation of this expectationvalue.
+        The state is computed once and all hamiltonians are evaluated on it.
+
+        Parameters
+        ----------
+        variables:
+            variables, to be supplied to the underlying circuit.
+
+        Returns
+        -------
+        numpy.array:
+            the result of simulation as an array.
+        """
+        self.update_variables(variables)
+        state = self.U.apply_circuit(self.U.initialize_state(), variables=variables).reshape(-1)
+        return self.expectationvalues(state)
+
+    def simulate_batch(self, variables: list, max_batch_size: int = None, *args, **kwargs) -> numpy.ndarray:
+        """
+        Simulate the expectationvalue for a batch of variables.
+        All states of the batch are propagated together as one stacked state tensor.
+
+        Parameters
+        ----------
+        variables: list:
+            list of formatted variable dictionaries
+        max_batch_size: int, optional:
+            maximal number of states that are propagated together,
+            the default keeps the stacked state below 2**22 amplitudes
+
+        Returns
+        -------
+        numpy.ndarray:
+            the results of shape (len(variables), len(self.H))
+        """
+        if max_batch_size is None:
+            max_batch_size = max(1, 2 ** 22 // self.U.dimension())
+        result = []
+        for start in range(0, len(variables), max_batch_size):
+            chunk = variables[start:start + max_batch_size]
+            state = self.U.initialize_state(batch_size=len(chunk))
+            state = self.U.apply_circuit(state, variables=chunk).reshape(len(chunk), -1)
+            result.append(self.expectationvalues(state))
+        return numpy.concatenate(result, axis=0)
+
+    def gradient(self, variables, method: str = "checkpoint", *args, **kwargs) -> dict:
+        """
+        Compute the derivatives of this expectationvalue with respect to all of its variables at once.
+
+        Parameters
+        ----------
+        variables:
+            variables, to be supplied to the underlying circuit.
+        method: str:
+            checkpoint: parameter shift rule evaluated from checkpointed prefix states (see angle_gradients_checkpoint)
+            adjoint: one forward and one backward sweep over the circuit (see angle_gradients_adjoint)
+        args
+        kwargs:
+            passed to the method
+
+        Returns
+        -------
+        dict:
+            the derivative for every variable of the expectationvalue
+        """
+        if method == "checkpoint":
+            angle_gradients = self.angle_gradients_checkpoint(variables=variables, *args, **kwargs)
+        elif method == "adjoint":
+            angle_gradients = self.angle_gradients_adjoint(variables=variables, *args, **kwargs)
+        else:
+            raise TequilaNumpyException("unknown gradient method {}".format(method))
+
+        result = {k: numpy.zeros(len(self.H)) for k in self.extract_variables()}
+        for k, derivatives in self.U.angle_derivatives().items():
+            for variable, derivative in derivatives.items():
+                if callable(derivative):
+                    derivative = derivative(variables)
+                result[variable] = result.get(variable, 0.0) + derivative * angle_gradients[k]
+        return {k: self._contract(v) for k, v in result.items()}
+
+    def angle_gradients_checkpoint(self, variables, max_batch_size: int = None, *args, **kwargs) -> dict:
+        """
+        Derivatives of all hamiltonians with respect to the angles of the variable dependent gates
+        using the parameter shift rule.
+        Shifted circuits only differ from the original after the shifted gate. The circuit is therefore
+        simulated once, at every variable dependent gate the shifted states are branched off the current
+        prefix state, and all branched states are propagated through the remaining gates together.
+
+        Parameters
+        ----------
+        variables:
+            variables, to be supplied to the underlying circuit.
+        max_batch_size: int, optional:
+            maximal number of branched states that are propagated together,
+            the default keeps them below 2**22 amplitudes.
+            If more shifts are needed, the prefix state is carried over to the next batch.
+
+        Returns
+        -------
+        dict:
+            maps positions of gates in self.U.circuit to arrays with the derivatives of all hamiltonians
+        """
+        self.update_variables(variables)
+        circuit = self.U.circuit
+        positions = self.U.angle_derivatives().keys()
+        shifts = []
+        for k in positions:
+            rule = self.U.shift_rule(circuit[k])
+            shifts += [(k, shift, weight) for shift, weight in rule]
+
+        if max_batch_size is None:
+            max_batch_size = max(1, 2 ** 22 // self.U.dimension())
+
+        result = {k: numpy.zeros(len(self.H)) for k in positions}
+        # prefix state: all gates before position are applied
+        state = self.U.initialize_state()
+        position = 0
+        for start in range(0, len(shifts), max_batch_size):
+            block = shifts[start:start + max_batch_size]
+            last = block[-1][0]
+            batch = numpy.empty((len(block),) + state.shape, dtype=complex)
+            filled = 0
+            for k in range(position, len(circuit)):
+                gate = circuit[k]
+                if filled > 0:
+                    self.U.apply_gate(batch[:filled], gate=gate, variables=variables)
+                while filled < len(block) and block[filled][0] == k:
+                    batch[filled] = state
+                    self.U.apply_gate(batch[filled], gate=gate, variables=variables, shift=block[filled][1])
+                    filled += 1
+                if k < last:
+                    self.U.apply_gate(state, gate=gate, variables=variables)
+            position = last
+
+            batch = batch.reshape(len(block), -1)
+            energies = self.expectationvalues(batch)
+            for (k, shift, weight), energy in zip(block, energies):
+                result[k] += weight * energy
+        return result
+
+    def angle_gradients_adjoint(self, variables, *args, **kwargs) -> dict:
+        """
+        Derivatives of all hamiltonians with respect to the angles of the variable dependent gates
+        using reverse mode differentiation.
+        After the forward simulation the states |psi> and H|psi> are propagated backwards through the circuit,
+        for a gate exp(-i angle/2 P) the derivative is Im(<lambda|P|psi>),
+        where |psi> and |lambda> are the propagated states right after the gate.
+        The states H|psi> of all hamiltonians are propagated together as one stacked batch.
+
+        Parameters
+        ----------
+        variables:
+            variables, to be supplied to the underlying circuit.
+
+        Returns
+        -------
+        dict:
+            maps positions of gates in self.U.circuit to arrays with the derivatives of all hamiltonians
+        """
+        self.update_variables(variables)
+        circuit = self.U.circuit
+        positions = self.U.angle_derivatives().keys()
+        result = {}
+        if len(positions) == 0:
+            return result
+
+        state = self.U.apply_circuit(self.U.initialize_state(), variables=variables)
+        adjoint = self.apply_hamiltonians(state.reshape(-1)).reshape((len(self.H),) + state.shape)
+        first = min(positions)
+        for k in range(len(circuit) - 1, first - 1, -1):
+            gate = circuit[k]
+            if k in positions:
+                generated = self.U.apply_generator(state, gate=gate).reshape(-1)
+                result[k] = numpy.imag(adjoint.reshape(len(self.H), -1).conj() @ generated)
+            if k > first:
+                self.U.apply_inverse_gate(state, gate=gate, variables=variables)
+                self.U.apply_inverse_gate(adjoint, gate=gate, variables=variables)
+        return result
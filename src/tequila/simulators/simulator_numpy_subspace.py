@@ -0,0 +1,500 @@
+import numbers, typing, numpy
+from dataclasses import dataclass
+from tequila.hamiltonian import QubitHamiltonian, paulis
+from tequila.objective.objective import assign_variable
+from tequila.circuit.compiler import compile_trotterized_gate, compile_generalized_rotation_gate
+from tequila.utils.bitstrings import BitString, hamming_weight_basis
+from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
+from tequila.wavefunction.pauli_kernels import make_pauli_masks, apply_masks, apply_masks_on_keys
+from tequila.simulators.simulator_numpy import BackendCircuitNumpy, BackendExpectationValueNumpy, NumpyGate, \
+    TequilaNumpyException, _SHIFT_RULE, _CONTROLLED_SHIFT_RULE
+
+"""
+Dependency free statevector simulator for circuits that conserve the number of excited qubits
+
+Chemistry ansaetze, e.g. built from QubitExcitation or (Jordan-Wigner) FermionicExcitation gates,
+do not change the Hamming weight of the basis states. The state is then only stored on the sector of the initial state,
+that is a flat array over the sorted integers of the basis states with fixed Hamming weight (the keys),
+for 24 qubits and weight 8 these are 735471 instead of 2**24 amplitudes.
+Every gate is given by an operator G in bitmask representation (see make_pauli_masks) and applied with the
+kernels of pauli_kernels, parametrized gates exp(-i angle/2 G) are evaluated exactly from the algebraic properties of G
+(G^2=1, G^3=G as for excitation generators, or G^2=G), so excitation gates are not trotterized.
+Leading X gates, that prepare a reference state, are absorbed into the initial state.
+Circuits with gates that change the Hamming weight are simulated with the same kernels on the full space.
+"""
+
+# parameter shift rule for generators with eigenvalues 0 and 1
+_PROJECTOR_SHIFT_RULE = ((numpy.pi, 0.25), (-numpy.pi, -0.25))
+
+
+def _vanishes(hamiltonian: QubitHamiltonian, threshold: float) -> bool:
+    return len(hamiltonian.packed.simplified(threshold=threshold)) == 0
+
+
+def _spectrum(generator: QubitHamiltonian, threshold: float = 1.e-8) -> typing.Tuple[typing.Optional[str], float]:
+    """
+    Classify generators G whose exponential has a closed form, up to a real scale s:
+    'involutory' if G^2=s^2 (eigenvalues +-s), 'excitation' if G^3=s^2 G (eigenvalues 0,+-s)
+    and 'projector' if G^2=s G (eigenvalues 0,s), so that G/s has the eigenvalues +-1, (0,+-1) or (0,1)
+    Returns (None, 1.0) if the generator has none of those properties
+    """
+    terms = generator.packed.simplified(threshold=threshold).to_terms()
+    if len(terms) == 0:
+        return None, 1.0
+    key, reference = max(terms.items(), key=lambda item: abs(item[1]))
+    square = generator * generator
+    squared = square.packed.simplified(threshold=threshold).to_terms()
+    if list(squared.keys()) == [()] and squared[()].real > 0.0:
+        return "involutory", numpy.sqrt(squared[()].real)
+    cube = square * generator
+    ratio = (cube.packed.simplified(threshold=threshold).to_terms().get(key, 0.0) / reference).real
+    if ratio > threshold and _vanishes(cube - ratio * generator, threshold=threshold):
+        return "excitation", numpy.sqrt(ratio)
+    ratio = (squared.get(key, 0.0) / reference).real
+    if abs(ratio) > threshold and _vanishes(square - ratio * generator, threshold=threshold):
+        return "projector", ratio
+    return None, 1.0
+
+
+def _terms_commute(generators: typing.List[QubitHamiltonian]) -> bool:
+    """ True if all paulistrings of all generators commute with each other """
+    return not any(numpy.any(a.anticommutation_matrix(b)) for a in generators for b in generators)
+
+
+def conserves_hamming_weight(operator: QubitHamiltonian, threshold: float = 1.e-8) -> bool:
+    """
+    Parameters
+    ----------
+    operator:
+        the QubitHamiltonian
+    threshold:
+        coefficients of the commutator below threshold are considered zero
+
+    Returns
+    -------
+        True if the operator commutes with the number of excited qubits sum_q Z(q)
+    """
+    if operator.is_all_z():
+        return True
+    return operator.commutes_with(sum(paulis.Z(q) for q in operator.qubits), threshold=threshold)
+
+
+@dataclass
+class SubspaceGate(NumpyGate):
+    """
+    Instruction for the subspace simulator.
+    Parametrized gates are exp(-i angle/2 G), unparametrized gates are G itself,
+    controls restrict the gate to the basis states where all control qubits are 1.
+    See NumpyGate for the other attributes
+    masks: the bitmask representation of G over the backend qubits (see make_pauli_masks)
+    spectrum: 'involutory', 'excitation', 'projector' or None, see _spectrum
+    diagonal: G only consists of Z operators, its exponential is evaluated elementwise
+    conserving: G does not change the Hamming weight of the basis states
+    """
+    masks: tuple = None
+    spectrum: str = None
+    diagonal: bool = False
+    conserving: bool = True
+
+
+class BackendCircuitNumpySubspace(BackendCircuitNumpy):
+    """
+    Class representing circuits compiled to the numpy statevector simulator
+    that stores only the sector of fixed Hamming weight (see the module description).
+    See BackendCircuitNumpy for documentation of features and methods inherited therefrom.
+    States are flat arrays over the keys of the current sector,
+    or over all 2**n basis states if the circuit does not conserve the Hamming weight.
+
+    Attributes
+    ----------
+    keys:
+        sorted integers (MSB convention) of the basis states of the last initialized state, None for the full space
+    conserving:
+        whether all gates of the circuit conserve the Hamming weight
+
+    Methods
+    -------
+    sector:
+        the keys of the sector that is reached from an initial state
+    expand:
+        embed a state of the current sector into the full space
+    """
+
+    compiler_arguments = {**BackendCircuitNumpy.compiler_arguments, "trotterized": False,
+                          "generalized_rotation": False}
+
+    def __init__(self, abstract_circuit, noise=None, *args, **kwargs):
+        """
+
+        Parameters
+        ----------
+        abstract_circuit: QCircuit:
+            the circuit to compile to subspace instructions
+        noise: optional:
+            noise is not supported by this backend
+        args
+        kwargs
+        """
+        self.keys = None
+        self._sectors = {}
+        self._reference = 0
+        super().__init__(abstract_circuit=abstract_circuit, noise=noise, *args, **kwargs)
+        # leading X gates prepare a basis state, they are absorbed into the initial state
+        while len(self.circuit) > 0 and self.circuit[0].name == "X" and len(self.circuit[0].control) == 0:
+            self._reference ^= self._bitmask(self.circuit.pop(0).target)
+
+    @property
+    def conserving(self) -> bool:
+        return all(gate.conserving for gate in self.circuit)
+
+    def _bitmask(self, qubits: tuple) -> int:
+        """ bitmask of backend qubits in MSB convention """
+        return sum(1 << (self.n_qubits - 1 - q) for q in qubits)
+
+    def sector(self, initial_state: int = 0) -> typing.Optional[numpy.ndarray]:
+        """
+        Parameters
+        ----------
+        initial_state: int:
+            the basis state in MSB convention
+
+        Returns
+        -------
+            the sorted keys of all basis states with the Hamming weight of the state prepared from initial_state,
+            None if the circuit does not conserve the Hamming weight
+        """
+        if not self.conserving:
+            return None
+        weight = bin(initial_state ^ self._reference).count("1")
+        if weight not in self._sectors:
+            self._sectors[weight] = hamming_weight_basis(self.n_qubits, weight)
+        return self._sectors[weight]
+
+    def dimension(self, initial_state: int = 0) -> int:
+        keys = self.sector(initial_state)
+        return 2 ** self.n_qubits if keys is None else len(keys)
+
+    def initialize_state(self, initial_state: int = 0, batch_size: int = None, *args, **kwargs) -> numpy.ndarray:
+        """
+        Parameters
+        ----------
+        initial_state: int:
+            the basis state in MSB convention
+        batch_size:
+            if given, a stack of batch_size identical states is created
+
+        Returns
+        -------
+        numpy.ndarray:
+            the state over the keys of its sector (stored in self.keys) or over the full space
+        """
+        basis_state = initial_state ^ self._reference
+        self.keys = self.sector(initial_state)
+        batch = () if batch_size is None else (batch_size,)
+        if self.keys is None:
+            state = numpy.zeros(batch + (2 ** self.n_qubits,), dtype=complex)
+            state[..., basis_state] = 1.0
+        else:
+            state = numpy.zeros(batch + (len(self.keys),), dtype=complex)
+            state[..., numpy.searchsorted(self.keys, basis_state)] = 1.0
+        return state
+
+    def expand(self, state: numpy.ndarray) -> numpy.ndarray:
+        """ embed a state of the current sector into the full space, the keys are reset to None """
+        result = numpy.zeros(state.shape[:-1] + (2 ** self.n_qubits,), dtype=complex)
+        result[..., self.keys] = state
+        self.keys = None
+        return result
+
+    def _indices(self) -> numpy.ndarray:
+        return numpy.arange(2 ** self.n_qubits, dtype=numpy.int64) if self.keys is None else self.keys
+
+    def _apply_operator(self, state: numpy.ndarray, masks: tuple) -> numpy.ndarray:
+        xmasks, zmasks, coeffs = masks
+        if self.keys is None:
+            return apply_masks(state, xmasks=xmasks, zmasks=zmasks, coeffs=coeffs)
+        return apply_masks_on_keys(state, keys=self.keys, xmasks=xmasks, zmasks=zmasks, coeffs=coeffs)
+
+    def _uncontrolled(self, gate: SubspaceGate) -> typing.Optional[numpy.ndarray]:
+        """ boolean array of the basis states on which a controlled gate does not act, None without controls """
+        if len(gate.control) == 0:
+            return None
+        mask = self._bitmask(gate.control)
+        return (self._indices() & mask) != mask
+
+    def _add_gate(self, circuit: list, name: str, generator: QubitHamiltonian, control: tuple, parameter=None,
+                  scale: numbers.Number = 1.0):
+        qubit_map = {k: v.number for k, v in self.qubit_map.items()}
+        spectrum = None
+        if parameter is not None:
+            # exp(-i angle/2 G) = exp(-i (s angle)/2 G/s)
+            spectrum, factor = _spectrum(generator)
+            generator = generator * (1.0 / factor)
+            scale = scale * factor
+        circuit.append(SubspaceGate(name=name, target=tuple(qubit_map[q] for q in generator.qubits),
+                                    control=tuple(qubit_map[c] for c in control),
+                                    parameter=None if parameter is None else
+                                    lambda variables, p=parameter: p(variables) * scale,
+                                    abstract_parameter=parameter, scale=scale,
+                                    masks=make_pauli_masks(generator, n_qubits=self.n_qubits, qubit_map=qubit_map),
+                                    spectrum=spectrum, diagonal=generator.is_all_z(),
+                                    conserving=conserves_hamming_weight(generator)))
+
+    def _add_rotation(self, circuit: list, generator: QubitHamiltonian, angle, control: tuple,
+                      decomposed: typing.Callable):
+        """
+        add exp(-i angle/2 generator), if there is no closed form and the terms do not commute
+        the gates of the circuit returned by decomposed are added instead
+        """
+        angle = assign_variable(angle)
+        if generator.is_all_z() or _spectrum(generator)[0] is not None:
+            self._add_gate(circuit, "GenRot", generator=generator, control=control, parameter=angle)
+        elif _terms_commute([generator]):
+            for ps in generator.paulistrings:
+                self._add_gate(circuit, "Exp-Pauli", generator=QubitHamiltonian.from_paulistrings(ps.naked()),
+                               control=control, parameter=angle, scale=ps.coeff)
+        else:
+            for g in decomposed().gates:
+                self.add_parametrized_gate(g, circuit)
+
+    def add_parametrized_gate(self, gate, circuit, *args, **kwargs):
+        """
+        add a parametrized gate (rotations, exponential paulis, generalized rotations and trotterized gates).
+        Trotterized gates with commuting terms are exact products of exponentials, they are added generator by generator.
+        Parameters
+        ----------
+        gate: QGateImpl:
+            the gate to add to the circuit.
+        circuit: list:
+            the circuit to which the gate is to be added
+        """
+        control = tuple(gate.control)
+        if gate.name in ["Rx", "Ry", "Rz"]:
+            for t in gate.target:
+                self._add_gate(circuit, gate.name, generator=paulis.pauli(t, gate.name[1].upper()), control=control,
+                               parameter=gate.parameter)
+        elif gate.name == "Exp-Pauli":
+            self._add_gate(circuit, gate.name, generator=QubitHamiltonian.from_paulistrings(gate.paulistring.naked()),
+                           control=control, parameter=gate.parameter, scale=gate.paulistring.coeff)
+        elif gate.name == "GenRot":
+            self._add_rotation(circuit, generator=gate.generator, angle=gate.parameter, control=control,
+                               decomposed=lambda: compile_generalized_rotation_gate(gate=gate))
+        elif gate.name == "Trotterized":
+            if not _terms_commute(gate.generators):
+                for g in compile_trotterized_gate(gate=gate).gates:
+                    self.add_parametrized_gate(g, circuit)
+                return
+            for generator, angle in zip(gate.generators, gate.angles):
+                self._add_rotation(circuit, generator=generator, angle=angle, control=control,
+                                   decomposed=lambda: compile_trotterized_gate(gate=gate))
+        else:
+            raise TequilaNumpyException("parametrized gate {} not supported".format(gate.name))
+
+    def add_basic_gate(self, gate, circuit, *args, **kwargs):
+        """
+        add an unparametrized gate to the circuit.
+        Parameters
+        ----------
+        gate: QGateImpl:
+            the gate to be added to the circuit.
+        circuit: list:
+            the circuit, to which a gate is to be added.
+        """
+        control = tuple(gate.control)
+        if gate.name == "SWAP":
+            a, b = gate.target
+            generator = 0.5 * (QubitHamiltonian.unit() + paulis.X(a) * paulis.X(b) + paulis.Y(a) * paulis.Y(b)
+                               + paulis.Z(a) * paulis.Z(b))
+            self._add_gate(circuit, gate.name, generator=generator, control=control)
+        elif gate.name in ["X", "Y", "Z", "H"]:
+            for t in gate.target:
+                if gate.name == "H":
+                    generator = (paulis.X(t) + paulis.Z(t)) * (1.0 / numpy.sqrt(2.0))
+                else:
+                    generator = paulis.pauli(t, gate.name)
+                self._add_gate(circuit, gate.name, generator=generator, control=control)
+        elif gate.name != "I":
+            raise TequilaNumpyException("gate {} not supported".format(gate.name))
+
+    def apply_circuit(self, state: numpy.ndarray, circuit: list = None, variables=None) -> numpy.ndarray:
+        """
+        Apply circuit instructions to a state
+        If a gate does not conserve the Hamming weight, the state is expanded to the full space first.
+
+        Parameters
+        ----------
+        state:
+            state from initialize_state
+        circuit:
+            list of SubspaceGate instructions, defaults to self.circuit
+        variables:
+            defaults to the variables of the last update_variables call
+            if a list of variables is given, state needs to be a batch of states of the same length
+
+        Returns
+        -------
+            the updated state
+        """
+        if circuit is None:
+            circuit = self.circuit
+        if variables is None:
+            variables = self.variables
+        for gate in circuit:
+            if self.keys is not None and not gate.conserving:
+                state = self.expand(state)
+            self.apply_gate(state, gate=gate, variables=variables)
+        return state
+
+    def apply_gate(self, state: numpy.ndarray, gate: SubspaceGate, variables,
+                   shift: numbers.Real = 0.0) -> numpy.ndarray:
+        """
+        Apply a single instruction to a state (in-place)
+
+        Parameters
+        ----------
+        state:
+            flat state over the current keys, leading axes (e.g. for batches of states) are allowed
+        gate:
+            the SubspaceGate instruction
+        variables:
+            the variables (or list of variables) that determine the angle of parametrized gates
+        shift:
+            added to the angle of parametrized gates
+
+        Returns
+        -------
+            the updated state
+        """
+        if gate.parameter is None:
+            result = self._apply_operator(state, gate.masks)
+        else:
+            angle = numpy.asarray(gate.angle(variables)) + shift
+            phi = angle.reshape(angle.shape + (1,)) / 2.0
+            if gate.diagonal:
+                weights = self._apply_operator(numpy.ones(state.shape[-1], dtype=complex), gate.masks)
+                result = numpy.exp(-1.0j * phi * weights) * state
+            elif gate.spectrum == "involutory":
+                result = numpy.cos(phi) * state - 1.0j * numpy.sin(phi) * self._apply_operator(state, gate.masks)
+            elif gate.spectrum == "excitation":
+                generated = self._apply_operator(state, gate.masks)
+                result = state + (numpy.cos(phi) - 1.0) * self._apply_operator(generated, gate.masks) \
+                         - 1.0j * numpy.sin(phi) * generated
+            elif gate.spectrum == "projector":
+                result = state + (numpy.exp(-1.0j * phi) - 1.0) * self._apply_operator(state, gate.masks)
+            else:
+                raise TequilaNumpyException("no closed form for the exponential of gate {}".format(gate))
+        uncontrolled = self._uncontrolled(gate)
+        if uncontrolled is not None:
+            result[..., uncontrolled] = state[..., uncontrolled]
+        state[...] = result
+        return state
+
+    def apply_generator(self, state: numpy.ndarray, gate: SubspaceGate) -> numpy.ndarray:
+        """
+        Apply the generator of a parametrized gate exp(-i angle/2 G) to a state.
+        For controlled gates the generator is G on the subspace where all controls are 1 and zero elsewhere.
+
+        Parameters
+        ----------
+        state:
+            flat state over the current keys, not changed
+        gate:
+            the SubspaceGate instruction
+
+        Returns
+        -------
+            a new state holding G|state>
+        """
+        result = self._apply_operator(state, gate.masks)
+        uncontrolled = self._uncontrolled(gate)
+        if uncontrolled is not None:
+            result[..., uncontrolled] = 0.0
+        return result
+
+    def shift_rule(self, gate: SubspaceGate) -> tuple:
+        if gate.spectrum == "involutory":
+            return _CONTROLLED_SHIFT_RULE if len(gate.control) > 0 else _SHIFT_RULE
+        elif gate.spectrum == "excitation":
+            return _CONTROLLED_SHIFT_RULE
+        elif gate.spectrum == "projector":
+            return _PROJECTOR_SHIFT_RULE
+        raise TequilaNumpyException("no parameter shift rule for gate {}, use the adjoint method".format(gate))
+
+    def do_simulate(self, variables, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
+        """
+        Helper function to perform simulation.
+
+        Parameters
+        ----------
+        variables: dict:
+            variables to supply to the circuit.
+        initial_state: int:
+            the basis state on which the circuit acts (MSB convention on the active qubits)
+
+        Returns
+        -------
+        QubitWaveFunction:
+            QubitWaveFunction representing result of the simulation.
+        """
+        state = self.apply_circuit(self.initialize_state(initial_state), variables=variables)
+        if self.keys is None:
+            return QubitWaveFunction.from_array(arr=state, numbering=self.numbering)
+        nonzero = numpy.flatnonzero(numpy.abs(state) > 1.e-6)
+        return QubitWaveFunction(state={BitString.from_int(integer=int(self.keys[i]), nbits=self.n_qubits): state[i]
+                                        for i in nonzero}, n_qubits=self.n_qubits)
+
+    def do_sample(self, samples, circuit, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
+        """
+        Helper function for performing sampling.
+        The probabilities of the measured qubits are accumulated from the state and all samples are drawn at once.
+
+        Parameters
+        ----------
+        samples: int:
+            the number of samples to be taken.
+        circuit:
+            the circuit to sample from.
+        initial_state:
+            the basis state to which circuit is applied.
+
+        Returns
+        -------
+        QubitWaveFunction:
+            the results of sampling, as a Qubit Wave Function.
+        """
+        state = self.apply_circuit(self.initialize_state(initial_state), circuit=circuit)
+        indices = self._indices()
+        outcomes = numpy.zeros(len(indices), dtype=numpy.int64)
+        for q in self.measurements:
+            outcomes = (outcomes << 1) | ((indices >> (self.n_qubits - 1 - self.qubit(q))) & 1)
+        outcomes, inverse = numpy.unique(outcomes, return_inverse=True)
+        probabilities = numpy.bincount(inverse, weights=numpy.abs(state) ** 2, minlength=len(outcomes))
+        counts = numpy.random.multinomial(samples, probabilities / numpy.sum(probabilities))
+        result = QubitWaveFunction()
+        for k in numpy.flatnonzero(counts):
+            result._state[BitString.from_int(integer=int(outcomes[k]), nbits=len(self.measurements))] = int(counts[k])
+        return result
+
+
+class BackendExpectationValueNumpySubspace(BackendExpectationValueNumpy):
+    """
+    Class representing Expectation Values compiled for the numpy subspace backend.
+    The Hamiltonians are evaluated on the keys of the sector of the state,
+    components of H|state> outside of the sector do not contribute.
+    """
+    BackendCircuitType = BackendCircuitNumpySubspace
+
+    def expectationvalues(self, state: numpy.ndarray) -> numpy.ndarray:
+        keys = self.U.keys
+        if keys is None:
+            return super().expectationvalues(state)
+        return numpy.stack([numpy.sum(state.conj() * apply_masks_on_keys(state, keys=keys, xmasks=xmasks,
+                                                                         zmasks=zmasks, coeffs=coeffs), axis=-1).real
+                            for xmasks, zmasks, coeffs in self.H], axis=-1)
+
+    def apply_hamiltonians(self, state: numpy.ndarray) -> numpy.ndarray:
+        keys = self.U.keys
+        if keys is None:
+            return super().apply_hamiltonians(state)
+        return numpy.stack([apply_masks_on_keys(state, keys=keys, xmasks=xmasks, zmasks=zmasks, coeffs=coeffs)
+                            for xmasks, zmasks, coeffs in self.H])
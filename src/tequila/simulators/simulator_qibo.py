@@ -483,18 +483,8 @@ class BackendCircuitQibo(BackendCircuit):
         counts = new.sample(samples=samples, circuit=new.circuit, read_out_qubits=qubits, variables=variables, *args,
                              **kwargs)
         # compute energy
-        E = 0.0
-        n_samples = 0
-        #print('printing the counts')
-        #print(counts)
-        for key, count in counts.items():
-            parity = key.array.count(1)
-            sign = (-1) ** parity
-            E += sign * count
-            n_samples += count
-        assert n_samples == samples
-        E = E / samples * paulistring.coeff
-        return E
+        return self.paulistring_from_counts(counts=counts, samples=samples, n_qubits=len(qubits),
+                                            coeff=paulistring.coeff)
 
     def do_sample(self, samples, circuit, noise_model=None, initial_state=None, *args, **kwargs) -> QubitWaveFunction:
         """
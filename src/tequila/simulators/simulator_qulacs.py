@@ -5,6 +5,7 @@ from tequila.utils.bitstrings import BitNumbering, BitString, BitStringLSB
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila.simulators.simulator_base import BackendCircuit, BackendExpectationValue, QCircuit, change_basis
 from tequila.utils.keymap import KeyMapRegisterToSubregister
+from tequila.wavefunction.pauli_kernels import parity
 
 """
 Developer Note:
@@ -508,34 +509,116 @@ class BackendExpectationValueQulacs(BackendExpectationValue):
         result = []
         for H in self._reduced_hamiltonians: # those are the hamiltonians which where non-used qubits are already traced out
             E = 0.0
-            if H.is_all_z() and not self.U.has_noise:
-                E = super().sample(samples=samples, variables=variables, *args, **kwargs)
-            else:
+            if self.U.has_noise:
                 for ps in H.paulistrings:
-                    # change basis, measurement is destructive so the state will be copied
-                    # to avoid recomputation (except when noise was required)
-                    bc = QCircuit()
-                    for idx, p in ps.items():
-                        bc += change_basis(target=idx, axis=p)
-                    qbc = self.U.create_circuit(abstract_circuit=bc, variables=None)
-                    Esamples = []
-                    for sample in range(samples):
-                        if self.U.has_noise and sample>0:
-                            state = self.U.initialize_state(self.n_qubits)
-                            self.U.circuit.update_quantum_state(state)
-                            state_tmp = state
-                        else:
-                            state_tmp = state.copy()
-                        if len(bc.gates) > 0:  # otherwise there is no basis change (empty qulacs circuit does not work out)
-                            qbc.update_quantum_state(state_tmp)
-                        ps_measure = 1.0
-                        for idx in ps.keys():
-                            assert idx in self.U.abstract_qubits # assert that the hamiltonian was really reduced
-                            M = qulacs.gate.Measurement(self.U.qubit(idx), self.U.qubit(idx))
-                            M.update_quantum_state(state_tmp)
-                            measured = state_tmp.get_classical_value(self.U.qubit(idx))
-                            ps_measure *= (-2.0 * measured + 1.0)  # 0 becomes 1 and 1 becomes -1
-                        Esamples.append(ps_measure)
-                    E += ps.coeff * sum(Esamples) / len(Esamples)
+                    E += self.sample_noisy_paulistring(samples=samples, paulistring=ps, state=state)
+            else:
+                for basis, paulistrings in self.measurement_groups(H):
+                    E += self.sample_measurement_group(samples=samples, basis=basis, paulistrings=paulistrings,
+                                                       state=state)
             result.append(E)
         return numpy.asarray(result)
+
+    @staticmethod
+    def measurement_groups(hamiltonian) -> list:
+        """
+        Greedily group the paulistrings of a hamiltonian into qubit-wise commuting sets,
+        so that every set can be measured in a single basis.
+        Parameters
+        ----------
+        hamiltonian:
+            the (reduced) tequila hamiltonian
+
+        Returns
+        -------
+        list:
+            list of tuples (basis, paulistrings) where basis maps qubits to the measured axis
+        """
+        groups = []
+        for ps in hamiltonian.paulistrings:
+            for basis, paulistrings in groups:
+                if all(basis.get(k, v) == v for k, v in ps.items()):
+                    basis.update(ps.items())
+                    paulistrings.append(ps)
+                    break
+            else:
+                groups.append((dict(ps.items()), [ps]))
+        return groups
+
+    def sample_measurement_group(self, samples, basis, paulistrings, state) -> numbers.Real:
+        """
+        Sample a group of qubit-wise commuting paulistrings from a noise-free state.
+        The basis change is applied once and all shots are drawn from the resulting probability distribution.
+        Parameters
+        ----------
+        samples: int:
+            the number of samples to take.
+        basis: dict:
+            maps qubits to the axis in which they are measured.
+        paulistrings:
+            the paulistrings that are evaluated on the drawn samples.
+        state: qulacs.QuantumState:
+            the state prepared by the circuit, it is not changed.
+
+        Returns
+        -------
+        float:
+            the sum of the sampled expectation values of all paulistrings.
+        """
+        bc = QCircuit()
+        for idx, p in basis.items():
+            bc += change_basis(target=idx, axis=p)
+        if len(bc.gates) > 0: # otherwise there is no basis change (empty qulacs circuit does not work out)
+            state = state.copy()
+            qbc = self.U.create_circuit(abstract_circuit=bc, variables=None)
+            qbc.update_quantum_state(state)
+        sampled = numpy.asarray(state.sampling(samples), dtype=numpy.int64)
+        E = 0.0
+        for ps in paulistrings:
+            assert all(idx in self.U.abstract_qubits for idx in ps.keys()) # assert that the hamiltonian was really reduced
+            mask = sum(1 << self.U.qubit(idx) for idx in ps.keys())
+            signs = 1 - 2 * parity(sampled & mask) # even parity becomes 1 and odd parity becomes -1
+            E += ps.coeff * numpy.sum(signs) / samples
+        return E
+
+    def sample_noisy_paulistring(self, samples, paulistring, state) -> numbers.Real:
+        """
+        Sample a paulistring shot by shot, the circuit is re-applied for every shot to get independent noise trajectories.
+        Parameters
+        ----------
+        samples: int:
+            the number of samples to take.
+        paulistring:
+            the paulistring to be sampled.
+        state: qulacs.QuantumState:
+            the state prepared by the circuit, used for the first shot.
+
+        Returns
+        -------
+        float:
+            the sampled expectation value of the paulistring.
+        """
+        # change basis, measurement is destructive so the state will be copied for the first shot
+        ps = paulistring
+        bc = QCircuit()
+        for idx, p in ps.items():
+            bc += change_basis(target=idx, axis=p)
+        qbc = self.U.create_circuit(abstract_circuit=bc, variables=None)
+        Esamples = []
+        for sample in range(samples):
+            if sample > 0:
+                state_tmp = self.U.initialize_state(self.n_qubits)
+                self.U.circuit.update_quantum_state(state_tmp)
+            else:
+                state_tmp = state.copy()
+            if len(bc.gates) > 0:  # otherwise there is no basis change (empty qulacs circuit does not work out)
+                qbc.update_quantum_state(state_tmp)
+            ps_measure = 1.0
+            for idx in ps.keys():
+                assert idx in self.U.abstract_qubits  # assert that the hamiltonian was really reduced
+                M = qulacs.gate.Measurement(self.U.qubit(idx), self.U.qubit(idx))
+                M.update_quantum_state(state_tmp)
+                measured = state_tmp.get_classical_value(self.U.qubit(idx))
+                ps_measure *= (-2.0 * measured + 1.0)  # 0 becomes 1 and 1 becomes -1
+            Esamples.append(ps_measure)
+        return ps.coeff * sum(Esamples) / len(Esamples)
@@ -4,7 +4,6 @@ from tequila.circuit.circuit import QCircuit
 from tequila.circuit.gates import QGate
 from tequila import BitString
 import numpy
-import copy
 import sympy
 
 """
@@ -12,6 +11,15 @@ Simple Symbolic Simulator for debugging purposes
 """
 
 class BackendCircuitSymbolic(BackendCircuit):
+    """
+    Simulates the circuit with sympy expressions for the amplitudes
+
+    With convert_to_numpy the amplitudes are converted to complex numbers.
+    If in addition lambdify is set, the amplitudes are computed symbolically only once per initial state,
+    with one symbol for the parameter of each gate, and lambdified to numpy.
+    Further simulations only evaluate the lambdified amplitudes at the new gate parameters.
+    Without convert_to_numpy the exact sympy expressions are returned.
+    """
 
     # compiler instructions
     compiler_arguments = {
@@ -33,6 +41,12 @@ class BackendCircuitSymbolic(BackendCircuit):
     }
 
     convert_to_numpy = True
+    lambdify = True
+
+    def __init__(self, *args, **kwargs):
+        # lambdified amplitudes for each initial state
+        self._lambdified = {}
+        super().__init__(*args, **kwargs)
 
     def create_circuit(self, abstract_circuit: QCircuit, variables=None):
         return abstract_circuit
@@ -41,16 +55,24 @@ class BackendCircuitSymbolic(BackendCircuit):
         pass
 
     @classmethod
-    def apply_gate(cls, state: QubitWaveFunction, gate: QGate, qubits: dict, variables) -> QubitWaveFunction:
+    def apply_gate(cls, state: QubitWaveFunction, gate: QGate, qubits: dict, variables,
+                   parameter=None) -> QubitWaveFunction:
         result = QubitWaveFunction()
         n_qubits = len(qubits.keys())
         for s, v in state.items():
             s.nbits = n_qubits
-            result += v * cls.apply_on_standard_basis(gate=gate, basisfunction=s, qubits=qubits, variables=variables)
+            result += v * cls.apply_on_standard_basis(gate=gate, basisfunction=s, qubits=qubits, variables=variables,
+                                                      parameter=parameter)
         return result
 
     @classmethod
-    def apply_on_standard_basis(cls, gate: QGate, basisfunction: BitString, qubits:dict, variables) -> QubitWaveFunction:
+    def apply_on_standard_basis(cls, gate: QGate, basisfunction: BitString, qubits:dict, variables,
+                                parameter=None) -> QubitWaveFunction:
+        """
+        parameter: the parameter of the gate (e.g. a sympy symbol), default is the parameter evaluated with variables
+        """
+        if parameter is None and gate.is_parametrized():
+            parameter = gate.parameter(variables)
 
         basis_array = basisfunction.array
         if gate.is_controlled():
@@ -69,7 +91,7 @@ class BackendCircuitSymbolic(BackendCircuit):
         for tt in gate.target:
             t = qubits[tt]
             qt = basis_array[t]
-            a_array = copy.deepcopy(basis_array)
+            a_array = list(basis_array)
             a_array[t] = (a_array[t] + 1) % 2
             current_state = QubitWaveFunction.from_int(basisfunction)
             altered_state = QubitWaveFunction.from_int(BitString.from_array(a_array))
@@ -86,15 +108,15 @@ class BackendCircuitSymbolic(BackendCircuit):
             elif gate.name.upper() == "Z":
                 fac1 = sympy.Integer(-1) ** (qt)
             elif gate.name.upper() == "RX":
-                angle = sympy.Rational(1 / 2) * gate.parameter(variables)
+                angle = sympy.Rational(1 / 2) * parameter
                 fac1 = sympy.cos(angle)
                 fac2 = -sympy.sin(angle) * sympy.I
             elif gate.name.upper() == "RY":
-                angle = -sympy.Rational(1 / 2) * gate.parameter(variables)
+                angle = -sympy.Rational(1 / 2) * parameter
                 fac1 = sympy.cos(angle)
                 fac2 = +sympy.sin(angle) * sympy.Integer(-1) ** (qt + 1)
             elif gate.name.upper() == "RZ":
-                angle = sympy.Rational(1 / 2) * gate.parameter(variables)
+                angle = sympy.Rational(1 / 2) * parameter
                 fac1 = sympy.exp(-angle * sympy.I * sympy.Integer(-1) ** (qt))
             else:
                 raise Exception("Gate is not known to simulators, " + str(gate))
@@ -119,6 +141,12 @@ class BackendCircuitSymbolic(BackendCircuit):
 
         n_qubits = len(self.abstract_circuit.qubits)
 
+        if self.convert_to_numpy and self.lambdify and (initial_state is None or isinstance(initial_state, int)):
+            parameters = [g.parameter(variables) for g in self.abstract_circuit.gates if g.is_parametrized()]
+            if numpy.asarray(parameters).dtype.kind in "biufc":
+                return self.evaluate_lambdified(parameters=parameters, qubits=qubits, n_qubits=n_qubits,
+                                                initial_state=0 if initial_state is None else initial_state)
+
         if initial_state is None:
             initial_state = QubitWaveFunction.from_int(i=0, n_qubits=n_qubits)
         elif isinstance(initial_state, int):
@@ -137,5 +165,39 @@ class BackendCircuitSymbolic(BackendCircuit):
 
         return wfn
 
+    def evaluate_lambdified(self, parameters: list, qubits: dict, n_qubits: int,
+                            initial_state: int) -> QubitWaveFunction:
+        """
+        Evaluate the lambdified amplitudes (created on first use) at the given gate parameters
+        :param parameters: the numerical parameters of the parametrized gates (in circuit order)
+        :param qubits: map from circuit qubits to simulator qubits
+        :param n_qubits: number of simulated qubits
+        :param initial_state: the initial basis state
+        :return: the wavefunction with complex amplitudes
+        """
+        if initial_state not in self._lambdified:
+            symbols = []
+            result = QubitWaveFunction.from_int(initial_state, n_qubits=n_qubits)
+            for g in self.abstract_circuit.gates:
+                parameter = None
+                if g.is_parametrized():
+                    parameter = sympy.Symbol("p{}".format(len(symbols)), real=True)
+                    symbols.append(parameter)
+                result = self.apply_gate(state=result, gate=g, qubits=qubits, variables=None, parameter=parameter)
+            keys = [k.integer for k in result.keys()]
+            try:
+                function = sympy.lambdify(symbols, list(result.values()), modules="numpy", cse=True)
+            except TypeError:
+                # common subexpressions are only eliminated since sympy 1.9
+                function = sympy.lambdify(symbols, list(result.values()), modules="numpy")
+            self._lambdified[initial_state] = (keys, function)
+
+        keys, function = self._lambdified[initial_state]
+        amplitudes = function(*parameters)
+        wfn = QubitWaveFunction()
+        for k, v in zip(keys, amplitudes):
+            wfn[BitString.from_int(integer=k, nbits=n_qubits)] = complex(v)
+        return wfn
+
 class BackendExpectationValueSymbolic(BackendExpectationValue):
     BackendCircuitType = BackendCircuitSymbolic
\ No newline at end of file
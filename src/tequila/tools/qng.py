@@ -1,6 +1,7 @@
 from tequila import TequilaException
 from tequila.hamiltonian import paulis
-from tequila.objective.objective import Objective, ExpectationValueImpl, ExpectationValue, VectorObjective
+from tequila.objective.objective import Objective, ExpectationValueImpl, ExpectationValue, VectorObjective, \
+    EvaluationPlan
 from tequila.circuit.circuit import QCircuit
 from tequila.simulators.simulator_api import compile_objective
 from tequila.circuit.gradient import __grad_inner
@@ -113,6 +114,7 @@ class CallableVector:
             a list of terms to return as a vector when called.
         """
         self._vector = vector
+        self._plan = None
 
     def __call__(self, variables, samples=None) -> numpy.ndarray:
         """
@@ -131,12 +133,11 @@ class CallableVector:
             result of evaluating a vector of objectives
         """
 
+        # the terms share expectationvalues, evaluate each only once
+        if self._plan is None:
+            self._plan = EvaluationPlan(self._vector)
         output = numpy.empty(self.dim)
-        for i, entry in enumerate(self._vector):
-            if hasattr(entry, '__call__'):
-                output[i] = entry(variables, samples=samples)
-            else:
-                output[i] = entry
+        output[:] = self._plan(variables, samples=samples)
         return output
 
 
@@ -189,3 +189,31 @@ def initialize_bitstring(integer: int, nbits: int = None, numbering_in: BitNumbe
             return BitStringLSB.from_int(integer=integer, nbits=nbits)
         else:
             return BitStringLSB.from_binary(binary=BitString.from_int(integer=integer, nbits=nbits).binary, nbits=nbits)
+
+
+def hamming_weight_basis(nbits: int, weight: int):
+    """
+    All integers with nbits bits of which exactly weight are set, in ascending order
+    The position of an integer in the basis can be found with numpy.searchsorted
+
+    Parameters
+    ----------
+    nbits:
+        number of bits
+    weight:
+        number of set bits (Hamming weight)
+
+    Returns
+    -------
+        numpy array of int64 with binomial(nbits, weight) entries
+    """
+    import numpy
+    if weight < 0 or weight > nbits:
+        return numpy.zeros(0, dtype=numpy.int64)
+    # levels[w] holds the integers with w set bits among the bits processed so far (ascending)
+    # setting the next (highest) bit keeps the concatenation sorted
+    levels = [numpy.zeros(1, dtype=numpy.int64)] + [numpy.zeros(0, dtype=numpy.int64)] * weight
+    for bit in range(nbits):
+        levels = [levels[0]] + [numpy.concatenate([levels[w], levels[w - 1] | (1 << bit)]) for w in
+                                range(1, weight + 1)]
+    return levels[weight]
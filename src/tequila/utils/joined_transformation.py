@@ -1,3 +1,6 @@
+from tequila.utils.misc import fingerprint
+
+
 class JoinedTransformation:
     '''
     class structure used to construct,track, and permit differentiation of the computation required
@@ -21,6 +24,10 @@ class JoinedTransformation:
         self.right = right
         self.op = op
 
+    def fingerprint(self) -> tuple:
+        """ structural representation, see tequila.utils.fingerprint """
+        return "JoinedTransformation", self.split, fingerprint(self.left), fingerprint(self.right), fingerprint(self.op)
+
     def __call__(self, *args, **kwargs):
         '''
 
@@ -1,8 +1,38 @@
 import typing
 import numbers
+import numpy
 from tequila import BitNumbering, BitString, BitStringLSB
 
 
+class BitScatter:
+    """
+    Moves the bits of integer arrays to other positions
+    The input bits are processed in chunks of 8, each chunk is mapped by a precomputed table with 256 entries
+    so that an array of integers is remapped with a few numpy lookups
+    """
+
+    def __init__(self, source: typing.List[int], target: typing.List[int]):
+        """
+        :param source: positions of the input bits (0 is the least significant bit)
+        :param target: positions of the corresponding output bits
+        """
+        chunks = numpy.arange(256, dtype=numpy.int64)
+        self.tables = []
+        for offset in sorted(set(8 * (s // 8) for s in source)):
+            table = numpy.zeros(256, dtype=numpy.int64)
+            for s, t in zip(source, target):
+                if offset <= s < offset + 8:
+                    table |= ((chunks >> (s - offset)) & 1) << t
+            self.tables.append((offset, table))
+
+    def __call__(self, keys: numpy.ndarray) -> numpy.ndarray:
+        keys = numpy.asarray(keys, dtype=numpy.int64)
+        result = numpy.zeros(keys.shape, dtype=numpy.int64)
+        for offset, table in self.tables:
+            result |= table[(keys >> offset) & 255]
+        return result
+
+
 class KeyMapABC:
 
     @property
@@ -16,9 +46,40 @@ class KeyMapABC:
     def __call__(self, input_state: BitString, initial_state: BitString = 0):
         return input_state
 
+    def map_statevector(self, statevector: numpy.ndarray, initial_state: BitString = None) -> typing.Optional[
+        numpy.ndarray]:
+        """
+        Apply the keymap to all basis states of a dense statevector at once
+        :param statevector: the amplitudes, indexed by the integers of the basis states
+        :param initial_state: see __call__
+        :return: the mapped statevector, None if the keymap can only map individual basis states
+        """
+        return None
+
+    def map_keys(self, keys: numpy.ndarray, initial_state: BitString = None) -> typing.Optional[numpy.ndarray]:
+        """
+        Apply the keymap to an array of basis state integers at once
+        :param keys: the integers of the basis states
+        :param initial_state: see __call__
+        :return: the integers of the mapped basis states, None if the keymap can only map individual basis states
+        """
+        return None
+
+    @property
+    def n_bits_out(self) -> typing.Optional[int]:
+        """ number of bits of the mapped basis states (None: same as the input) """
+        return None
+
 
 class KeyMapLSB2MSB(KeyMapABC):
 
+    def map_statevector(self, statevector: numpy.ndarray, initial_state: BitString = None) -> numpy.ndarray:
+        # the integers of the basis states are kept
+        return statevector
+
+    def map_keys(self, keys: numpy.ndarray, initial_state: BitString = None) -> numpy.ndarray:
+        return keys
+
     def __call__(self, input_state: BitStringLSB, initial_state: int = None) -> BitString:
         if isinstance(input_state, numbers.Integral):
             return BitString.from_int(integer=input_state)
@@ -60,10 +121,53 @@ class KeyMapSubregisterToRegister(KeyMapABC):
     def __init__(self, subregister: typing.List[int], register: typing.List[int]):
         self._subregister = sorted(subregister)
         self._register = sorted(register)
+        self._scatter = None
 
     def make_complement(self):
         return [i for i in self._register if i not in self._subregister]
 
+    @property
+    def n_bits_out(self) -> int:
+        return len(self._register)
+
+    def _vectorizable(self) -> bool:
+        # the qubits of the subregister are positions in the register bitstring (see __call__)
+        n = len(self._register)
+        return n < 64 and all(0 <= q < n for q in self._subregister)
+
+    def _make_scatter(self) -> BitScatter:
+        m, n = len(self._subregister), len(self._register)
+        return BitScatter(source=[m - 1 - k for k in range(m)], target=[n - 1 - q for q in self._subregister])
+
+    @property
+    def scatter(self) -> BitScatter:
+        """ lookup tables moving the bits of subregister integers to their positions in the register """
+        if self._scatter is None:
+            self._scatter = self._make_scatter()
+        return self._scatter
+
+    def map_keys(self, keys: numpy.ndarray, initial_state: BitString = None) -> typing.Optional[numpy.ndarray]:
+        if not self._vectorizable():
+            return None
+        result = self.scatter(keys)
+        if initial_state is not None:
+            if isinstance(initial_state, BitString):
+                initial_state = initial_state.integer
+            n = len(self._register)
+            # bits outside of the subregister are taken from the initial state
+            result |= int(initial_state) & ~self.scatter(2 ** len(self._subregister) - 1) & (2 ** n - 1)
+        return result
+
+    def map_statevector(self, statevector: numpy.ndarray, initial_state: BitString = None) -> typing.Optional[
+        numpy.ndarray]:
+        if self._subregister == self._register:
+            return statevector
+        if len(statevector) != 2 ** len(self._subregister) or not self._vectorizable():
+            return None
+        result = numpy.zeros(2 ** len(self._register), dtype=statevector.dtype)
+        result[self.map_keys(numpy.arange(len(statevector)), initial_state=initial_state)] = statevector
+        return result
+
     def __call__(self, input_state: BitString, initial_state: BitString = None) -> BitString:
         if initial_state is None:
             initial_state = BitString.from_int(integer=0)
@@ -94,6 +198,30 @@ class KeyMapSubregisterToRegister(KeyMapABC):
 
 class KeyMapRegisterToSubregister(KeyMapSubregisterToRegister):
 
+    @property
+    def n_bits_out(self) -> int:
+        return len(self._subregister)
+
+    def _make_scatter(self) -> BitScatter:
+        m, n = len(self._subregister), len(self._register)
+        return BitScatter(source=[n - 1 - q for q in self._subregister], target=[m - 1 - k for k in range(m)])
+
+    def map_keys(self, keys: numpy.ndarray, initial_state: BitString = None) -> typing.Optional[numpy.ndarray]:
+        if not self._vectorizable():
+            return None
+        return self.scatter(keys)
+
+    def map_statevector(self, statevector: numpy.ndarray, initial_state: BitString = None) -> typing.Optional[
+        numpy.ndarray]:
+        if self._subregister == self._register:
+            return statevector
+        if len(statevector) != 2 ** len(self._register) or not self._vectorizable():
+            return None
+        # basis states which only differ outside of the subregister are added up
+        result = numpy.zeros(2 ** len(self._subregister), dtype=statevector.dtype)
+        numpy.add.at(result, self.map_keys(numpy.arange(len(statevector))), statevector)
+        return result
+
     def __call__(self, input_state: BitString, initial_state: BitString = None) -> BitString:
         """
         Map from register to subregister
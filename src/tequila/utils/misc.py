@@ -1,4 +1,7 @@
-from numpy import isclose, float64
+from numpy import isclose, float64, ufunc
+import numbers
+import types
+import typing
 
 
 def to_float(number) -> float:
@@ -24,3 +27,86 @@ def to_float(number) -> float:
         except TypeError:
             raise TypeError(
                 "casting number {number} of type {type} fo float failed".format(number=number, type=type(number)))
+
+
+def fingerprint(value) -> typing.Hashable:
+    """
+    Canonical hashable representation of the structure of value, equal for structurally equal values
+    Objects define their own representation with a fingerprint method (e.g. gates, circuits, hamiltonians)
+    Numbers are represented by their value, lists and tuples elementwise.
+    Python functions (e.g. the transformations of Objectives) are represented by their code, defaults, closure
+    and the current values of the globals they read (mutable globals of imported modules by their name).
+    Classes, modules, builtin functions and numpy ufuncs are represented by themselves.
+    Other objects are represented by their identity ("id", id(value)),
+    such fingerprints are only valid as long as the object is alive (see has_identity)
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Number):
+        return "number", value
+    if isinstance(value, (list, tuple)):
+        return tuple(fingerprint(v) for v in value)
+    if hasattr(value, "fingerprint") and callable(value.fingerprint) and not isinstance(value, type):
+        return value.fingerprint()
+    if isinstance(value, (type, types.ModuleType, types.BuiltinFunctionType, ufunc)):
+        # these live as long as the program, the key keeps them alive anyway
+        return "object", value
+    if isinstance(value, types.FunctionType):
+        if id(value) in _active_functions:
+            # functions referencing themselves or an enclosing function (e.g. wrapped primitives)
+            return "recursive", _active_functions.index(id(value))
+        if len(_active_functions) > 0 and value.__closure__ is None and "<locals>" not in value.__qualname__:
+            # module level functions called by other functions are represented by their name and code
+            return "function", value.__module__, value.__qualname__, value.__code__
+        _active_functions.append(id(value))
+        try:
+            closure = []
+            for cell in value.__closure__ or ():
+                try:
+                    closure.append(fingerprint(cell.cell_contents))
+                except ValueError:
+                    # empty cell
+                    closure.append(None)
+            global_values = tuple((name, _global_fingerprint(value, name)) for name in
+                                  _global_names(value.__code__) if name in value.__globals__)
+            return "function", value.__code__, fingerprint(value.__defaults__), tuple(closure), global_values
+        finally:
+            _active_functions.pop()
+    return "id", id(value)
+
+
+def has_identity(key) -> bool:
+    """
+    True if the fingerprint (or a tuple containing fingerprints) represents an object by its identity,
+    it can then only be used as long as that object is alive
+    """
+    if isinstance(key, tuple):
+        if len(key) == 2 and key[0] == "id" and isinstance(key[1], int):
+            return True
+        return any(has_identity(k) for k in key)
+    return False
+
+
+def _global_fingerprint(function: types.FunctionType, name: str) -> typing.Hashable:
+    """
+    fingerprint of a global read by a function
+    other objects of imported modules (e.g. registries of libraries) are represented by module and name,
+    the ones of scripts (__main__) by their identity
+    """
+    result = fingerprint(function.__globals__[name])
+    module = function.__globals__.get("__name__", "__main__")
+    if module != "__main__" and isinstance(result, tuple) and len(result) == 2 and result[0] == "id":
+        return "global", module, name
+    return result
+
+
+def _global_names(code: types.CodeType) -> tuple:
+    """ the names a code object (and the code objects defined in it) may read from the globals """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(_global_names(const))
+    return tuple(sorted(names))
+
+
+_active_functions = []
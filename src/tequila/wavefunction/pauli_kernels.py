@@ -0,0 +1,310 @@
+"""
+Vectorized kernels for expectationvalues of Pauli operators
+
+A PauliString is represented by two integers (bitmasks) x and z and a coefficient:
+P = c i^{n_y} X^x Z^z
+For n qubits, qubit q corresponds to the bit 2**(n-1-q) (MSB convention, like BitString)
+so that P|i> = c i^{n_y} (-1)^{parity(i&z)} |i^x>
+"""
+import numbers, numpy
+import scipy.sparse
+from tequila.utils.exceptions import TequilaException
+from tequila.hamiltonian.packed import unpack_bits
+
+
+def parity(x: numpy.ndarray) -> numpy.ndarray:
+    """
+    Vectorized parity (popcount modulo 2) of non-negative integers up to 63 bits
+
+    Parameters
+    ----------
+    x:
+        array of integers
+
+    Returns
+    -------
+        array of the same shape holding 0 for even and 1 for odd bitcounts
+    """
+    x = numpy.array(x, dtype=numpy.int64, copy=True)
+    for shift in (32, 16, 8, 4, 2, 1):
+        x ^= x >> shift
+    return x & 1
+
+
+def make_pauli_masks(hamiltonian, n_qubits: int, qubit_map: dict = None) -> tuple:
+    """
+    Translate a QubitHamiltonian into bitmasks.
+    Every PauliString P is written as P = c i^{n_y} X^x Z^z
+    where x and z are integers that carry a bit for each qubit acted on by X/Y (x) or Z/Y (z)
+
+    Parameters
+    ----------
+    hamiltonian:
+        the QubitHamiltonian
+    n_qubits:
+        number of qubits in the backend
+    qubit_map:
+        dictionary mapping abstract qubits to backend qubit numbers, default is the identity
+
+    Returns
+    -------
+        tuple of numpy arrays: xmasks, zmasks and coefficients (including the phase from the Y operators)
+    """
+    if n_qubits > 63:
+        raise TequilaException("bitmasks only support up to 63 qubits, got {}".format(n_qubits))
+    packed = hamiltonian.packed
+    qubits = packed.qubits()
+    positions = qubits if qubit_map is None else [qubit_map[q] for q in qubits]
+    # the packed terms carry qubit q in bit q (LSB), the backend masks in bit n_qubits-1-number (MSB)
+    weights = numpy.asarray([1 << (n_qubits - 1 - number) for number in positions], dtype=numpy.int64)
+    xmasks = numpy.zeros(len(packed), dtype=numpy.int64)
+    zmasks = numpy.zeros(len(packed), dtype=numpy.int64)
+    for start in range(0, len(packed), 2 ** 16):
+        terms = packed[slice(start, start + 2 ** 16)]
+        xmasks[start:start + 2 ** 16] = unpack_bits(terms.x)[:, qubits].astype(numpy.int64) @ weights
+        zmasks[start:start + 2 ** 16] = unpack_bits(terms.z)[:, qubits].astype(numpy.int64) @ weights
+    coeffs = numpy.asarray(packed.coeffs, dtype=complex) * 1.0j ** (packed.count_y() % 4)
+    return xmasks, zmasks, coeffs
+
+
+def sparse_matrix_from_masks(xmasks: numpy.ndarray, zmasks: numpy.ndarray, coeffs: numpy.ndarray,
+                             n_qubits: int, max_block: int = 2 ** 22) -> scipy.sparse.csr_matrix:
+    """
+    Build the matrix of H given in bitmask representation (see make_pauli_masks) in CSR format
+    Every distinct X-mask x contributes one entry per row r, in column r^x with the weight of r^x (see apply_masks)
+    so the rows have equal length and the CSR arrays are filled without sorting
+
+    Parameters
+    ----------
+    xmasks, zmasks, coeffs:
+        the bitmask representation of the Hamiltonian
+    n_qubits:
+        number of qubits, the matrix has dimension 2**n_qubits
+    max_block:
+        maximum number of entries in the temporary sign matrices
+
+    Returns
+    -------
+        the matrix as scipy.sparse.csr_matrix, real if all matrix elements are real
+    """
+    dim = 2 ** n_qubits
+    indices = numpy.arange(dim, dtype=numpy.int64)
+    unique_x = numpy.unique(xmasks)
+    if len(unique_x) == 0:
+        return scipy.sparse.csr_matrix((dim, dim))
+    dtype = float if not numpy.any(numpy.asarray(coeffs).imag) else complex
+    data = numpy.zeros((dim, len(unique_x)), dtype=dtype)
+    columns = numpy.empty((dim, len(unique_x)), dtype=numpy.int64)
+    for j, x in enumerate(unique_x):
+        weights = _basis_sign_weights(dim=dim, terms=numpy.flatnonzero(xmasks == x), zmasks=zmasks, coeffs=coeffs,
+                                      max_block=max_block)
+        columns[:, j] = indices ^ x
+        data[:, j] = weights[indices ^ x] if dtype is complex else weights.real[indices ^ x]
+    indptr = numpy.arange(0, dim * len(unique_x) + 1, len(unique_x), dtype=numpy.int64)
+    matrix = scipy.sparse.csr_matrix((data.reshape(-1), columns.reshape(-1), indptr), shape=(dim, dim))
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    return matrix
+
+
+def expectationvalue_from_masks(state: numpy.ndarray, xmasks: numpy.ndarray, zmasks: numpy.ndarray,
+                                coeffs: numpy.ndarray, max_block: int = 2 ** 22) -> numpy.ndarray:
+    """
+    Evaluate <state|H|state> for H given in bitmask representation (see make_pauli_masks)
+    <P> = sum_i conj(state[i^x]) i^{n_y} (-1)^{parity(i&z)} state[i]
+    Terms with the same X-mask share the overlap vector, their signs are contracted as a matrix product.
+
+    Parameters
+    ----------
+    state:
+        flat state of length 2**n, leading axes (e.g. for batches of states) are allowed
+    xmasks, zmasks, coeffs:
+        the bitmask representation of the Hamiltonian
+    max_block:
+        maximum number of entries in the temporary sign matrices
+
+    Returns
+    -------
+        the expectationvalue(s), one for each leading index of state
+    """
+    dim = state.shape[-1]
+    indices = numpy.arange(dim, dtype=numpy.int64)
+    result = numpy.zeros(state.shape[:-1], dtype=complex)
+    for x in numpy.unique(xmasks):
+        overlap = state[..., indices ^ x].conj() * state
+        result += _contract_signs(overlap, indices=indices, terms=numpy.flatnonzero(xmasks == x), zmasks=zmasks,
+                                  coeffs=coeffs, max_block=max_block)
+    return result
+
+
+def apply_masks(state: numpy.ndarray, xmasks: numpy.ndarray, zmasks: numpy.ndarray, coeffs: numpy.ndarray,
+                max_block: int = 2 ** 22) -> numpy.ndarray:
+    """
+    Apply H given in bitmask representation (see make_pauli_masks) to a state
+    (H|state>)[i^x] = sum_k c_k i^{n_y} (-1)^{parity(i&z_k)} state[i] for all terms k with X-mask x
+
+    Parameters
+    ----------
+    state:
+        flat state of length 2**n, leading axes (e.g. for batches of states) are allowed
+    xmasks, zmasks, coeffs:
+        the bitmask representation of the Hamiltonian
+    max_block:
+        maximum number of entries in the temporary sign matrices
+
+    Returns
+    -------
+        the new state(s) H|state>
+    """
+    dim = state.shape[-1]
+    indices = numpy.arange(dim, dtype=numpy.int64)
+    result = numpy.zeros(state.shape, dtype=complex)
+    for x in numpy.unique(xmasks):
+        weights = _basis_sign_weights(dim=dim, terms=numpy.flatnonzero(xmasks == x), zmasks=zmasks, coeffs=coeffs,
+                                      max_block=max_block)
+        result += (weights * state)[..., indices ^ x]
+    return result
+
+
+def apply_masks_on_keys(state: numpy.ndarray, keys: numpy.ndarray, xmasks: numpy.ndarray, zmasks: numpy.ndarray,
+                        coeffs: numpy.ndarray, max_block: int = 2 ** 22) -> numpy.ndarray:
+    """
+    Same as apply_masks for a state that is only given on some basis states (e.g. a sector of fixed particle number)
+    The partners i^x are looked up in the sorted keys, components of H|state> outside of the keys are dropped
+
+    Parameters
+    ----------
+    state:
+        amplitudes of the basis states in keys, leading axes (e.g. for batches of states) are allowed
+    keys:
+        sorted integers of the basis states (MSB convention)
+    xmasks, zmasks, coeffs:
+        the bitmask representation of the Hamiltonian
+    max_block:
+        maximum number of entries in the temporary sign matrices
+
+    Returns
+    -------
+        the new state(s) H|state> on the same keys
+    """
+    keys = numpy.asarray(keys, dtype=numpy.int64)
+    result = numpy.zeros(state.shape, dtype=complex)
+    if len(keys) == 0:
+        return result
+    for x in numpy.unique(xmasks):
+        weights = _index_sign_weights(keys, terms=numpy.flatnonzero(xmasks == x), zmasks=zmasks, coeffs=coeffs,
+                                      max_block=max_block)
+        partners = keys ^ x
+        positions = numpy.minimum(numpy.searchsorted(keys, partners), len(keys) - 1)
+        found = keys[positions] == partners
+        # i -> i^x is a bijection, so the positions of the found partners are distinct
+        result[..., positions[found]] += (weights * state)[..., found]
+    return result
+
+
+def expectationvalue_from_sparse_masks(keys: numpy.ndarray, amplitudes: numpy.ndarray, xmasks: numpy.ndarray,
+                                       zmasks: numpy.ndarray, coeffs: numpy.ndarray,
+                                       max_block: int = 2 ** 22) -> numbers.Number:
+    """
+    Same as expectationvalue_from_masks for a state that is only given on some basis states
+    The partners i^x of each basis state are looked up in the sorted keys
+
+    Parameters
+    ----------
+    keys:
+        integers of the basis states (MSB convention)
+    amplitudes:
+        the amplitudes of the basis states
+    xmasks, zmasks, coeffs:
+        the bitmask representation of the Hamiltonian
+    max_block:
+        maximum number of entries in the temporary sign matrices
+
+    Returns
+    -------
+        the expectationvalue
+    """
+    order = numpy.argsort(keys)
+    keys = numpy.asarray(keys, dtype=numpy.int64)[order]
+    amplitudes = numpy.asarray(amplitudes, dtype=complex)[order]
+    result = 0.0
+    if len(keys) == 0:
+        return result
+    for x in numpy.unique(xmasks):
+        partners = keys ^ x
+        positions = numpy.minimum(numpy.searchsorted(keys, partners), len(keys) - 1)
+        found = keys[positions] == partners
+        overlap = numpy.where(found, amplitudes[positions].conj(), 0.0) * amplitudes
+        result += _contract_signs(overlap, indices=keys, terms=numpy.flatnonzero(xmasks == x), zmasks=zmasks,
+                                  coeffs=coeffs, max_block=max_block)
+    return result
+
+
+def expectationvalue_from_counts(outcomes: numpy.ndarray, counts: numpy.ndarray, zmasks: numpy.ndarray,
+                                 coeffs: numpy.ndarray, max_block: int = 2 ** 22) -> numbers.Number:
+    """
+    Expectationvalue of a Hamiltonian of Z operators from measured outcomes
+    The parity of every term is computed for all outcomes at once
+
+    Parameters
+    ----------
+    outcomes:
+        integers of the measured basis states (MSB convention)
+    counts:
+        how often each outcome was measured
+    zmasks, coeffs:
+        the bitmask representation of the Hamiltonian (see make_pauli_masks), the xmasks need to vanish
+    max_block:
+        maximum number of entries in the temporary sign matrices
+
+    Returns
+    -------
+        the sum of the coefficients weighted by the signs of the outcomes, divide by the number of samples to get the
+        expectationvalue
+    """
+    outcomes = numpy.asarray(outcomes, dtype=numpy.int64)
+    zmasks = numpy.asarray(zmasks, dtype=numpy.int64)
+    return _contract_signs(numpy.asarray(counts, dtype=float), indices=outcomes, terms=numpy.arange(len(zmasks)),
+                           zmasks=zmasks, coeffs=numpy.asarray(coeffs), max_block=max_block)
+
+
+def _contract_signs(overlap, indices, terms, zmasks, coeffs, max_block):
+    """ sum_k coeffs[k] sum_i (-1)^{parity(indices[i] & zmasks[k])} overlap[...,i] for all k in terms """
+    result = 0.0
+    block = max(1, max_block // max(len(indices), 1))
+    for start in range(0, len(terms), block):
+        selection = terms[start:start + block]
+        signs = 1.0 - 2.0 * parity(indices[None, :] & zmasks[selection, None])
+        result = result + numpy.dot(overlap, signs.T) @ coeffs[selection]
+    return result
+
+
+def _index_sign_weights(indices, terms, zmasks, coeffs, max_block):
+    """ sum_k coeffs[k] (-1)^{parity(indices[i] & zmasks[k])} for all k in terms and all indices """
+    result = numpy.zeros(len(indices), dtype=complex)
+    block = max(1, max_block // max(len(indices), 1))
+    for start in range(0, len(terms), block):
+        selection = terms[start:start + block]
+        signs = 1.0 - 2.0 * parity(indices[None, :] & numpy.asarray(zmasks, dtype=numpy.int64)[selection, None])
+        result += numpy.asarray(coeffs)[selection] @ signs
+    return result
+
+
+def _basis_sign_weights(dim, terms, zmasks, coeffs, max_block):
+    """
+    sum_k coeffs[k] (-1)^{parity(i & zmasks[k])} for all k in terms and all indices i < dim
+    The index is split into high and low bits, the signs factorize and the sum over the terms is a matrix product:
+    weights[hi*n_low + lo] = sum_k signs_hi[k,hi] coeffs[k] signs_lo[k,lo]
+    """
+    low_bits = (dim.bit_length() - 1) // 2
+    n_low = 2 ** low_bits
+    n_high = dim // n_low
+    result = numpy.zeros((n_high, n_low), dtype=complex)
+    block = max(1, max_block // n_high)
+    for start in range(0, len(terms), block):
+        selection = terms[start:start + block]
+        z = numpy.asarray(zmasks, dtype=numpy.int64)[selection, None]
+        signs_lo = 1.0 - 2.0 * parity(numpy.arange(n_low, dtype=numpy.int64)[None, :] & (z & (n_low - 1)))
+        signs_hi = 1.0 - 2.0 * parity(numpy.arange(n_high, dtype=numpy.int64)[None, :] & (z >> low_bits))
+        result += (signs_hi.T * coeffs[selection]) @ signs_lo
+    return result.reshape(-1)
@@ -7,6 +7,8 @@ from tequila.utils.bitstrings import BitNumbering, BitString, initialize_bitstri
 from tequila import TequilaException
 from tequila.utils.keymap import KeyMapLSB2MSB, KeyMapMSB2LSB
 from tequila.tools import number_to_string
+from tequila.wavefunction.pauli_kernels import make_pauli_masks, expectationvalue_from_masks, \
+    expectationvalue_from_sparse_masks
 
 # from __future__ import annotations # can use that in python 3.7+ to get rid of string type hints
 
@@ -19,19 +21,48 @@ class QubitWaveFunction:
     """
     Store Wavefunction as dictionary of comp. basis state and complex numbers
     Use the same structure for Measurments results with int instead of complex numbers (counts)
+
+    Full statevectors (e.g. from simulators, see from_array) are stored as dense numpy arrays in MSB convention
+    The dictionary is only created if it is needed (items, keys, state, ...)
+    Amplitudes with magnitude below the threshold of from_array do not count as stored basis states
     """
 
     numbering = BitNumbering.MSB
 
     def apply_keymap(self, keymap, initial_state: BitString = None):
+        if self._dense is not None:
+            mapped = keymap.map_statevector(self._dense, initial_state=initial_state)
+            if mapped is not None:
+                self._dense = mapped
+                self.n_qubits = keymap.n_qubits
+                return self
+
+        state = self.state
+        mapped_keys = None
+        if keymap.n_bits_out is not None and len(state) > 0:
+            keys = [k.integer for k in state.keys()]
+            if max(keys) < 2 ** 63:
+                mapped_keys = keymap.map_keys(numpy.array(keys, dtype=numpy.int64), initial_state=initial_state)
+
         self.n_qubits = keymap.n_qubits
         mapped_state = dict()
-        for k, v in self.state.items():
-            mapped_key=keymap(input_state=k, initial_state=initial_state)
-            if mapped_key in mapped_state:
-                mapped_state[mapped_key] += v
-            else:
-                mapped_state[mapped_key] = v
+        if mapped_keys is not None:
+            # accumulate on the integers, the bitstrings are only created for the mapped basis states
+            accumulated = dict()
+            for i, v in zip(mapped_keys.tolist(), state.values()):
+                if i in accumulated:
+                    accumulated[i] += v
+                else:
+                    accumulated[i] = v
+            for i, v in accumulated.items():
+                mapped_state[BitString.from_int(integer=i, nbits=keymap.n_bits_out)] = v
+        else:
+            for k, v in state.items():
+                mapped_key=keymap(input_state=k, initial_state=initial_state)
+                if mapped_key in mapped_state:
+                    mapped_state[mapped_key] += v
+                else:
+                    mapped_state[mapped_key] = v
 
         self.state = mapped_state
         return self
@@ -44,6 +75,8 @@ class QubitWaveFunction:
             return max(self._n_qubits, self.min_qubits())
 
     def min_qubits(self) -> int:
+        if self._dense is not None:
+            return self._dense_qubits
         if len(self.state) > 0:
             maxk = max(self.state.keys())
             return maxk.nbits
@@ -58,6 +91,10 @@ class QubitWaveFunction:
 
     @property
     def state(self):
+        # the dictionary can be changed by the caller, dense wavefunctions are converted permanently
+        if self._dense is not None:
+            self._state = self._dense_to_dict()
+            self._dense = None
         if self._state is None:
             return dict()
         else:
@@ -67,8 +104,20 @@ class QubitWaveFunction:
     def state(self, other: typing.Dict[BitString, complex]):
         assert (isinstance(other, dict))
         self._state = other
+        self._dense = None
+
+    @property
+    def is_dense(self) -> bool:
+        """ True if the amplitudes are stored as dense array """
+        return self._dense is not None
+
+    @property
+    def _dense_qubits(self) -> int:
+        return len(self._dense).bit_length() - 1
 
     def __init__(self, state: typing.Dict[BitString, complex] = None, n_qubits=None):
+        self._dense = None
+        self._threshold = 0.0
         if state is None:
             self._state = dict()
         elif isinstance(state, int):
@@ -76,21 +125,58 @@ class QubitWaveFunction:
         elif isinstance(state, str):
             self._state = self.from_string(string=state, n_qubits=n_qubits).state
         elif isinstance(state, numpy.ndarray) or isinstance(state, list):
-            self._state = self.from_array(arr=state, n_qubits=n_qubits).state
+            self._set_from(self.from_array(arr=state, n_qubits=n_qubits))
+        elif isinstance(state, QubitWaveFunction):
+            self._set_from(state)
         elif hasattr(state, "state"):
             self._state = state.state
         else:
             self._state = state
         self._n_qubits = n_qubits
 
+    def _set_from(self, other: 'QubitWaveFunction'):
+        # share the storage of other
+        self._state = other._state
+        self._dense = other._dense
+        self._threshold = other._threshold
+
+    @classmethod
+    def _from_dense(cls, arr: numpy.ndarray, threshold: float = 0.0, n_qubits: int = None):
+        result = QubitWaveFunction(n_qubits=n_qubits)
+        result._state = None
+        result._dense = arr
+        result._threshold = threshold
+        return result
+
+    def _dense_support(self) -> numpy.ndarray:
+        """ indices of the stored basis states of a dense wavefunction """
+        return numpy.flatnonzero(numpy.abs(self._dense) > self._threshold)
+
+    def _dense_to_dict(self) -> typing.Dict[BitString, complex]:
+        nbits = self._dense_qubits
+        return {BitString.from_int(integer=int(i), nbits=nbits): self._dense[i] for i in self._dense_support()}
+
+    def _as_dict(self) -> typing.Dict[BitString, complex]:
+        """ the amplitudes as dictionary, without converting dense wavefunctions (don't change the result) """
+        if self._dense is not None:
+            return self._dense_to_dict()
+        return self.state
+
+    def _dense_index(self, key) -> typing.Optional[int]:
+        """ the index of the key in the dense array, None if the basis state is not stored """
+        i = int(self.convert_bitstring(key, self.n_qubits).integer)
+        if i < len(self._dense) and abs(self._dense[i]) > self._threshold:
+            return i
+        return None
+
     def items(self):
-        return self.state.items()
+        return self._as_dict().items()
 
     def keys(self):
-        return self.state.keys()
+        return self._as_dict().keys()
 
     def values(self):
-        return self.state.values()
+        return self._as_dict().values()
 
     @staticmethod
     def convert_bitstring(key: typing.Union[BitString, numbers.Integral], n_qubits):
@@ -102,6 +188,11 @@ class QubitWaveFunction:
             return key
 
     def __getitem__(self, item: BitString):
+        if self._dense is not None:
+            i = self._dense_index(item)
+            if i is None:
+                raise KeyError(item)
+            return self._dense[i]
         key = self.convert_bitstring(item, self.n_qubits)
         return self.state[key]
 
@@ -116,6 +207,9 @@ class QubitWaveFunction:
         -------
             Return the amplitude or measurement occurence of a bitstring
         """
+        if self._dense is not None:
+            i = self._dense_index(key)
+            return 0.0 if i is None else self._dense[i]
         ckey = self.convert_bitstring(key, self.n_qubits)
         if ckey in self.state:
             return self.state[ckey]
@@ -125,20 +219,41 @@ class QubitWaveFunction:
 
 
     def __setitem__(self, key: BitString, value: numbers.Number):
-        self._state[self.convert_bitstring(key, self.n_qubits)] = value
+        self.state[self.convert_bitstring(key, self.n_qubits)] = value
         return self
 
     def __contains__(self, item: BitString):
+        if self._dense is not None:
+            return self._dense_index(item) is not None
         return self.convert_bitstring(item, self.n_qubits) in self.keys()
 
     def __len__(self):
+        if self._dense is not None:
+            return int(numpy.count_nonzero(numpy.abs(self._dense) > self._threshold))
         return len(self.state)
 
     @classmethod
     def from_array(cls, arr: numpy.ndarray, keymap=None, threshold: float = 1.e-6,
                    numbering: BitNumbering = BitNumbering.MSB, n_qubits: int = None):
+        """
+        Initialize from a statevector
+        Numeric statevectors are stored as dense array (without copy for MSB numbering)
+        :param arr: the amplitudes, the index of each amplitude is the integer of its basis state
+        :param keymap: maps the basis states before they are stored (only in the dictionary form)
+        :param threshold: amplitudes with smaller magnitude are not stored
+        :param numbering: numbering of the basis state integers in arr
+        :param n_qubits: number of qubits
+        :return: the QubitWaveFunction
+        """
         arr = numpy.asarray(arr)
         assert (len(arr.shape) == 1)
+        n = len(arr).bit_length() - 1
+        if keymap is None and len(arr) > 1 and len(arr) == 2 ** n and arr.dtype.kind in "biufc":
+            if numbering != cls.numbering:
+                # reversing the order of the qubits is a transposition of the statevector as tensor
+                arr = arr.reshape([2] * n).transpose(list(reversed(range(n)))).reshape(-1)
+            return cls._from_dense(arr, threshold=threshold, n_qubits=n_qubits)
+
         state = dict()
         maxkey = len(arr) - 1
         maxbit = initialize_bitstring(integer=maxkey, numbering_in=numbering, numbering_out=cls.numbering).nbits
@@ -225,8 +340,13 @@ class QubitWaveFunction:
         # Check if the two numbers are equal.
         return numpy.isclose(over1, over2, rtol=rtol, atol=atol)
 
+    def _dense_compatible(self, other) -> bool:
+        return self._dense is not None and other._dense is not None and len(self._dense) == len(other._dense)
+
     def __add__(self, other):
-        result = QubitWaveFunction(state=copy.deepcopy(self._state))
+        if self._dense_compatible(other):
+            return self._from_dense(self._dense + other._dense, threshold=min(self._threshold, other._threshold))
+        result = QubitWaveFunction(state=copy.deepcopy(self._as_dict()))
         for k, v in other.items():
             if k in result._state:
                 result._state[k] += v
@@ -238,25 +358,31 @@ class QubitWaveFunction:
         return self + -1.0 * other
 
     def __iadd__(self, other):
+        state = self.state
         for k, v in other.items():
-            if k in self._state:
-                self._state[k] += v
+            if k in state:
+                state[k] += v
             else:
-                self._state[k] = v
+                state[k] = v
         return self
 
     def __rmul__(self, other):
-        result = QubitWaveFunction(state=copy.deepcopy(self._state))
+        if self._dense is not None and isinstance(other, numbers.Number):
+            return self._from_dense(other * self._dense, threshold=self._threshold)
+        result = QubitWaveFunction(state=copy.deepcopy(self._as_dict()))
         for k, v in result._state.items():
             result._state[k] *= other
         return result
 
     def inner(self, other):
+        if self._dense_compatible(other):
+            return numpy.vdot(self._dense, other._dense)
         # currently very slow and not optimized in any way
         result = 0.0
+        other_state = other._as_dict()
         for k, v in self.items():
-            if k in other._state:
-                result += v.conjugate() * other._state[k]
+            if k in other_state:
+                result += v.conjugate() * other_state[k]
         return result
 
     def normalize(self):
@@ -269,12 +395,31 @@ class QubitWaveFunction:
         return normalized
 
     def compute_expectationvalue(self, operator: 'QubitHamiltonian') -> numbers.Real:
-        tmp = self.apply_qubitoperator(operator=operator)
-        E = self.inner(other=tmp)
-        if hasattr(E, "imag") and numpy.isclose(E.imag, 0.0, atol=1.e-6):
-            return float(E.real)
+        return self.compute_expectationvalues(operators=[operator])[0]
+
+    def compute_expectationvalues(self, operators: typing.Iterable['QubitHamiltonian']) -> list:
+        """
+        Compute the expectationvalues of several operators with this wavefunction
+        The wavefunction is converted to arrays only once, the operators are evaluated with vectorized bitmask kernels
+        :param operators: list of QubitHamiltonians
+        :return: list of expectationvalues (floats if the imaginary parts vanish)
+        """
+        operators = list(operators)
+        n_qubits = max([self.n_qubits] + [max(H.qubits) + 1 for H in operators if len(H.qubits) > 0])
+        if self._dense is not None and n_qubits == self._dense_qubits:
+            results = [expectationvalue_from_masks(self._dense, *make_pauli_masks(H, n_qubits=n_qubits))
+                       for H in operators]
+        elif n_qubits > 63:
+            results = [self.inner(other=self.apply_qubitoperator(operator=H)) for H in operators]
         else:
-            return E
+            keys, amplitudes = self.to_sparse_arrays(n_qubits=n_qubits)
+            results = [expectationvalue_from_sparse_masks(keys, amplitudes, *make_pauli_masks(H, n_qubits=n_qubits))
+                       for H in operators]
+
+        for i, E in enumerate(results):
+            if hasattr(E, "imag") and numpy.isclose(E.imag, 0.0, atol=1.e-6):
+                results[i] = float(E.real)
+        return results
 
     def apply_qubitoperator(self, operator: 'QubitHamiltonian'):
         """
@@ -311,7 +456,29 @@ class QubitWaveFunction:
             result[BitString.from_array(array=arr)] = c
         return paulistring.coeff * result
 
+    def to_sparse_arrays(self, n_qubits: int = None) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        The stored basis states and their amplitudes (or counts) as parallel arrays
+        :param n_qubits: number of qubits of the integers, default is self.n_qubits (at most 63)
+        :return: integers of the basis states (MSB convention) and the amplitudes
+        """
+        if n_qubits is None:
+            n_qubits = self.n_qubits
+        if n_qubits > 63:
+            raise TequilaException("sparse arrays only support up to 63 qubits, got {}".format(n_qubits))
+        if self._dense is not None:
+            indices = self._dense_support()
+            return indices << (n_qubits - self._dense_qubits), self._dense[indices].astype(complex)
+        keys = numpy.fromiter((k.integer << (n_qubits - k.nbits) for k in self.keys()), dtype=numpy.int64,
+                              count=len(self))
+        values = numpy.fromiter(self.values(), dtype=complex, count=len(self))
+        return keys, values
+
     def to_array(self):
+        if self._dense is not None:
+            result = numpy.zeros(shape=2 ** self.n_qubits, dtype=complex)
+            result[:len(self._dense)] = self._dense
+            return result
         result = numpy.zeros(shape=2 ** self.n_qubits, dtype=numpy.complex)
         for k, v in self.items():
             result[int(k)] = v
@@ -319,7 +486,7 @@ class QubitWaveFunction:
 
     def simplify(self, threshold = 1.e-8):
         state = {}
-        for k, v in self.state.items():
+        for k, v in self.items():
             if not numpy.isclose(v, 0.0, atol=threshold):
                 state[k] = v
         return QubitWaveFunction(state=state)
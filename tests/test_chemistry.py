@@ -1,7 +1,8 @@
 import pytest
 import tequila.quantumchemistry as qc
 import numpy
-import os, glob
+import os, glob, itertools
+import openfermion
 
 import tequila.simulators.simulator_api
 from tequila.objective import ExpectationValue
@@ -48,6 +49,76 @@ def test_base(trafo):
         assert len(eigvals) == 16
 
 
+@pytest.mark.parametrize("sector", [(1, 1), (2, 2), (2, 1), (3, 1)])
+def test_exact_states(sector):
+    # random real integrals with the symmetries of molecular integrals
+    n = 4
+    h = numpy.random.uniform(-1.0, 1.0, size=(n, n))
+    h = h + h.T
+    L = numpy.random.uniform(-0.5, 0.5, size=(5, n, n))
+    L = L + L.transpose(0, 2, 1)
+    g = qc.NBodyTensor(elems=numpy.einsum("Ppq,Prs->pqrs", L, L), ordering="chem").reorder(to="openfermion").elems
+    molecule = tq.chemistry.Molecule(backend="base", geometry="he 0.0 0.0 0.0", basis_set="whatever",
+                                     transformation="JW", one_body_integrals=h, two_body_integrals=g,
+                                     nuclear_repulsion=0.3, n_orbitals=n)
+    H = molecule.make_hamiltonian()
+    n_alpha, n_beta = sector
+    # alpha electrons on the even qubits, beta electrons on the odd qubits (MSB: qubit 0 is the leading bit)
+    indices = [i for i in range(2 ** (2 * n)) if
+               sum((i >> (2 * n - 1 - 2 * p)) & 1 for p in range(n)) == n_alpha and
+               sum((i >> (2 * n - 2 - 2 * p)) & 1 for p in range(n)) == n_beta]
+    matrix = H.to_matrix(ignore_unused_qubits=False)
+    reference = numpy.linalg.eigvalsh(matrix[numpy.ix_(indices, indices)])[:3]
+
+    energies, wavefunctions = molecule.compute_exact_states(n_states=3, n_alpha=n_alpha, n_beta=n_beta,
+                                                             wavefunctions=True)
+    assert numpy.allclose(energies, reference)
+    for energy, wfn in zip(energies, wavefunctions):
+        assert numpy.isclose(wfn.compute_expectationvalue(H), energy)
+
+    if sector == (1, 1):
+        # default sector from the two electrons of the molecule
+        assert numpy.isclose(molecule.compute_exact_states()[0], reference[0])
+
+
+@pytest.mark.parametrize("transformation", ["JW", "BK", "BKT"])
+@pytest.mark.parametrize("indices", [(None, None), ([0], [1, 2, 3])])
+def test_encoded_hamiltonian(transformation, indices):
+    # direct construction from the integrals against the openfermion pipeline
+    n = 4
+    h = numpy.random.uniform(-1.0, 1.0, size=(n, n))
+    h = h + h.T
+    L = numpy.random.uniform(-0.5, 0.5, size=(5, n, n))
+    L = L + L.transpose(0, 2, 1)
+    g = qc.NBodyTensor(elems=numpy.einsum("Ppq,Prs->pqrs", L, L), ordering="chem").reorder(to="openfermion").elems
+    molecule = tq.chemistry.Molecule(backend="base", geometry="he 0.0 0.0 0.0", basis_set="whatever",
+                                     transformation=transformation, one_body_integrals=h, two_body_integrals=g,
+                                     nuclear_repulsion=0.3, n_orbitals=n)
+    H = molecule.make_hamiltonian(*indices)
+    fop = openfermion.get_fermion_operator(molecule.molecule.get_molecular_hamiltonian(*indices))
+    reference = tq.QubitHamiltonian(qubit_operator=molecule.transformation(fop)).simplify(1.e-8)
+    assert H.is_hermitian()
+    assert H == reference
+
+    # NBodyTensor in any ordering and complex integrals (not symmetric under exchange of the electron pairs)
+    majoranas = qc.encoded_hamiltonian.majorana_strings(openfermion.jordan_wigner, 2 * n)
+    tensor = qc.NBodyTensor(elems=numpy.einsum("Ppq,Prs->pqrs", L, L), ordering="chem")
+    assert qc.encoded_hamiltonian.make_encoded_hamiltonian(h, tensor, majoranas).to_terms() == \
+           qc.encoded_hamiltonian.make_encoded_hamiltonian(h, g, majoranas).to_terms()
+    g = g + 0.1j * numpy.random.uniform(-1.0, 1.0, size=g.shape)
+    fop = openfermion.FermionOperator()
+    for p, q, r, s in itertools.product(range(n), repeat=4):
+        for sigma, tau in itertools.product([0, 1], repeat=2):
+            fop += openfermion.FermionOperator(
+                ((2 * p + sigma, 1), (2 * q + tau, 1), (2 * r + tau, 0), (2 * s + sigma, 0)), 0.5 * g[p, q, r, s])
+    for p, q in itertools.product(range(n), repeat=2):
+        for sigma in [0, 1]:
+            fop += openfermion.FermionOperator(((2 * p + sigma, 1), (2 * q + sigma, 0)), h[p, q])
+    H = tq.QubitHamiltonian.from_packed(qc.encoded_hamiltonian.make_encoded_hamiltonian(h, g, majoranas))
+    reference = tq.QubitHamiltonian(qubit_operator=openfermion.jordan_wigner(fop))
+    assert (H - reference).simplify(1.e-8) == tq.QubitHamiltonian()
+
+
 @pytest.mark.skipif(condition=not HAS_PSI4, reason="you don't have psi4")
 @pytest.mark.parametrize("trafo_args", [{"transformation": "jordan_wigner"}, {"transformation": "bravyi_kitaev"},
                                         {"transformation": "bravyi_kitaev_fast"},
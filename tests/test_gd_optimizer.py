@@ -96,3 +96,55 @@ def test_methods_diis(simulator, method):
                       initial_values=initial_values, silent=True)
     assert(numpy.isclose(result.energy, -0.612, atol=2.e-2))
 
+
+
+@pytest.mark.parametrize("gradient", [{"method": "spsa", "seed": 5},
+                                      {"method": "spsa", "stepsize": 0.2, "gamma": 0.2, "repetitions": 2, "seed": 3},
+                                      {"method": "random-subspace", "dimension": 2, "seed": 3}])
+def test_stochastic_gradients(gradient):
+    variables = [tq.Variable(i) for i in range(6)]
+    U = tq.QCircuit()
+    for i, v in enumerate(variables):
+        U += tq.gates.Ry(angle=v, target=i) if i < 3 else tq.gates.Rx(angle=v, target=i % 3)
+    U += tq.gates.CNOT(0, 1) + tq.gates.CNOT(1, 2)
+    O = tq.ExpectationValue(U=U, H=tq.paulis.Z(0) + tq.paulis.Z(1) * tq.paulis.Z(2))
+    initial_values = {v: 0.1 * (i + 2) for i, v in enumerate(variables)}
+
+    result = minimize(objective=O, method="adam", lr=0.1, maxiter=60, gradient=gradient,
+                      initial_values=initial_values, silent=True)
+    assert result.energy < -1.5
+    # line searches don't go well with noisy gradients, just make sure it progresses
+    result = tq.optimizer_scipy.minimize(objective=O, method="BFGS", maxiter=10, gradient=gradient,
+                                         initial_values=initial_values, silent=True)
+    assert result.energy < simulate(O, variables=initial_values)
+
+    for method in ["spsa", "random-subspace"]:
+        minimize(objective=O, method="adam", maxiter=2, gradient=method, initial_values=initial_values, silent=True)
+
+
+def test_stochastic_gradient_estimates():
+    from tequila.optimizers.optimizer_base import _StochasticGradient, _StochasticGradientComponent
+    variables = [tq.Variable(i) for i in range(4)]
+    U = tq.QCircuit()
+    for i, v in enumerate(variables):
+        U += tq.gates.Ry(angle=v, target=i % 2)
+    U += tq.gates.CNOT(0, 1)
+    O = tq.ExpectationValue(U=U, H=tq.paulis.Z(0) + tq.paulis.X(1))
+    point = {v: 0.1 * (i + 1) for i, v in enumerate(variables)}
+    reference = [simulate(tq.grad(O, v), variables=point) for v in variables]
+
+    # the full subspace recovers the gradient up to the finite differences
+    compiled = tq.compile(O)
+    estimator = _StochasticGradient(objective=compiled, variables=variables, method="random-subspace",
+                                    dimension=4, stepsize=1.e-4)
+    assert numpy.allclose(estimator(point), reference, atol=1.e-6)
+
+    # the components of one gradient share an estimate, the next gradient at the same point gets a new one
+    estimator = _StochasticGradient(objective=compiled, variables=variables, method="spsa", seed=1)
+    components = [_StochasticGradientComponent(estimator, v) for v in variables]
+    values = [c(point) for c in components]
+    assert estimator.iteration == 1
+    assert numpy.allclose(values, estimator._result)
+    components[0](point)
+    assert estimator.iteration == 2
+    assert numpy.isclose(estimator.perturbation(9), 0.1 / 10 ** 0.101)
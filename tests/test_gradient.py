@@ -479,3 +479,113 @@ def test_qubit_excitations():
         eval1 = simulate(dE1, variables=variables)
         eval2 = simulate(dE2, variables=variables)
         assert numpy.isclose(eval1, eval2, 1.e-4)
+
+
+@pytest.mark.parametrize("method", tequila.circuit.gradient.SIMULATED_GRADIENT_METHODS)
+def test_simulated_gradient(method):
+    a, b, c = Variable("a"), Variable("b"), Variable("c")
+    U = gates.Ry(a, 0) + gates.H(2) + gates.X(3, control=0) + gates.Rz(b, 1, control=[0, 2])
+    U += gates.ExpPauli(paulistring="X(0)Y(1)Z(3)", angle=2.0 * c) + gates.Phase(1, angle=a)
+    U += gates.QubitExcitation(target=[0, 1, 2, 3], angle=b) + gates.Rx(a * b, 3, control=2) + gates.Ry(c, [0, 1])
+    H = paulis.X(0) * paulis.Y(1) + 0.5 * paulis.Z(3) + paulis.Y(2) * paulis.Y(0) + 1.0
+    E = ExpectationValue(H=H, U=U)
+    O = 2.0 * E * E + a.apply(tequila.numpy.sin) * E + b
+    variables = {a: 0.3, b: -1.2, c: 0.8}
+
+    dO = grad(O, method=method)
+    for k in [a, b, c]:
+        reference = simulate(grad(O, k), variables=variables)
+        assert numpy.isclose(simulate(dO[k], variables=variables), reference)
+
+    # shifts that do not fit into one batch
+    compiled = tequila.compile(E, backend="numpy").args[0]
+    gradients = compiled.gradient(variables, method=method, max_batch_size=3)
+    for k in [a, b, c]:
+        assert numpy.isclose(gradients[k], simulate(grad(E, k), variables=variables))
+
+    V = tequila.vectorize([E, O])
+    dV = grad(V, a, method=method)
+    assert numpy.allclose([x(variables) for x in dV], [simulate(grad(E, a), variables=variables),
+                                                       simulate(grad(O, a), variables=variables)])
+
+    result = tequila.minimize(E, method="bfgs", gradient=method, initial_values=variables, silent=True)
+    reference = tequila.minimize(E, method="bfgs", initial_values=variables, silent=True)
+    assert numpy.isclose(result.energy, reference.energy, atol=1.e-4)
+
+    # options of the dict form are passed on
+    result = tequila.minimize(E, method="bfgs", gradient={"method": method, "max_batch_size": 3},
+                              initial_values=variables, silent=True)
+    assert numpy.isclose(result.energy, reference.energy, atol=1.e-4)
+    with pytest.raises(tequila.TequilaException):
+        tequila.minimize(E, method="bfgs", gradient={"method": method, "backend": "qulacs"},
+                         initial_values=variables, silent=True)
+
+
+def test_shifted_gradient_template():
+    a, b, c = Variable("a"), Variable("b"), Variable("c")
+    U = gates.Ry(a, 0) + gates.X(1, control=0) + gates.Rx(2.0 * b, 1) + gates.Rz(a * c, 0, control=1)
+    U += gates.ExpPauli(paulistring="X(0)Y(1)", angle=c) + gates.QubitExcitation(target=[0, 1], angle=b)
+    H = paulis.X(0) * paulis.Z(1) + 0.5 * paulis.Y(1)
+    E = ExpectationValue(H=H, U=U)
+    O = E * E + a.apply(tequila.numpy.sin) * E
+    variables = {a: 0.3, b: -0.7, c: 1.1}
+
+    dO = grad(O)
+    for k in [a, b, c]:
+        assert numpy.isclose(simulate(dO[k], variables=variables), simulate(grad(O, k), variables=variables))
+        reference = grad(O, method="checkpoint")[k](variables)
+        assert numpy.isclose(simulate(dO[k], variables=variables), reference)
+
+    # the shifted expectationvalues of the rotations share one compiled circuit
+    compiled = tequila.compile(dO[a])
+    shifted = [arg for arg in compiled.args if hasattr(arg, "abstract_expectationvalue") and isinstance(
+        arg.abstract_expectationvalue, tequila.objective.objective.ShiftedExpectationValueImpl)]
+    circuits = {id(arg.U) for arg in shifted}
+    assert len(circuits) == 1
+    assert compiled.extract_variables() == dO[a].extract_variables()
+
+    # the template is shared over calls of compile with the same variables, the abstract objective is not changed
+    templates = {arg.abstract_expectationvalue.template for arg in shifted}
+    assert all(not hasattr(template, "_compiled") for template in templates)
+    assert {id(arg.U) for arg in tequila.compile(dO[b]).args if hasattr(arg, "U")} & circuits
+    other = tequila.compile(dO[a], variables={a: 1.0, b: 2.0, c: 3.0})
+    assert not {id(arg.U) for arg in other.args if hasattr(arg, "U")} & circuits
+    assert numpy.isclose(other(variables), compiled(variables))
+
+    # second derivatives shift the same template again
+    ddE = grad(grad(E, a), b)
+    step = 1.e-4
+    f = lambda x, y: simulate(E, variables={a: x, b: y, c: 1.1})
+    reference = (f(0.3 + step, -0.7 + step) - f(0.3 + step, -0.7 - step) - f(0.3 - step, -0.7 + step)
+                 + f(0.3 - step, -0.7 - step)) / (4 * step ** 2)
+    assert numpy.isclose(simulate(ddE, variables=variables), reference, atol=1.e-5)
+
+
+def test_hessian():
+    a, b, c = Variable("a"), Variable("b"), Variable("c")
+    U = gates.Ry(a, 0) + gates.X(1, control=0) + gates.Rx(a * b, 1) + gates.Rz(c, 0)
+    U += gates.ExpPauli(paulistring="X(0)Y(1)", angle=b)
+    H = paulis.X(0) * paulis.Z(1) + 0.5 * paulis.Y(1) + paulis.Z(0)
+    E = ExpectationValue(H=H, U=U)
+    O = E * E + a.apply(tequila.numpy.sin) * E
+    variables = {a: 0.3, b: -1.2, c: 0.7}
+
+    ddO = tequila.hessian(O)
+    keys = [(k, l) for k in [a, b, c] for l in [a, b, c]]
+    assert set(ddO.keys()) == set(keys)
+    for k, l in keys:
+        assert ddO[(k, l)] is ddO[(l, k)]
+        reference = simulate(grad(grad(O, k), l), variables=variables)
+        assert numpy.isclose(simulate(ddO[(k, l)], variables=variables), reference)
+
+    # the entries share their (doubly) shifted expectationvalues
+    compiled = [tequila.compile(ddO[(k, l)]) for k, l in keys if str(k) <= str(l)]
+    plan = tequila.objective.EvaluationPlan(compiled)
+    assert plan.count_expectationvalues() < sum(x.count_expectationvalues() for x in compiled)
+
+    # reusing the gradient gives the same Hessian
+    dO = grad(O, [a, c])
+    ddO = tequila.hessian(None, gradient=dO)
+    assert set(ddO.keys()) == {(a, a), (a, c), (c, a), (c, c)}
+    assert numpy.isclose(simulate(ddO[(a, c)], variables=variables),
+                         simulate(grad(grad(O, a), c), variables=variables))
@@ -321,3 +321,97 @@ def test_trace_out_xy(theta):
     factor *= -1.0j*(a.conjugate()*b - b.conjugate()*a)
     H1 = QubitHamiltonian.from_string("1.0*X(0)*X(1)*Y(5)*X(100)")
     assert factor*H2 == H1.trace_out_qubits(qubits=[1,3,5], states=[state]*3)
+
+
+def random_hamiltonian(n_terms=10, max_qubit=80):
+    from openfermion import QubitOperator
+    operator = QubitOperator()
+    for _ in range(n_terms):
+        qubits = numpy.random.choice(max_qubit, 3, replace=False)
+        paulis = numpy.random.choice(["X", "Y", "Z"], 3)
+        coeff = numpy.random.choice([1.0, -0.5, 0.25j])
+        operator += QubitOperator(tuple(zip(qubits.tolist(), paulis.tolist())), coeff)
+    return QubitHamiltonian(qubit_operator=operator + QubitOperator("", 0.5))
+
+
+@pytest.mark.parametrize("max_qubit", [5, 80])
+def test_packed_arithmetic(max_qubit):
+    H1 = random_hamiltonian(max_qubit=max_qubit)
+    H2 = random_hamiltonian(max_qubit=max_qubit)
+    of1 = H1.to_openfermion()
+    of2 = H2.to_openfermion()
+
+    assert (H1 + H2).to_openfermion() == of1 + of2
+    assert (H1 - H1).to_openfermion() == of1 - of1
+    assert (H1 * H2).to_openfermion() == of1 * of2
+    assert (2.0 - H1).to_openfermion() == 2.0 - of1
+    assert H1.qubits == sorted(set(q for k in of1.terms for q, p in k))
+
+    qubit_map = {q: 2 * q + 1 for q in H1.qubits}
+    mapped = [PauliString(data={qubit_map[q]: p for q, p in ps.items()}, coeff=ps.coeff) for ps in H1.paulistrings]
+    assert H1.map_qubits(qubit_map) == QubitHamiltonian.from_paulistrings(mapped)
+
+    commutator = of1 * of2 - of2 * of1
+    commutator.compress()
+    assert H1.commutator(H2).simplify(1.e-8).to_openfermion() == commutator
+    assert H1.commutes_with(H2) == (len(commutator.terms) == 0)
+    assert H1.commutes_with(H1)
+
+    anticommutation = H1.anticommutation_matrix(H2)
+    for i, ps1 in enumerate(H1.paulistrings):
+        for j, ps2 in enumerate(H2.paulistrings):
+            P = QubitHamiltonian.from_paulistrings(ps1.naked())
+            Q = QubitHamiltonian.from_paulistrings(ps2.naked())
+            assert anticommutation[i, j] == (len((P * Q + Q * P).simplify(1.e-8)) == 0)
+
+
+def test_packed_trace_out():
+    H = QubitHamiltonian.from_string("1.0*X(0)Z(70) + 2.0*Z(0)Z(1) - 0.5*Z(0)Y(70) + 0.5*X(3)")
+    assert H.is_all_z() is False
+    assert H.trace_out_qubits(qubits=[0]) == QubitHamiltonian.from_string("2.0*Z(1) - 0.5*Y(70) + 0.5*X(3)")
+    assert QubitHamiltonian.from_string("Z(0)Z(100) + Z(3)").is_all_z()
+    assert H.simplify(threshold=0.6) == QubitHamiltonian.from_string("1.0*X(0)Z(70) + 2.0*Z(0)Z(1)")
+    assert len(H) == 2
+
+
+@pytest.mark.parametrize("ignore_unused_qubits", [True, False])
+def test_sparse_export(ignore_unused_qubits):
+    from openfermion import get_sparse_operator
+    from scipy.sparse.linalg import eigsh
+    H = random_hamiltonian(n_terms=8, max_qubit=7)
+    H = 0.5 * (H + H.dagger())
+    n_qubits = len(H.qubits) if ignore_unused_qubits else max(H.qubits) + 1
+    qubit_map = {q: i for i, q in enumerate(H.qubits)} if ignore_unused_qubits else {q: q for q in H.qubits}
+    reference = get_sparse_operator(H.map_qubits(qubit_map).to_openfermion(), n_qubits=n_qubits).toarray()
+
+    assert numpy.allclose(H.to_sparse(ignore_unused_qubits=ignore_unused_qubits).toarray(), reference)
+    assert numpy.allclose(H.to_matrix(ignore_unused_qubits=ignore_unused_qubits), reference)
+
+    operator = H.to_linear_operator(ignore_unused_qubits=ignore_unused_qubits)
+    vectors = numpy.random.uniform(-1.0, 1.0, size=(2 ** n_qubits, 3)) + 1.0j
+    assert numpy.allclose(operator.matvec(vectors[:, 0]), reference @ vectors[:, 0])
+    assert numpy.allclose(operator.matmat(vectors), reference @ vectors)
+    assert numpy.allclose(operator.rmatvec(vectors[:, 0]), reference.conj().T @ vectors[:, 0])
+
+    energy = numpy.linalg.eigvalsh(reference)[0]
+    assert numpy.isclose(eigsh(H.to_sparse(), k=1, which="SA")[0][0], energy)
+    assert numpy.isclose(eigsh(H.to_linear_operator(), k=1, which="SA")[0][0], energy)
+
+    # zero and constant Hamiltonians
+    for H, value in [(QubitHamiltonian(), 0.0), (paulis.X(0) - paulis.X(0), 0.0), (paulis.I() * 2.5, 2.5)]:
+        assert numpy.allclose(H.to_matrix(), [[value]])
+        assert numpy.allclose(H.to_sparse().toarray(), [[value]])
+
+
+def test_packed_kept_on_read():
+    H = QubitHamiltonian.from_string("1.0*X(0)Z(1) + 2.0*Z(0)Z(1) - 0.5*Y(2)")
+    packed = H.packed
+    assert H == QubitHamiltonian.from_string("1.0*X(0)Z(1) + 2.0*Z(0)Z(1) - 0.5*Y(2)")
+    assert len(H.paulistrings) == 3
+    assert str(H) != ""
+    assert H.is_hermitian()
+    assert H.packed is packed
+    # explicit modification through the openfermion operator drops the cached terms
+    H.qubit_operator.terms[((0, "Z"),)] = 1.0
+    assert H.packed is not packed
+    assert H.packed.n_terms == 4
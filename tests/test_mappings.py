@@ -1,5 +1,5 @@
 from tequila.wavefunction import QubitWaveFunction
-from tequila.utils.keymap import KeyMapSubregisterToRegister
+from tequila.utils.keymap import KeyMapSubregisterToRegister, KeyMapRegisterToSubregister
 from tequila import BitString, BitStringLSB
 from tequila.circuit import QCircuit, gates
 from tequila import ExpectationValue
@@ -23,6 +23,28 @@ def test_keymaps():
     assert (small.apply_keymap(keymap=keymap, initial_state=initial_state).isclose(large))
 
 
+@pytest.mark.parametrize("subregister", [[1, 3, 5, 7], [0, 2], [6], [0, 1, 2, 3, 4, 5, 6, 7]])
+@pytest.mark.parametrize("initial_state", [None, 0, 37])
+def test_vectorized_keymaps(subregister, initial_state):
+    register = [0, 1, 2, 3, 4, 5, 6, 7]
+    keymap = KeyMapSubregisterToRegister(register=register, subregister=subregister)
+    keys = numpy.arange(2 ** len(subregister))
+    expected = [keymap(input_state=int(k), initial_state=initial_state).integer for k in keys]
+    assert (keymap.map_keys(keys, initial_state=initial_state) == expected).all()
+
+    small = numpy.random.uniform(-1.0, 1.0, 2 ** len(subregister))
+    dense = QubitWaveFunction.from_array(small).apply_keymap(keymap=keymap, initial_state=initial_state)
+    sparse = QubitWaveFunction.from_array(small, keymap=lambda k: k).apply_keymap(keymap=keymap,
+                                                                                initial_state=initial_state)
+    assert dense.is_dense and dense.n_qubits == sparse.n_qubits == 8
+    assert numpy.allclose(dense.to_array(), sparse.to_array())
+
+    inverse = KeyMapRegisterToSubregister(register=register, subregister=subregister)
+    keys = numpy.arange(2 ** len(register))
+    expected = [inverse(input_state=BitString.from_int(int(k), nbits=8)).integer for k in keys]
+    assert (inverse.map_keys(keys) == expected).all()
+
+
 def test_endianness():
     tests = ["000111",
              "111000",
@@ -8,7 +8,7 @@ from tequila.circuit.noise import BitFlip, PhaseDamp, PhaseFlip, AmplitudeDamp,
 import numpy
 import pytest
 
-samplers = [k for k in tequila.INSTALLED_SAMPLERS.keys()]
+samplers = [k for k in tequila.simulators.simulator_api.INSTALLED_NOISE_SAMPLERS.keys()]
 
 
 @pytest.mark.dependencies
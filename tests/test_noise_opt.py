@@ -6,7 +6,7 @@ import numpy
 import pytest
 import tequila as tq
 
-samplers = [k for k in tq.INSTALLED_SAMPLERS.keys()]
+samplers = [k for k in tq.simulators.simulator_api.INSTALLED_NOISE_SAMPLERS.keys()]
 
 
 @pytest.mark.dependencies
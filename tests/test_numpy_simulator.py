@@ -0,0 +1,166 @@
+import tequila as tq
+import tequila.simulators.simulator_api
+from tequila.wavefunction.pauli_kernels import parity, make_pauli_masks, expectationvalue_from_masks, apply_masks, \
+    expectationvalue_from_counts, apply_masks_on_keys
+from tequila.utils import hamming_weight_basis
+
+import numpy
+import pytest
+
+
+def make_circuit():
+    a, b, c = tq.Variable("a"), tq.Variable("b"), tq.Variable("c")
+    U = tq.gates.Ry(a, 0) + tq.gates.H(2) + tq.gates.X(3, control=0) + tq.gates.Rz(b, 1, control=[0, 2])
+    U += tq.gates.ExpPauli(paulistring="X(0)Y(1)Z(3)", angle=c) + tq.gates.SWAP(1, 3) + tq.gates.SWAP(0, 2, control=1)
+    U += tq.gates.Y(2, power=0.3) + tq.gates.Phase(1, angle=a) + tq.gates.Toffoli(0, 1, 2)
+    U += tq.gates.QubitExcitation(target=[0, 1, 2, 3], angle=b) + tq.gates.Rx(a, 3, control=2)
+    return U
+
+
+def test_parity():
+    x = numpy.random.randint(0, 2 ** 62, size=100, dtype=numpy.int64)
+    expected = [bin(i).count("1") % 2 for i in x]
+    assert numpy.all(parity(x) == expected)
+
+
+REFERENCE_SIMULATORS = [k for k in tequila.simulators.simulator_api.INSTALLED_SIMULATORS.keys() if
+                        k not in ["numpy", "symbolic"]]
+
+
+@pytest.mark.skipif(len(REFERENCE_SIMULATORS) == 0, reason="no reference simulator installed")
+@pytest.mark.parametrize("backend", REFERENCE_SIMULATORS)
+@pytest.mark.parametrize("init", [0, 3, 10])
+def test_wavefunction(backend, init):
+    U = make_circuit()
+    variables = {k: numpy.random.uniform(0.0, 2 * numpy.pi) for k in U.extract_variables()}
+    wfn = tq.simulate(U, variables=variables, backend="numpy", initial_state=init)
+    reference = tq.simulate(U, variables=variables, backend=backend, initial_state=init)
+    assert numpy.isclose(abs(wfn.inner(reference)), 1.0)
+
+
+def test_expectationvalue():
+    U = make_circuit()
+    H = tq.paulis.X(0) * tq.paulis.Y(1) + 0.5 * tq.paulis.Z(3) + tq.paulis.Y(2) * tq.paulis.Y(0)
+    H += -0.3 * tq.paulis.Z([1, 2]) * tq.paulis.X(3) + 1.2
+    variables = {k: numpy.random.uniform(0.0, 2 * numpy.pi) for k in U.extract_variables()}
+    E = tq.simulate(tq.ExpectationValue(H=H, U=U), variables=variables, backend="numpy")
+    wfn = tq.simulate(U, variables=variables, backend="numpy")
+    assert numpy.isclose(E, wfn.compute_expectationvalue(H))
+
+
+def test_masks():
+    H = tq.paulis.X(0) * tq.paulis.Y(1) + 0.5 * tq.paulis.Z(2) - 0.3 * tq.paulis.Y([0, 2])
+    state = numpy.random.uniform(-1.0, 1.0, size=(3, 8)) + 1.0j * numpy.random.uniform(-1.0, 1.0, size=(3, 8))
+    masks = make_pauli_masks(H, qubit_map={0: 0, 1: 1, 2: 2}, n_qubits=3)
+    result = expectationvalue_from_masks(state, *masks).real
+    matrix = H.to_matrix()
+    expected = [(s.conj() @ matrix @ s).real for s in state]
+    assert numpy.allclose(result, expected)
+    assert numpy.allclose(apply_masks(state, *masks), state @ matrix.T)
+
+
+def test_counts():
+    H = tq.paulis.Z(0) + 0.5 * tq.paulis.Z([1, 3]) - 0.3 * tq.paulis.Z([0, 2, 3]) + 0.2
+    outcomes = numpy.random.randint(0, 16, size=20)
+    counts = numpy.random.randint(1, 100, size=20)
+    _, zmasks, coeffs = make_pauli_masks(H, n_qubits=4)
+    matrix = H.to_matrix()
+    expected = sum(n * matrix[i, i] for i, n in zip(outcomes, counts))
+    assert numpy.isclose(expectationvalue_from_counts(outcomes, counts, zmasks, coeffs, max_block=7), expected)
+
+
+def test_wavefunction_expectationvalues():
+    U = make_circuit()
+    variables = {k: numpy.random.uniform(0.0, 2 * numpy.pi) for k in U.extract_variables()}
+    wfn = tq.simulate(U, variables=variables, backend="numpy")
+    H1 = tq.paulis.X(0) * tq.paulis.Y(1) + 0.5 * tq.paulis.Z(3) - 0.3 * tq.paulis.Y([0, 2])
+    H2 = tq.paulis.X(3) * tq.paulis.Z(1) + 0.7
+    result = wfn.compute_expectationvalues([H1, H2])
+    for H, E in zip([H1, H2], result):
+        assert numpy.isclose(E, wfn.inner(wfn.apply_qubitoperator(H)))
+    E = tq.simulate(tq.ExpectationValue(H=(H1, H2), U=U), variables=variables, backend="numpy")
+    assert numpy.isclose(E, sum(result))
+
+
+@pytest.mark.parametrize("numbering", [tq.BitNumbering.MSB, tq.BitNumbering.LSB])
+def test_dense_wavefunction(numbering):
+    arr = numpy.random.uniform(-1.0, 1.0, size=16) + 1.0j * numpy.random.uniform(-1.0, 1.0, size=16)
+    arr[5] = 0.0
+    dense = tq.QubitWaveFunction.from_array(arr, numbering=numbering)
+    sparse = tq.QubitWaveFunction.from_array(arr, numbering=numbering, keymap=lambda k: k)
+    assert dense.is_dense and not sparse.is_dense
+    assert len(dense) == len(sparse) == 15
+    for k, v in sparse.items():
+        assert k in dense
+        assert numpy.isclose(dense[k], v)
+    assert numpy.isclose(dense.inner(dense), sparse.inner(sparse))
+    assert numpy.isclose(dense.inner(sparse), sparse.inner(dense))
+    assert numpy.allclose(dense.to_array(), sparse.to_array())
+    H = tq.paulis.X(0) * tq.paulis.Y(1) + 0.5 * tq.paulis.Z(3) - 0.3 * tq.paulis.Y([0, 2])
+    assert numpy.isclose(dense.compute_expectationvalue(H), sparse.compute_expectationvalue(H))
+    assert numpy.isclose((dense - 2.0 * dense).inner(sparse), -sparse.inner(sparse))
+    dense[5] = 1.0
+    assert not dense.is_dense and dense(5) == 1.0
+
+
+@pytest.mark.parametrize("read_out_qubits", [[0, 1, 2, 3], [3, 1], [2]])
+def test_sampling(read_out_qubits):
+    U = make_circuit()
+    variables = {k: numpy.random.uniform(0.0, 2 * numpy.pi) for k in U.extract_variables()}
+    wfn = tq.simulate(U, variables=variables, backend="numpy")
+    counts = tq.simulate(U, variables=variables, backend="numpy", samples=10000, read_out_qubits=read_out_qubits)
+    assert sum(counts.values()) == 10000
+    probabilities = {}
+    for k, v in wfn.items():
+        key = "".join(str(k.array[q]) for q in sorted(read_out_qubits))
+        probabilities[key] = probabilities.get(key, 0.0) + abs(v) ** 2
+    for k, v in counts.items():
+        assert numpy.isclose(v / 10000, probabilities[k.binary], atol=5.e-2)
+
+
+def make_number_conserving_circuit():
+    a, b, c = tq.Variable("a"), tq.Variable("b"), tq.Variable("c")
+    U = tq.gates.X([0, 1, 2])
+    U += tq.gates.QubitExcitation(target=[0, 3, 1, 4], angle=a) + tq.gates.QubitExcitation(target=[2, 5], angle=b)
+    U += tq.gates.Rz(c, 1) + tq.gates.Phase(3, angle=a) + tq.gates.SWAP(0, 5) + tq.gates.Z(4, control=2)
+    U += tq.gates.Trotterized(generator=tq.paulis.X([1, 4]) + tq.paulis.Y([1, 4]), angle=c, steps=1)
+    U += tq.gates.GeneralizedRotation(angle=b, generator=0.5 * (tq.paulis.I() - tq.paulis.Z(3)))
+    return U
+
+
+def test_masks_on_keys():
+    H = tq.paulis.X([0, 3]) + tq.paulis.Y([1, 2]) * tq.paulis.Z(0) + 0.5 * tq.paulis.Z(2) - 0.3 * tq.paulis.Y(0)
+    keys = hamming_weight_basis(4, 2)
+    state = numpy.zeros((3, 16), dtype=complex)
+    state[:, keys] = numpy.random.uniform(-1.0, 1.0, size=(3, len(keys)))
+    masks = make_pauli_masks(H, n_qubits=4)
+    assert numpy.allclose(apply_masks_on_keys(state[:, keys], keys, *masks), apply_masks(state, *masks)[:, keys])
+
+
+@pytest.mark.parametrize("init", [0, 36])
+def test_subspace_simulator(init):
+    U = make_number_conserving_circuit()
+    H = tq.paulis.X([0, 3]) + tq.paulis.Y([1, 4]) * tq.paulis.Z(2) + 0.5 * tq.paulis.Z(5) - 0.3 * tq.paulis.Y(0)
+    variables = {k: numpy.random.uniform(0.0, 2 * numpy.pi) for k in U.extract_variables()}
+    compiled = tq.compile(U, backend="numpy_subspace")
+    assert compiled.conserving and compiled.dimension(init) == 20
+    wfn = tq.simulate(U, variables=variables, backend="numpy_subspace", initial_state=init)
+    reference = tq.simulate(U, variables=variables, backend="numpy", initial_state=init)
+    assert numpy.isclose(abs(wfn.inner(reference)), 1.0)
+
+    E = tq.ExpectationValue(H=H, U=U)
+    compiled = tq.compile(E, backend="numpy_subspace").args[0]
+    assert numpy.isclose(compiled(variables), tq.simulate(E, variables=variables, backend="numpy"))
+    gradient = tq.compile(E, backend="numpy").args[0].gradient(variables)
+    for method in ["checkpoint", "adjoint"]:
+        result = compiled.gradient(variables, method=method)
+        assert all(numpy.isclose(result[k], gradient[k]) for k in gradient)
+
+
+def test_subspace_fallback():
+    U = make_number_conserving_circuit() + tq.gates.H(1)
+    variables = {k: numpy.random.uniform(0.0, 2 * numpy.pi) for k in U.extract_variables()}
+    compiled = tq.compile(U, backend="numpy_subspace")
+    assert not compiled.conserving and compiled.dimension() == 2 ** 6
+    wfn = tq.simulate(U, variables=variables, backend="numpy_subspace")
+    assert numpy.isclose(abs(wfn.inner(tq.simulate(U, variables=variables, backend="numpy"))), 1.0)
@@ -10,6 +10,7 @@ import pytest
 import numbers
 import tequila as tq
 from tequila.simulators.simulator_api import simulate
+from tequila.utils import fingerprint, has_identity
 
 # Get QC backends for parametrized testing
 import select_backends
@@ -707,3 +708,211 @@ def test_total_type_jumble(simulator,value1=(numpy.random.randint(10, 1000) / 10
     gan1= np.cos(a(values)) * appendage + (np.sin(a(values)) * -np.sin(b(values))) - (np.sin(b(values)) * -np.sin(b(values)))
     gan2= np.sin(a(values)) * a(values) * -np.cos(b(values)) + 2 * (-np.cos(b(values)) * appendage)
     assert np.isclose(tota+totb,gan1+gan2)
+
+
+@pytest.mark.parametrize("simulator", [k for k in tequila.simulators.simulator_api.INSTALLED_SIMULATORS.keys() if
+                                       k != "symbolic"])
+def test_batched_evaluation(simulator):
+    a = Variable("a")
+    b = Variable("b")
+    U = gates.Ry(angle=a, target=0) + gates.X(target=1, control=0) + gates.ExpPauli(paulistring="X(0)Y(1)", angle=b)
+    E1 = ExpectationValue(U=U, H=paulis.X(0) + paulis.Z(1))
+    E2 = ExpectationValue(U=U, H=paulis.Y(0) * paulis.X(1))
+    O = E1 ** 2 + a * E2.apply(np.sin) + 1.0
+    compiled = tq.compile(O, backend=simulator)
+    keys = compiled.extract_variables()
+    points = numpy.random.uniform(0.0, 2.0 * numpy.pi, size=(7, len(keys)))
+    dicts = [{k: x[i] for i, k in enumerate(keys)} for x in points]
+    reference = [compiled(d) for d in dicts]
+    assert numpy.allclose(compiled(points), reference)
+    assert numpy.allclose(compiled(dicts), reference)
+
+    vectorized = tq.compile(tq.vectorize([E1, O]), backend=simulator)
+    keys = vectorized.extract_variables()
+    points = numpy.asarray([[d[k] for k in keys] for d in dicts])
+    result = vectorized(points)
+    assert result.shape == (7, 2)
+    assert numpy.allclose(result, [vectorized(d) for d in dicts])
+
+
+@pytest.mark.skipif("fork" not in __import__("multiprocessing").get_all_start_methods(), reason="needs fork")
+def test_parallel_evaluation():
+    a = Variable("a")
+    b = Variable("b")
+    U = gates.Ry(angle=a, target=0) + gates.X(target=1, control=0) + gates.ExpPauli(paulistring="X(0)Y(1)", angle=b)
+    E1 = ExpectationValue(U=U, H=paulis.X(0) + paulis.Z(1))
+    E2 = ExpectationValue(U=U, H=paulis.Y(0) * paulis.X(1))
+    O = E1 ** 2 + a * E2.apply(np.sin) + E1 + 1.0
+    values = {a: 0.3, b: -1.2}
+    reference = tq.compile(O)
+    with tq.ExpectationValueExecutor(max_workers=2) as executor:
+        compiled = tq.compile(O, executor=executor)
+        assert numpy.isclose(compiled(values), reference(values))
+        assert numpy.allclose(compiled([values, {a: 1.0, b: 2.0}]), reference([values, {a: 1.0, b: 2.0}]))
+
+        # registered after the workers were started
+        vectorized = tq.compile(tq.vectorize([E1, O, E2]), executor=executor)
+        assert numpy.allclose(vectorized(values), tq.compile(tq.vectorize([E1, O, E2]))(values))
+
+        tq.set_default_executor(executor)
+        try:
+            assert tq.compile(O)._executor is executor
+        finally:
+            tq.set_default_executor(None)
+        assert tq.compile(O)._executor is None
+
+        # known entries do not fork the workers again, entries of deleted objectives are dropped
+        pool = executor._pool
+        assert numpy.isclose(compiled(values), reference(values))
+        assert executor._pool is pool
+        n_registered = len(executor)
+        for i in range(3):
+            H = paulis.Z(0) + i * paulis.X(1)
+            extra = tq.compile(ExpectationValue(U=U, H=H) + ExpectationValue(U=U, H=paulis.Y(1)), executor=executor)
+            assert len(executor) == n_registered + 2
+            assert numpy.isclose(extra(values), tq.simulate(ExpectationValue(U=U, H=H) + ExpectationValue(
+                U=U, H=paulis.Y(1)), variables=values))
+            del extra
+            __import__("gc").collect()
+            assert len(executor) == n_registered
+
+
+def test_evaluation_plan():
+    a = Variable("a")
+    b = Variable("b")
+    U = gates.Ry(angle=a, target=0) + gates.X(target=1, control=0) + gates.Rz(angle=a * b, target=1, control=0)
+    E = ExpectationValue(U=U, H=paulis.X(0) * paulis.Z(1) + 0.5 * paulis.Y(1))
+    O = E * E + a.apply(np.sin) * E
+    values = {a: 0.3, b: -1.2}
+
+    dO = grad(O)
+    compiled = [tq.compile(dO[k]) for k in [a, b]]
+    plan = tq.objective.EvaluationPlan(compiled + [tq.compile(O), 2.0])
+    # E and the shifted expectationvalues of the Rz gate appear in both components
+    assert plan.count_expectationvalues() < sum(x.count_expectationvalues() for x in compiled) + 1
+    result = plan(values)
+    assert numpy.allclose(result[:3], [x(values) for x in compiled] + [simulate(O, variables=values)])
+    assert result[3] == 2.0
+    batch = plan([values, {a: 1.0, b: 2.0}])
+    assert numpy.allclose(batch[0], [compiled[0](values), compiled[0]({a: 1.0, b: 2.0})])
+
+    # argsets of vectorized objectives share their expectationvalues
+    vectorized = tq.compile(tq.vectorize([E, O, 2.0 * E]))
+    assert vectorized.count_expectationvalues() == 1
+    assert numpy.allclose(vectorized(values), [simulate(x, variables=values) for x in [E, O, 2.0 * E]])
+
+
+def test_result_cache():
+    from tequila.simulators.simulator_base import RESULT_CACHE
+    global scale
+    assert RESULT_CACHE.maxsize == 0
+    a = Variable("a")
+    b = Variable("b")
+    U = gates.Ry(angle=a, target=0) + gates.X(target=1, control=0) + gates.Rx(angle=a * b, target=1, control=0)
+    E = ExpectationValue(U=U, H=paulis.X(0) + paulis.Z(1) + 0.5 * paulis.Y(1))
+    O = E * E + a.apply(np.sin) * E
+    values = {a: 0.3, b: -1.2}
+    RESULT_CACHE.clear()
+
+    compiled = tq.compile(O)
+    reference = compiled(values)
+    assert RESULT_CACHE.misses == 0 and len(RESULT_CACHE) == 0
+    try:
+        tq.set_result_cache_size(1024)
+        assert compiled(values) == reference
+        assert RESULT_CACHE.misses == 1 and RESULT_CACHE.hits == 0
+        assert compiled(values) == reference
+        assert RESULT_CACHE.hits == 1
+        assert compiled({a: 0.3, b: -1.1}) != reference
+
+        # the outer derivatives of the gradient reuse the expectationvalue of the objective
+        dO = tq.compile(grad(O, a))
+        hits = RESULT_CACHE.hits
+        dO(values)
+        assert RESULT_CACHE.hits > hits
+
+        # sampled evaluations are not cached
+        misses = RESULT_CACHE.misses
+        compiled(values, samples=100)
+        assert RESULT_CACHE.misses == misses
+
+        # rebuilt objectives with transformations reading different globals
+        for scale in [1.0, 2.0, 3.0]:
+            U = gates.Ry(angle=a.apply(lambda x: scale * x), target=0)
+            E = tq.compile(ExpectationValue(U=U, H=paulis.Z(0)))
+            assert numpy.isclose(E({a: 0.5}), numpy.cos(scale * 0.5))
+
+        # objects without structural representation are not cached
+        data = {"x": 2.0}
+        E = tq.compile(ExpectationValue(U=gates.Ry(angle=a.apply(lambda x: data["x"] * x), target=0), H=paulis.Z(0)))
+        size = len(RESULT_CACHE)
+        E({a: 0.5})
+        assert len(RESULT_CACHE) == size
+
+        tq.set_result_cache_size(2)
+        for x in numpy.random.uniform(0.0, 1.0, 5):
+            compiled({a: x, b: x})
+        assert len(RESULT_CACHE) == 2
+        tq.set_result_cache_size(0)
+        assert len(RESULT_CACHE) == 0
+        misses = RESULT_CACHE.misses
+        assert compiled(values) == reference
+        assert len(RESULT_CACHE) == 0 and RESULT_CACHE.misses == misses
+    finally:
+        tq.set_result_cache_size(0)
+        RESULT_CACHE.clear()
+
+
+def test_structural_deduplication():
+    a = Variable("a")
+    def build():
+        U = gates.Ry(angle=a, target=0) + gates.X(target=1, control=0) + gates.Rz(angle=2.0 * a, target=1)
+        return ExpectationValue(U=U, H=paulis.X(0) * paulis.Z(1) + 0.5 * paulis.Y(1))
+    E1 = build()
+    E2 = build()
+    assert E1.args[0] is not E2.args[0]
+    assert E1.args[0].fingerprint() == E2.args[0].fingerprint()
+    E3 = ExpectationValue(U=gates.Ry(angle=a, target=0), H=paulis.X(0))
+    assert E1.args[0].fingerprint() != E3.args[0].fingerprint()
+
+    # structurally equal expectationvalues of different origin are compiled and evaluated once
+    O = E1 * E2 + E1 + E2
+    compiled = tq.compile(O)
+    assert compiled.count_expectationvalues() == 1
+    values = {a: 0.7}
+    e = simulate(E1, variables=values)
+    assert numpy.isclose(compiled(values), e * e + 2.0 * e)
+    plan = tq.objective.EvaluationPlan([tq.compile(E1), tq.compile(E2), tq.compile(E3)])
+    assert plan.count_expectationvalues() == 2
+
+    # changing a gate changes the fingerprint
+    U = build().args[0].U
+    key = U.fingerprint()
+    U.gates[0].parameter = tq.assign_variable("b")
+    assert U.fingerprint() != key
+
+
+scale = 1.0
+
+
+def test_fingerprint_of_functions():
+    global scale
+    a = Variable("a")
+    # globals read by functions are part of the fingerprint
+    scaled = lambda: a.apply(lambda x: scale * x)
+    keys = []
+    for scale in [1.0, 2.0, 3.0]:
+        keys.append(fingerprint(scaled()))
+    assert len(set(keys)) == 3 and not any(has_identity(k) for k in keys)
+    assert fingerprint(scaled()) == keys[-1]
+    # library functions and their transformations are structural
+    assert not has_identity(fingerprint(a.apply(np.sin) * a ** 2 + 2.0 * a))
+    # other objects only by identity
+    data = {"x": 1.0}
+    assert has_identity(fingerprint(a.apply(lambda x: data["x"] * x)))
+
+    # shift templates of expectationvalues that differ only in a global are not mixed up
+    for scale in [1.0, 2.0]:
+        E = ExpectationValue(U=gates.Ry(angle=a.apply(lambda x: scale * x), target=0), H=paulis.Z(0))
+        dE = tq.compile(grad(E, a))
+        assert numpy.isclose(dE({a: 0.5}), -scale * numpy.sin(scale * 0.5))
@@ -158,3 +158,39 @@ def test_compile_ch(target, control, power):
     if control is not None:
         assert (equivalent_circuit == equivalent_ch)
 
+
+
+def test_gate_compile_cache():
+    from tequila.circuit.compiler import Compiler, GATE_COMPILE_CACHE
+    compiler = Compiler(exponential_pauli=True, toffoli=True, controlled_rotation=True, generalized_rotation=True)
+
+    def make_circuit():
+        U = gates.ExpPauli(paulistring="X(0)Y(1)", angle="a") + gates.Toffoli(0, 1, 2)
+        U += gates.Ry(angle="b", target=2, control=0) + gates.Toffoli(0, 1, 2)
+        return U
+
+    GATE_COMPILE_CACHE.clear()
+    compiled = compiler(make_circuit())
+    assert GATE_COMPILE_CACHE.hits == 1 and GATE_COMPILE_CACHE.misses == 3
+    assert str(compiler(make_circuit())) == str(compiled)
+    assert GATE_COMPILE_CACHE.hits == 5 and GATE_COMPILE_CACHE.misses == 3
+
+    # different structure or different compiler settings are not taken from the cache
+    compiler(gates.ExpPauli(paulistring="X(0)Y(1)", angle="c"))
+    Compiler(exponential_pauli=True)(gates.ExpPauli(paulistring="X(0)Y(1)", angle="a"))
+    assert GATE_COMPILE_CACHE.misses == 5
+
+    # results taken from the cache do not share gates, changing one does not affect the next compilation
+    U1 = Compiler(exponential_pauli=True)(gates.ExpPauli(paulistring="X(0)Y(1)", angle="a"))
+    U2 = Compiler(exponential_pauli=True)(gates.ExpPauli(paulistring="X(0)Y(1)", angle="a"))
+    assert all(g1 is not g2 for g1, g2 in zip(U1.gates, U2.gates))
+    reference = str(U2)
+    U2.gates[0]._target = (5,)
+    U3 = Compiler(exponential_pauli=True)(gates.ExpPauli(paulistring="X(0)Y(1)", angle="a"))
+    assert str(U3) == reference and str(U1) == reference
+
+    variables = {"a": 0.3, "b": 1.2}
+    H = paulis.X(0) + paulis.Y(1) * paulis.Z(2)
+    E1 = simulate(ExpectationValue(U=compiled, H=H), variables=variables)
+    E2 = simulate(ExpectationValue(U=make_circuit(), H=H), variables=variables)
+    assert isclose(E1, E2)
@@ -149,3 +149,34 @@ def test_hessian_based_methods(simulator, method, use_hessian):
     result = tq.optimizer_scipy.minimize(objective=-E, backend=simulator, hessian=use_hessian, method=method, tol=1.e-4,
                                          method_options=method_options, initial_values=initial_values, silent=True)
     assert (numpy.isclose(result.energy, -1.0, atol=1.e-1))
+
+
+@pytest.mark.parametrize("method", tq.optimizer_scipy.OptimizerSciPy.hessp_methods)
+@pytest.mark.parametrize("use_hessian", ["hessp", {"method": "hessp", "stepsize": 1.e-3}])
+def test_hessp_methods(method, use_hessian):
+    wfn = tq.QubitWaveFunction.from_string(string="1.0*|00> + 1.0*|11>")
+    H = tq.paulis.Projector(wfn=wfn.normalize())
+    U = tq.gates.Ry(angle=tq.assign_variable("a") * numpy.pi, target=0)
+    U += tq.gates.Ry(angle=tq.assign_variable("b") * numpy.pi, target=1, control=0)
+    E = tq.ExpectationValue(H=H, U=U)
+    initial_values = {"a": 0.45, "b": 0.98}
+
+    result = tq.optimizer_scipy.minimize(objective=-E, hessian=use_hessian, method=method, tol=1.e-4,
+                                         initial_values=initial_values, silent=True)
+    assert numpy.isclose(result.energy, -1.0, atol=1.e-1)
+    assert len(result.history.hessians) == 0
+
+    # the products agree with the analytic hessian
+    from tequila.optimizers._containers import _HessVecContainer
+    keys = [tq.assign_variable("a"), tq.assign_variable("b")]
+    dO = {k: tq.compile(tq.grad(-E, k)) for k in keys}
+    hessp = _HessVecContainer(objective=dO, param_keys=keys)
+    ddO = tq.hessian(-E)
+    p = numpy.asarray([0.3, 0.7])
+    v = numpy.asarray([0.5, -2.0])
+    values = dict(zip(keys, p))
+    matrix = numpy.asarray([[tq.simulate(ddO[(k, l)], variables=values) for l in keys] for k in keys])
+    assert numpy.allclose(hessp(p, v), matrix.dot(v), atol=1.e-5)
+
+    with pytest.raises(tq.TequilaException):
+        tq.optimizer_scipy.minimize(objective=-E, hessian="hessp", method="DOGLEG", silent=True)
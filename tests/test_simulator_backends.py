@@ -29,6 +29,44 @@ def test_dependencies():
             assert (package in tq.simulators.simulator_api.INSTALLED_BACKENDS)
 
 
+def test_lazy_backend_import():
+    import subprocess, sys, json
+    script = "import sys, json\n" \
+             "import tequila\n" \
+             "print(json.dumps({'modules': [m for m in sys.modules]}))\n"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, check=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    backend_modules = [m for m in result["modules"] if m.startswith("tequila.simulators.simulator_") and
+                       m not in ["tequila.simulators.simulator_api", "tequila.simulators.simulator_base"]]
+    assert len(backend_modules) == 0
+    # cirq is not listed, openfermion (a dependency of tequila) imports it
+    for package in ["qulacs", "qiskit", "pyquil", "qibo"]:
+        assert package not in result["modules"]
+
+    # backends are imported once they are picked
+    backend = tq.pick_backend()
+    assert tq.simulators.simulator_api.BACKEND_MODULES[backend][0] in sys.modules
+
+
+def test_broken_backend(tmp_path, monkeypatch):
+    # errors other than ImportError during the import of a backend
+    api = tequila.simulators.simulator_api
+    (tmp_path / "broken_backend_module.py").write_text("raise AttributeError('incompatible version')\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setitem(api.BACKEND_MODULES, "broken", ("broken_backend_module", "Circuit", "ExpectationValue"))
+    monkeypatch.setattr(api.INSTALLED_SIMULATORS, "_names", api.INSTALLED_SIMULATORS._names + ["broken"])
+    monkeypatch.setattr(api.INSTALLED_SAMPLERS, "_names", api.INSTALLED_SAMPLERS._names + ["broken"])
+    assert "broken" in api.INSTALLED_SIMULATORS._names
+    # the installed backends are validated when they are read
+    assert "broken" not in list(api.INSTALLED_BACKENDS)
+    assert "broken" not in api.INSTALLED_SIMULATORS
+    assert "broken" not in api.INSTALLED_SAMPLERS._names
+    with pytest.raises(tq.TequilaException):
+        api.load_backend("broken")
+    with pytest.raises(tq.TequilaException):
+        tq.pick_backend("broken")
+
+
 @pytest.mark.parametrize("backend", list(set(
     [None] + [k for k in tequila.simulators.simulator_api.INSTALLED_SIMULATORS.keys()] + [k for k in
                                                                                           tequila.simulators.simulator_api.INSTALLED_SAMPLERS.keys()])))
@@ -368,6 +406,17 @@ def test_sampling(backend):
         assert numpy.isclose(e, 0.0, atol=2.e-1)
 
 
+@pytest.mark.parametrize("backend", tequila.simulators.simulator_api.INSTALLED_SAMPLERS.keys())
+def test_sampling_mixed_hamiltonian(backend):
+    U = tq.gates.Ry(angle=0.4, target=0) + tq.gates.CNOT(0, 1) + tq.gates.Rx(angle=1.1, target=2) + tq.gates.H(3)
+    H = tq.paulis.X(0) * tq.paulis.Y(1) + 0.5 * tq.paulis.Z(3) - 0.3 * tq.paulis.Y([0, 2]) + tq.paulis.X(3)
+    H += tq.paulis.Z([0, 1]) + 0.7
+    E = tq.ExpectationValue(H=H, U=U) + tq.ExpectationValue(H=tq.paulis.Z([1, 2]), U=U)
+    exact = tq.simulate(E)
+    sampled = tq.simulate(E, backend=backend, samples=10000)
+    assert numpy.isclose(sampled, exact, atol=1.e-1)
+
+
 @pytest.mark.parametrize("backend", tequila.simulators.simulator_api.INSTALLED_SAMPLERS.keys())
 def test_sampling_read_out_qubits(backend):
     U = tq.gates.X(0)
@@ -55,3 +55,21 @@ def test_controls(target, control, gate):
 
 
 
+
+
+@pytest.mark.parametrize("init", [0, 5])
+def test_lambdified(init):
+    from tequila.simulators.simulator_symbolic import BackendCircuitSymbolic
+    from tequila import Variable
+    a, b = Variable("a"), Variable("b")
+    U = gates.Ry(angle=a, target=0) + gates.CNOT(0, 1) + gates.Rx(angle=2 * b, target=2, control=1)
+    U += gates.H(1) + gates.Rz(angle=a * b, target=0) + gates.X(2, control=[0, 1])
+    simulator = BackendCircuitSymbolic(abstract_circuit=U, variables=None)
+    for i in range(3):
+        variables = {"a": numpy.random.uniform(0.0, 2 * numpy.pi), "b": numpy.random.uniform(0.0, 2 * numpy.pi)}
+        simulator.lambdify = True
+        wfn = simulator.simulate(variables=variables, initial_state=init)
+        simulator.lambdify = False
+        exact = simulator.simulate(variables=variables, initial_state=init)
+        assert len(simulator._lambdified) == 1
+        assert numpy.allclose(wfn.to_array(), exact.to_array())